@@ -71,14 +71,18 @@ from translation import SUPPORTED_LANGUAGES  # noqa: E402
 
 
 # Core endpoints that stay in the main app
+# Static for the life of the process; lambda_handler also serves it directly
+HEALTH_STATUS = HealthResponse(
+    status="healthy",
+    version="4.0.0-gemini",
+    model=LLM_MODEL_ID,
+)
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint."""
-    return HealthResponse(
-        status="healthy",
-        version="4.0.0-gemini",
-        model=LLM_MODEL_ID,
-    )
+    return HEALTH_STATUS
 
 
 @app.get("/languages")
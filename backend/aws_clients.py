@@ -16,19 +16,31 @@ _boto_config = Config(
     region_name=AWS_REGION,
     retries={"max_attempts": 3, "mode": "adaptive"},
     tcp_keepalive=True,
-    max_pool_connections=25,  # Default is 10; increase for parallel image uploads
+    # Default is 10; the image and S3 upload pools share this one client
+    max_pool_connections=32,
+    s3={"use_accelerate_endpoint": False},
 )
 
+# DynamoDB calls are small and latency-sensitive: fail fast on a stuck
+# connection and let adaptive retries absorb throttling instead
+_dynamodb_config = _boto_config.merge(Config(
+    connect_timeout=1,
+    read_timeout=3,
+    retries={"max_attempts": 5, "mode": "adaptive"},
+))
+
 # Singleton clients — initialized lazily, reused across invocations
 _dynamodb_resource = None
+_dynamodb_client = None
 _s3_client = None
+_sqs_client = None
 
 
 def get_dynamodb_resource():
     """Get or create a shared DynamoDB resource with connection pooling."""
     global _dynamodb_resource
     if _dynamodb_resource is None:
-        _dynamodb_resource = boto3.resource("dynamodb", config=_boto_config)
+        _dynamodb_resource = boto3.resource("dynamodb", config=_dynamodb_config)
     return _dynamodb_resource
 
 
@@ -37,9 +49,30 @@ def get_dynamodb_table(table_name: str):
     return get_dynamodb_resource().Table(table_name)
 
 
+def get_dynamodb_client():
+    """
+    Get or create a shared low-level DynamoDB client with connection pooling.
+
+    Unlike the resource's meta.client, this one takes and returns wire-format
+    attribute values, with no TypeSerializer pass in between.
+    """
+    global _dynamodb_client
+    if _dynamodb_client is None:
+        _dynamodb_client = boto3.client("dynamodb", config=_dynamodb_config)
+    return _dynamodb_client
+
+
 def get_s3_client():
     """Get or create a shared S3 client with connection pooling."""
     global _s3_client
     if _s3_client is None:
         _s3_client = boto3.client("s3", config=_boto_config)
     return _s3_client
+
+
+def get_sqs_client():
+    """Get or create a shared SQS client with connection pooling."""
+    global _sqs_client
+    if _sqs_client is None:
+        _sqs_client = boto3.client("sqs", config=_boto_config)
+    return _sqs_client
@@ -36,11 +36,17 @@ COMMON_QUERIES = [
     "How to treat a headache naturally?",
 ]
 
+# Generated responses are written once this many pile up (one BatchWriteItem)
+FLUSH_EVERY = 25
+
 
 def warm_cache(queries: list = None, skip_existing: bool = True) -> dict:
     """
     Pre-generate and cache responses for common queries.
 
+    Generated responses are written in batches of FLUSH_EVERY, and whatever is
+    pending is still written if warming stops early.
+
     Args:
         queries: List of queries to warm (defaults to COMMON_QUERIES)
         skip_existing: If True, skip queries already in cache
@@ -48,40 +54,53 @@ def warm_cache(queries: list = None, skip_existing: bool = True) -> dict:
     Returns:
         dict with 'warmed', 'skipped', 'failed' counts
     """
-    from response_cache import get_cached_response, cache_response
+    from response_cache import get_cached_response, cache_responses_batch
     from gemini_client import invoke_llm, detect_medical_topic
 
     queries = queries or COMMON_QUERIES
     results = {"warmed": 0, "skipped": 0, "failed": 0, "total": len(queries)}
-
-    for i, query in enumerate(queries, 1):
-        logger.info(f"Warming [{i}/{len(queries)}]: {query[:50]}")
-
-        # Check if already cached
-        if skip_existing:
-            existing = get_cached_response(query)
-            if existing:
-                logger.info("Already cached, skipping", query=query[:40])
-                results["skipped"] += 1
-                continue
-
-        try:
-            # Generate response
-            response = invoke_llm(query, max_tokens=1536, temperature=0.5)
-            if response:
-                topic = detect_medical_topic(query)
-                cache_response(query, response, topic=topic or "", ttl_hours=48)
-                results["warmed"] += 1
-                logger.info("Warmed successfully", query=query[:40])
-            else:
+    generated = []
+
+    def flush():
+        batch = generated[:]
+        generated.clear()
+        # A failed batch only counts its own entries as failed
+        written = cache_responses_batch(batch, ttl_hours=48)
+        results["warmed"] += written
+        results["failed"] += len(batch) - written
+
+    try:
+        for i, query in enumerate(queries, 1):
+            logger.info(f"Warming [{i}/{len(queries)}]: {query[:50]}")
+
+            # Check if already cached
+            if skip_existing:
+                existing = get_cached_response(query)
+                if existing:
+                    logger.info("Already cached, skipping", query=query[:40])
+                    results["skipped"] += 1
+                    continue
+
+            try:
+                # Generate response
+                response = invoke_llm(query, max_tokens=1536, temperature=0.5)
+                if response:
+                    topic = detect_medical_topic(query)
+                    generated.append({"query": query, "response": response, "topic": topic or ""})
+                    logger.info("Generated response", query=query[:40])
+                    if len(generated) >= FLUSH_EVERY:
+                        flush()
+                else:
+                    results["failed"] += 1
+                    logger.warning("LLM returned None", query=query[:40])
+            except Exception as e:
                 results["failed"] += 1
-                logger.warning("LLM returned None", query=query[:40])
-        except Exception as e:
-            results["failed"] += 1
-            logger.error("Warming failed", query=query[:40], error=str(e))
+                logger.error("Warming failed", query=query[:40], error=str(e))
 
-        # Small delay to avoid rate limiting
-        time.sleep(1)
+            # Small delay to avoid rate limiting
+            time.sleep(1)
+    finally:
+        flush()
 
     logger.info("Cache warming complete", **results)
     return results
@@ -6,24 +6,19 @@ Handles storing and retrieving user chat history.
 import os
 import time
 import uuid
-import boto3
 from typing import Optional, Dict, Any, List
-from datetime import datetime
+from datetime import datetime, timezone
+
+from aws_clients import get_dynamodb_resource, get_s3_client as _get_pooled_s3_client
 
 # DynamoDB configuration from environment
 CHAT_TABLE = os.getenv("CHAT_TABLE", "medibot-chats-production")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 
-# DynamoDB client (initialized lazily)
-_dynamodb = None
-
 
 def get_dynamodb():
-    """Get or create DynamoDB resource."""
-    global _dynamodb
-    if _dynamodb is None:
-        _dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
-    return _dynamodb
+    """Get the shared DynamoDB resource (pooled, keep-alive; see aws_clients)."""
+    return get_dynamodb_resource()
 
 
 def get_table():
@@ -31,17 +26,13 @@ def get_table():
     return get_dynamodb().Table(CHAT_TABLE)
 
 
-# S3 client for URL regeneration
-_s3_client = None
+# S3 bucket for URL regeneration
 IMAGES_BUCKET = os.getenv("IMAGES_BUCKET", "")
 
 
 def _get_s3_client():
-    """Get or create S3 client."""
-    global _s3_client
-    if _s3_client is None:
-        _s3_client = boto3.client('s3', region_name=AWS_REGION)
-    return _s3_client
+    """Get the shared S3 client (pooled, keep-alive; see aws_clients)."""
+    return _get_pooled_s3_client()
 
 
 def regenerate_image_urls(step_images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -112,10 +103,10 @@ def save_chat(
     if not chat_id:
         chat_id = generate_chat_id()
 
-    timestamp = int(time.time() * 1000)
+    timestamp = time.time_ns() // 1_000_000
 
     # Calculate TTL (90 days from now)
-    ttl = int(time.time()) + (90 * 24 * 60 * 60)
+    ttl = timestamp // 1000 + (90 * 24 * 60 * 60)
 
     item = {
         "user_id": user_id,
@@ -127,7 +118,7 @@ def save_chat(
         "topic": topic or "",
         "language": language,
         "ttl": ttl,
-        "created_at": datetime.utcnow().isoformat(),
+        # created_at is not stored; readers derive it from timestamp (get_created_at)
         # New fields for full conversation support
         "step_images": step_images or [],
         "attachments": attachments or []
@@ -259,7 +250,7 @@ def _delete_s3_images(image_urls: List[str]) -> int:
     images_bucket = os.getenv("IMAGES_BUCKET", "medibot-images-748325220003-us-east-1-production")
 
     try:
-        s3 = boto3.client('s3', region_name=AWS_REGION)
+        s3 = _get_s3_client()
 
         for url in image_urls:
             try:
@@ -329,6 +320,19 @@ def delete_all_user_chats(user_id: str) -> int:
         return 0
 
 
+def get_created_at(chat: Dict[str, Any]) -> str:
+    """ISO-8601 creation time, derived from the millisecond timestamp.
+
+    Older items stored an explicit created_at string; prefer it when present.
+    """
+    if chat.get("created_at"):
+        return chat["created_at"]
+    timestamp = chat.get("timestamp")
+    if not timestamp:
+        return ""
+    return datetime.fromtimestamp(int(timestamp) / 1000, tz=timezone.utc).isoformat()
+
+
 def get_chat_summary(chat: Dict[str, Any]) -> Dict[str, Any]:
     """Get a summary of a chat for list display."""
     return {
@@ -336,6 +340,6 @@ def get_chat_summary(chat: Dict[str, Any]) -> Dict[str, Any]:
         "query": chat.get("query", "")[:100],  # First 100 chars
         "topic": chat.get("topic", ""),
         "timestamp": chat.get("timestamp", 0),
-        "created_at": chat.get("created_at", ""),
+        "created_at": get_created_at(chat),
         "has_images": len(chat.get("images", [])) > 0
     }
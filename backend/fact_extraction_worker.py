@@ -0,0 +1,43 @@
+"""
+Fact Extraction Worker - SQS consumer for chat health-fact extraction.
+
+The chat API queues each user message instead of calling Gemini before the
+response is returned; this Lambda runs the extraction and profile writes.
+"""
+
+import json
+
+from aws_lambda_powertools import Logger
+
+from report_analyzer import extract_facts_from_chat_or_raise
+
+logger = Logger(service="medibot")
+
+
+def handler(event, context):
+    """
+    Process a batch of queued chat messages.
+
+    Returns a partial batch response so messages whose extraction failed
+    (Gemini or DynamoDB errors) are retried. Malformed bodies would fail the
+    same way on every retry, so they are logged and dropped.
+    """
+    failures = []
+
+    for record in event.get("Records", []):
+        try:
+            body = json.loads(record["body"])
+            user_id, user_message = body["user_id"], body["user_message"]
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error("Dropping malformed message", message_id=record.get("messageId"), error=str(e))
+            continue
+
+        try:
+            extracted = extract_facts_from_chat_or_raise(user_id, user_message, "")
+            if extracted:
+                logger.info("Extracted facts", count=len(extracted))
+        except Exception as e:
+            logger.exception("Failed to extract facts", message_id=record.get("messageId"), error=str(e))
+            failures.append({"itemIdentifier": record["messageId"]})
+
+    return {"batchItemFailures": failures}
@@ -4,15 +4,32 @@ Model: gemini-2.5-flash-image supports both text and image output.
 """
 
 import os
-import base64
+import asyncio
+import atexit
+import hashlib
+import io
+import itertools
+import logging
 import re
-import uuid
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from aws_clients import get_s3_client as _get_pooled_s3_client
+from boto3.s3.transfer import TransferConfig
 import concurrent.futures
 from typing import Optional, Dict, Any, List
 
+# SIMD base64 for step images; stdlib fallback keeps local dev working
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
 # NEW SDK - google-genai (not google-generativeai)
+import httpx
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
 
 # Structured logging
@@ -35,18 +52,104 @@ IMAGE_MODEL_ID = "gemini-2.5-flash-image"  # Supports native image generation
 IMAGES_BUCKET = os.getenv("IMAGES_BUCKET", "")
 
 # Initialize Gemini client
-client = None
-if GOOGLE_API_KEY:
-    client = genai.Client(api_key=GOOGLE_API_KEY)
+# One pooled keep-alive httpx client behind every Gemini call, sized for the
+# image pool's concurrent requests, so calls reuse TLS connections.
+GEMINI_MAX_CONNECTIONS = 32
+_GEMINI_HTTP_OPTIONS = types.HttpOptions(
+    client_args={
+        "limits": httpx.Limits(
+            max_connections=GEMINI_MAX_CONNECTIONS,
+            max_keepalive_connections=GEMINI_MAX_CONNECTIONS,
+        ),
+    },
+)
+
+# Created on first use so cold starts that only touch S3 or the parsers
+# don't pay for SDK client setup. None means "no API key configured".
+_CLIENT_UNSET = object()
+client: Any = _CLIENT_UNSET
+
+
+def _get_client():
+    """Return the shared Gemini client, creating it on first call."""
+    global client
+    if client is _CLIENT_UNSET:
+        client = genai.Client(api_key=GOOGLE_API_KEY, http_options=_GEMINI_HTTP_OPTIONS) if GOOGLE_API_KEY else None
+    return client
+
+
+def get_genai_client():
+    """Return the shared Gemini client for other modules (None without an API key)."""
+    return _get_client()
+
 
 # S3 client — delegated to centralized aws_clients for connection pooling
 
+# Step-image uploads run on their own pool so image workers can move on to
+# the next step instead of waiting on the S3 PUT.
+_S3_UPLOAD_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="s3-upload")
+
+# Shared image-generation pool, reused across warm invocations instead of
+# spinning up (and joining) a fresh executor per request.
+_IMAGE_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv("IMAGE_WORKERS", "5")), thread_name_prefix="img"
+)
+atexit.register(_IMAGE_EXECUTOR.shutdown, wait=False)
+atexit.register(_S3_UPLOAD_POOL.shutdown, wait=False)
+S3_UPLOAD_TIMEOUT_SECONDS = 10
+
 
 def get_s3_client():
     """Get shared S3 client with connection pooling."""
     return _get_pooled_s3_client()
 
 
+def compute_query_hash(query: str) -> str:
+    """
+    Short, stable hash of a query used to group its step images in S3.
+
+    Only needs uniqueness, not cryptographic strength, so a 6-byte BLAKE2b
+    digest (12 hex chars, same width as before) is used instead of SHA-256.
+    """
+    return hashlib.blake2b(query.strip().lower().encode(), digest_size=6).hexdigest()
+
+
+# Per-container sequence for S3 key suffixes (replaces a uuid4 urandom read per image).
+# The random tag is drawn once per container so two containers uploading the
+# same step in the same millisecond with equal counters can't collide.
+_IMAGE_KEY_COUNTER = itertools.count()
+_CONTAINER_KEY_TAG = secrets.token_hex(3)
+
+
+def _unique_key_suffix() -> str:
+    """Container tag + millisecond timestamp + container-local counter, in hex."""
+    return f"{_CONTAINER_KEY_TAG}{int(time.time() * 1000):x}{next(_IMAGE_KEY_COUNTER):x}"
+
+
+# Step images are normally well under this, so a single PutObject is
+# cheaper than spinning up a TransferManager for each one.
+_MULTIPART_THRESHOLD_BYTES = 5 * 1024 * 1024
+_TRANSFER_CONFIG = TransferConfig(multipart_threshold=_MULTIPART_THRESHOLD_BYTES, max_concurrency=4)
+
+
+# URL valid for 7 days (max practical for S3)
+PRESIGNED_URL_EXPIRY_SECONDS = 604800
+
+
+def _presign_get(s3, key: str) -> str:
+    """Presign a GET for a step image.
+
+    Signing is local (no request is made) and the client is a shared
+    singleton, so endpoint resolution and signer setup happen once per
+    container; only the per-key signature is computed here.
+    """
+    return s3.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': IMAGES_BUCKET, 'Key': key},
+        ExpiresIn=PRESIGNED_URL_EXPIRY_SECONDS,
+    )
+
+
 def upload_image_to_s3(image_bytes: bytes, step_number: str, query_hash: str) -> tuple[Optional[str], Optional[str]]:
     """Upload image bytes to S3 and return (presigned_url, s3_key)."""
     if not IMAGES_BUCKET:
@@ -54,22 +157,25 @@ def upload_image_to_s3(image_bytes: bytes, step_number: str, query_hash: str) ->
         return None, None
 
     try:
-        image_key = f"steps/{query_hash}/step_{step_number}_{uuid.uuid4().hex[:8]}.png"
+        image_key = f"steps/{query_hash}/step_{step_number}_{_unique_key_suffix()}.png"
 
         s3 = get_s3_client()
-        s3.put_object(
-            Bucket=IMAGES_BUCKET,
-            Key=image_key,
-            ContentType='image/png',
-            Body=image_bytes
-        )
-
-        # Generate URL valid for 7 days (max practical for S3)
-        presigned_url = s3.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': IMAGES_BUCKET, 'Key': image_key},
-            ExpiresIn=604800  # 7 days
-        )
+        if len(image_bytes) > _MULTIPART_THRESHOLD_BYTES:
+            # Large images go through s3transfer for parallel multipart parts
+            s3.upload_fileobj(
+                io.BytesIO(image_bytes), IMAGES_BUCKET, image_key,
+                ExtraArgs={'ContentType': 'image/png'},
+                Config=_TRANSFER_CONFIG,
+            )
+        else:
+            s3.put_object(
+                Bucket=IMAGES_BUCKET,
+                Key=image_key,
+                ContentType='image/png',
+                Body=image_bytes
+            )
+
+        presigned_url = _presign_get(s3, image_key)
         logger.info("Uploaded image to S3", key=image_key)
         return presigned_url, image_key
 
@@ -78,6 +184,32 @@ def upload_image_to_s3(image_bytes: bytes, step_number: str, query_hash: str) ->
         return None, None
 
 
+_THINKING_OPEN = '<thinking>'
+_THINKING_CLOSE = '</thinking>'
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+
+def _strip_thinking(response: str) -> str:
+    """Remove <thinking>...</thinking> blocks with a linear str.find scan.
+
+    An unclosed <thinking> tag is left in place, as the old regex did.
+    """
+    parts = []
+    i = 0
+    while True:
+        start = response.find(_THINKING_OPEN, i)
+        if start < 0:
+            parts.append(response[i:])
+            break
+        parts.append(response[i:start])
+        end = response.find(_THINKING_CLOSE, start + len(_THINKING_OPEN))
+        if end < 0:
+            parts.append(response[start:])
+            break
+        i = end + len(_THINKING_CLOSE)
+    return ''.join(parts)
+
+
 def clean_llm_response(response: str, keep_thinking: bool = False) -> str:
     """Clean the LLM response by optionally removing thinking tags."""
     if not response:
@@ -85,13 +217,13 @@ def clean_llm_response(response: str, keep_thinking: bool = False) -> str:
 
     if not keep_thinking:
         # Remove thinking tags if user doesn't want to see them
-        cleaned = re.sub(r'<thinking>.*?</thinking>', '', response, flags=re.DOTALL)
+        cleaned = _strip_thinking(response)
     else:
         # Format thinking sections nicely for display
-        cleaned = re.sub(r'<thinking>', '\n\n---\n**🧠 My Thinking Process:**\n', response)
-        cleaned = re.sub(r'</thinking>', '\n\n---\n\n', cleaned)
+        cleaned = response.replace(_THINKING_OPEN, '\n\n---\n**🧠 My Thinking Process:**\n')
+        cleaned = cleaned.replace(_THINKING_CLOSE, '\n\n---\n\n')
 
-    cleaned = re.sub(r'\n{3,}', '\n\n', cleaned)
+    cleaned = _BLANK_LINES_RE.sub('\n\n', cleaned)
     return cleaned.strip()
 
 
@@ -130,11 +262,70 @@ _THINKING_ADDENDUM = """
 Thinking Mode: Show reasoning in <thinking>...</thinking> tags before your response."""
 
 
+# Preassembled "<system>\n\nUser: " heads, so each call does one join
+_PROMPT_HEAD = _SYSTEM_PROMPT + "\n\nUser: "
+_PROMPT_HEAD_THINKING = _SYSTEM_PROMPT + _THINKING_ADDENDUM + "\n\nUser: "
+
+_FILES_SYSTEM_PROMPT = """You are MediBot, an expert medical assistant. You are analyzing medical documents and images provided by the user.
+
+## Your Approach:
+1. **Analyze the attached files** thoroughly - look for key medical information
+2. **Extract important data**: conditions, medications, test results, diagnoses
+3. **Summarize clearly** in simple language the user can understand
+4. **Provide context** about what the values mean
+5. **Suggest follow-up questions** they should ask their doctor
+
+## Guidelines:
+- Be thorough but concise
+- Highlight any abnormal values or concerns
+- Explain medical terms in simple language
+- Always recommend consulting a healthcare professional for medical decisions
+"""
+
+_FILES_PROMPT_HEAD = _FILES_SYSTEM_PROMPT + "\n\nUser: "
+_FILES_PROMPT_HEAD_THINKING = (
+    _FILES_SYSTEM_PROMPT
+    + "\n\nShow your thinking process in <thinking>...</thinking> tags before your response."
+    + "\n\nUser: "
+)
+
+
+def _join_prompt(head: str, prompt: str, context: str) -> str:
+    if context:
+        return "".join((head, "Context: ", context, "\n\n", prompt))
+    return "".join((head, prompt))
+
+
 def _build_prompt(prompt: str, context: str, thinking_mode: bool) -> str:
     """Build the full prompt from system prompt, context, and user query."""
-    sys = _SYSTEM_PROMPT + (_THINKING_ADDENDUM if thinking_mode else "")
-    full = f"Context: {context}\n\n{prompt}" if context else prompt
-    return f"{sys}\n\nUser: {full}"
+    return _join_prompt(_PROMPT_HEAD_THINKING if thinking_mode else _PROMPT_HEAD, prompt, context)
+
+
+def _extract_response_text(response) -> Optional[str]:
+    """Response text, falling back to the first text part.
+
+    SDK properties like .text and .parts walk candidates[0].content on
+    every access, so each is read once into a local.
+    """
+    text = response.text
+    if text:
+        return text
+    for part in getattr(response, 'parts', None) or ():
+        part_text = getattr(part, 'text', None)
+        if part_text:
+            return part_text
+    return None
+
+
+def _first_inline_data(parts) -> Optional[bytes]:
+    """Raw bytes of the first part carrying inline_data, if any."""
+    for part in parts or ():
+        inline_data = getattr(part, 'inline_data', None)
+        if inline_data is not None:
+            data = getattr(inline_data, 'data', None)
+            if data is not None:
+                return data
+    return None
 
 
 def invoke_llm(
@@ -157,6 +348,7 @@ def invoke_llm(
         model_override: Optional model ID to override the default
     """
 
+    client = _get_client()
     if not client:
         logger.error("Gemini client not initialized - missing API key")
         return None
@@ -164,8 +356,6 @@ def invoke_llm(
     model = model_override or LLM_MODEL_ID
 
     try:
-        from google.genai import types
-
         combined_prompt = _build_prompt(prompt, context, thinking_mode)
 
         logger.info("Calling Gemini LLM", model=model, thinking_mode=thinking_mode)
@@ -180,14 +370,7 @@ def invoke_llm(
         )
 
         # Extract text from response
-        response_text = None
-        if response.text:
-            response_text = response.text
-        elif response.parts:
-            for part in response.parts:
-                if hasattr(part, 'text') and part.text:
-                    response_text = part.text
-                    break
+        response_text = _extract_response_text(response)
 
         if response_text:
             return clean_llm_response(response_text, keep_thinking=thinking_mode)
@@ -195,9 +378,7 @@ def invoke_llm(
         return None
 
     except Exception as e:
-        logger.error("Error invoking Gemini LLM", error=str(e))
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error invoking Gemini LLM", error=str(e))
         return None
 
 
@@ -215,6 +396,7 @@ def invoke_llm_streaming(
     Yields text chunks as they arrive from the model.
     Falls back silently if streaming is not available.
     """
+    client = _get_client()
     if not client:
         logger.error("Gemini client not initialized - missing API key")
         return
@@ -222,8 +404,6 @@ def invoke_llm_streaming(
     model = model_override or LLM_MODEL_ID
 
     try:
-        from google.genai import types
-
         combined_prompt = _build_prompt(prompt, context, thinking_mode)
 
         logger.info("Streaming Gemini LLM", model=model)
@@ -246,9 +426,7 @@ def invoke_llm_streaming(
                         yield part.text
 
     except Exception as e:
-        logger.error("Error in streaming Gemini LLM", error=str(e))
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in streaming Gemini LLM", error=str(e))
 
 
 def invoke_llm_with_files(
@@ -267,39 +445,18 @@ def invoke_llm_with_files(
         thinking_mode: If True, show model reasoning
     """
 
+    client = _get_client()
     if not client:
-        print("Gemini client not initialized - missing API key")
+        logger.error("Gemini client not initialized - missing API key")
         return None
 
     try:
-        from google.genai import types
-
-        # Build system prompt for file analysis
-        system_prompt = """You are MediBot, an expert medical assistant. You are analyzing medical documents and images provided by the user.
-
-## Your Approach:
-1. **Analyze the attached files** thoroughly - look for key medical information
-2. **Extract important data**: conditions, medications, test results, diagnoses
-3. **Summarize clearly** in simple language the user can understand
-4. **Provide context** about what the values mean
-5. **Suggest follow-up questions** they should ask their doctor
-
-## Guidelines:
-- Be thorough but concise
-- Highlight any abnormal values or concerns
-- Explain medical terms in simple language
-- Always recommend consulting a healthcare professional for medical decisions
-"""
-
-        if thinking_mode:
-            system_prompt += "\n\nShow your thinking process in <thinking>...</thinking> tags before your response."
-
         # Build content parts
         content_parts = []
 
         # Add text prompt
-        full_prompt = f"Context: {context}\n\n{prompt}" if context else prompt
-        content_parts.append(f"{system_prompt}\n\nUser: {full_prompt}")
+        head = _FILES_PROMPT_HEAD_THINKING if thinking_mode else _FILES_PROMPT_HEAD
+        content_parts.append(_join_prompt(head, prompt, context))
 
         # Add file parts
         for f in files:
@@ -309,11 +466,11 @@ def invoke_llm_with_files(
                     mime_type=f["mime_type"]
                 )
                 content_parts.append(file_part)
-                print(f"Added file: {f.get('filename', 'unknown')} ({f['mime_type']})")
+                logger.debug("Added file", filename=f.get('filename', 'unknown'), mime_type=f['mime_type'])
             except Exception as e:
-                print(f"Failed to add file {f.get('filename')}: {e}")
+                logger.warning("Failed to add file", filename=f.get('filename'), error=str(e))
 
-        print(f"Calling Gemini with {len(files)} files (model={LLM_MODEL_ID})")
+        logger.info("Calling Gemini with files", file_count=len(files), model=LLM_MODEL_ID)
 
         response = client.models.generate_content(
             model=LLM_MODEL_ID,
@@ -321,14 +478,7 @@ def invoke_llm_with_files(
         )
 
         # Extract text from response
-        response_text = None
-        if response.text:
-            response_text = response.text
-        elif response.parts:
-            for part in response.parts:
-                if hasattr(part, 'text') and part.text:
-                    response_text = part.text
-                    break
+        response_text = _extract_response_text(response)
 
         if response_text:
             return clean_llm_response(response_text, keep_thinking=thinking_mode)
@@ -336,9 +486,7 @@ def invoke_llm_with_files(
         return None
 
     except Exception as e:
-        print(f"Error invoking Gemini with files: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error invoking Gemini with files", error=str(e))
         return None
 
 
@@ -348,8 +496,9 @@ def generate_image(prompt: str, width: int = 512, height: int = 512) -> Optional
     Uses gemini-2.5-flash-image model which supports image output.
     Returns raw image bytes.
     """
+    client = _get_client()
     if not client:
-        print("Gemini client not initialized - missing API key")
+        logger.error("Gemini client not initialized - missing API key")
         return None
 
     try:
@@ -359,7 +508,7 @@ def generate_image(prompt: str, width: int = 512, height: int = 512) -> Optional
             f"anatomically accurate. Preferred size: {width}x{height}."
         )
 
-        print(f"Generating image with Gemini: {IMAGE_MODEL_ID}")
+        logger.debug("Generating image with Gemini", model=IMAGE_MODEL_ID)
 
         response = client.models.generate_content(
             model=IMAGE_MODEL_ID,
@@ -367,81 +516,166 @@ def generate_image(prompt: str, width: int = 512, height: int = 512) -> Optional
         )
 
         # Try candidates structure first (new SDK format)
-        if hasattr(response, 'candidates') and response.candidates:
-            for candidate in response.candidates:
-                if hasattr(candidate, 'content') and candidate.content:
-                    if hasattr(candidate.content, 'parts'):
-                        for part in candidate.content.parts:
-                            if hasattr(part, 'inline_data') and part.inline_data:
-                                if hasattr(part.inline_data, 'data'):
-                                    print("Image generated successfully!")
-                                    return part.inline_data.data
+        for candidate in getattr(response, 'candidates', None) or ():
+            content = getattr(candidate, 'content', None)
+            image_data = _first_inline_data(getattr(content, 'parts', None))
+            if image_data is not None:
+                logger.debug("Image generated successfully")
+                return image_data
 
         # Fall back to direct parts attribute (old SDK format)
-        if hasattr(response, 'parts') and response.parts:
-            for part in response.parts:
-                if hasattr(part, 'inline_data') and part.inline_data is not None:
-                    if hasattr(part.inline_data, 'data'):
-                        print("Image generated successfully!")
-                        return part.inline_data.data
-
-        print("No image found in Gemini response")
-        if hasattr(response, 'text') and response.text:
-            print(f"Response text: {response.text[:200]}...")
+        image_data = _first_inline_data(getattr(response, 'parts', None))
+        if image_data is not None:
+            logger.debug("Image generated successfully")
+            return image_data
+
+        logger.warning("No image found in Gemini response")
+        # Only materialize the text excerpt when debug logging is on
+        if logger.isEnabledFor(logging.DEBUG):
+            response_text = getattr(response, 'text', None)
+            if response_text:
+                logger.debug("Image response text", response_text=response_text[:200])
         return None
 
     except Exception as e:
-        print(f"Error generating image with Gemini: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error generating image with Gemini", error=str(e))
         return None
 
 
-def extract_treatment_steps(llm_response: str) -> List[Dict[str, str]]:
-    """Parse the LLM response to extract individual treatment steps."""
-    steps = []
-
-    step_pattern = r'\*?\*?Step\s*(\d+)[:\s]*\*?\*?\s*\[?([^\]\n]+)\]?\*?\*?'
-    matches = list(re.finditer(step_pattern, llm_response, re.IGNORECASE))
-
-    for i, match in enumerate(matches):
-        step_num = match.group(1)
-        title = match.group(2).strip().strip('*[]')
-
-        start_pos = match.end()
-        if i + 1 < len(matches):
-            end_pos = matches[i + 1].start()
-        else:
-            next_section = re.search(r'\n\*\*[^S]', llm_response[start_pos:])
-            end_pos = start_pos + next_section.start() if next_section else len(llm_response)
+# Recurring steps ("Call emergency services", "Stay calm") render the same
+# prompt across queries; keep recent images in memory, bounded by total bytes.
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+_image_cache: "OrderedDict[bytes, bytes]" = OrderedDict()
+_image_cache_bytes = 0
+_image_cache_lock = threading.Lock()
+
+
+def _image_cache_clear() -> None:
+    global _image_cache_bytes
+    with _image_cache_lock:
+        _image_cache.clear()
+        _image_cache_bytes = 0
+
+
+def generate_image_cached(prompt: str) -> Optional[bytes]:
+    """generate_image with a per-container LRU keyed by the prompt's hash."""
+    global _image_cache_bytes
+    key = hashlib.sha256(prompt.encode()).digest()
+    with _image_cache_lock:
+        cached = _image_cache.get(key)
+        if cached is not None:
+            _image_cache.move_to_end(key)
+            logger.debug("Step image cache hit")
+            return cached
+
+    image_bytes = generate_image(prompt)
+    if not image_bytes or len(image_bytes) > IMAGE_CACHE_MAX_BYTES:
+        return image_bytes
+
+    with _image_cache_lock:
+        if key not in _image_cache:
+            _image_cache[key] = image_bytes
+            _image_cache_bytes += len(image_bytes)
+            while _image_cache_bytes > IMAGE_CACHE_MAX_BYTES:
+                _, evicted = _image_cache.popitem(last=False)
+                _image_cache_bytes -= len(evicted)
+    return image_bytes
+
+
+# "**Step 3: [Title]**" style header, matched against a stripped line.
+# Every repetition is bounded so lines full of asterisks or very long
+# titles can't make the engine backtrack.
+_STEP_HEADER_RE = re.compile(
+    r'\*{0,2}Step[ \t]*(\d{1,3})[:\s]{0,3}\*{0,2}[ \t]*\[?([^\]\n]{1,120})\]?\*{0,2}', re.IGNORECASE
+)
+_LEADING_STARS_RE = re.compile(r'^\*?\*?\s*')
+_NON_DIGIT_RE = re.compile(r'\D')
+
+
+class StepStreamParser:
+    """
+    Incremental treatment-step parser.
 
-        description = llm_response[start_pos:end_pos].strip()
-        description = re.sub(r'^\*?\*?\s*', '', description)[:300]
+    Single forward pass over lines: a step header opens a new step, any
+    other bold section header (e.g. "**⚠️ Warnings**") closes it. Text can
+    be fed in arbitrary chunks (e.g. streamed LLM tokens); feed() returns
+    the steps completed so far so work on them can start early.
+    """
 
-        steps.append({
-            'step_number': step_num,
-            'title': title,
-            'description': description
-        })
+    def __init__(self):
+        # Chunks of the current unterminated line; joined only once a
+        # newline arrives so a long line streamed token by token stays linear.
+        self._partial: List[str] = []
+        self._current: Optional[Dict[str, str]] = None
+        self._body: List[str] = []
+
+    def feed(self, text: str) -> List[Dict[str, str]]:
+        """Consume a chunk of text and return any steps it completed."""
+        if "\n" not in text:
+            self._partial.append(text)
+            return []
+        self._partial.append(text)
+        lines = "".join(self._partial).split("\n")
+        self._partial = [lines.pop()]
+        return self._consume(lines)
+
+    def close(self) -> List[Dict[str, str]]:
+        """Flush buffered text and return the remaining steps."""
+        tail = "".join(self._partial)
+        lines = [tail] if tail else []
+        self._partial = []
+        completed = self._consume(lines)
+        if self._current is not None:
+            completed.append(self._finish_step())
+        return completed
+
+    def _consume(self, lines: List[str]) -> List[Dict[str, str]]:
+        completed = []
+        for line in lines:
+            line = line.rstrip("\r")
+            match = _STEP_HEADER_RE.match(line.strip())
+            if match:
+                if self._current is not None:
+                    completed.append(self._finish_step())
+                self._current = {
+                    'step_number': match.group(1),
+                    'title': match.group(2).strip().strip('*[]'),
+                    'description': '',
+                }
+                self._body = [line.strip()[match.end():]]
+            elif self._current is not None:
+                if line.startswith('**') and not line.startswith('**S'):
+                    completed.append(self._finish_step())
+                else:
+                    self._body.append(line)
+        return completed
+
+    def _finish_step(self) -> Dict[str, str]:
+        step = self._current
+        description = "\n".join(self._body).strip()
+        # Skip leading "**" by index and slice the 300-char window once,
+        # instead of re.sub copying the whole body before truncating.
+        start = _LEADING_STARS_RE.match(description).end()
+        step['description'] = description[start:start + 300]
+        self._current = None
+        self._body = []
+        return step
 
-    return steps
 
+def extract_treatment_steps(llm_response: str) -> List[Dict[str, str]]:
+    """Parse the LLM response to extract individual treatment steps."""
+    parser = StepStreamParser()
+    return parser.feed(llm_response) + parser.close()
 
-def create_step_visual_guide_prompt(step: Dict[str, str], query: str) -> str:
-    """
-    Create a 4-panel grid prompt for ONE step.
-    Each panel shows a different aspect of the same step.
-    """
-    _query_lower = query.lower()  # noqa: F841
 
-    # Formal Production-Grade Image Prompt Template
-    prompt = f"""Generate a medically informative visual guide using a 2×2 grid layout.
+# Formal Production-Grade Image Prompt Template (filled once per step)
+_STEP_VISUAL_GUIDE_TEMPLATE = """Generate a medically informative visual guide using a 2×2 grid layout.
 
 Context:
-This image explains Step {step['step_number']} of a medical assistance guide.
+This image explains Step {step_number} of a medical assistance guide.
 
 Step Description:
-"{step['title']}: {step['description'][:200]}"
+"{title}: {description}"
 
 Grid Requirements:
 Each panel must visually represent one sub-direction of the same step:
@@ -472,16 +706,39 @@ Restrictions:
 - Avoid realism that may cause distress
 
 Purpose:
-This image must act as a complete visual explanation of Step {step['step_number']}.
+This image must act as a complete visual explanation of Step {step_number}.
 """
-    return prompt
 
 
-def process_single_step_image(step: Dict, query: str, query_hash: Optional[str] = None) -> Dict:
+def create_step_visual_guide_prompt(step: Dict[str, str], query: str) -> str:
+    """
+    Create a 4-panel grid prompt for ONE step.
+    Each panel shows a different aspect of the same step.
+    """
+    return _STEP_VISUAL_GUIDE_TEMPLATE.format(
+        step_number=step['step_number'],
+        title=step['title'],
+        description=step['description'][:200],
+    )
+
+
+def process_single_step_image(
+    step: Dict,
+    query: str,
+    query_hash: Optional[str] = None,
+    defer_upload: bool = False,
+    upload_to_s3: bool = True,
+) -> Dict:
     """
     Process a single step: generate a dedicated 4-panel image.
     Includes fallback handling for image generation failures.
+
+    With defer_upload=True the S3 upload is submitted to a background pool
+    and the result carries an 'upload_future' instead of 'image_url'/'s3_key';
+    see _resolve_upload(). With upload_to_s3=False (or no IMAGES_BUCKET) the
+    image is only returned inline as base64 and S3 is not touched.
     """
+    upload_to_s3 = upload_to_s3 and bool(query_hash) and bool(IMAGES_BUCKET)
     step_number = step['step_number']
     title = step['title']
     description = step['description'][:200]
@@ -498,22 +755,25 @@ def process_single_step_image(step: Dict, query: str, query_hash: Optional[str]
         logger.info("Generating step visual guide", step_number=step_number)
 
         image_prompt = create_step_visual_guide_prompt(step, query)
-        image_bytes = generate_image(image_prompt)
+        image_bytes = generate_image_cached(image_prompt)
         image_url = None
         image_b64 = None
         image_failed = False
         s3_key = None
+        upload_future = None
 
         if image_bytes:
-            image_b64 = base64.b64encode(image_bytes).decode('utf-8')
-            if query_hash:
+            image_b64 = base64.b64encode(image_bytes).decode('ascii')
+            if upload_to_s3 and defer_upload:
+                upload_future = _S3_UPLOAD_POOL.submit(upload_image_to_s3, image_bytes, step_number, query_hash)
+            elif upload_to_s3:
                 image_url, s3_key = upload_image_to_s3(image_bytes, step_number, query_hash)
         else:
             # Tier 1: Image generation returned None
             image_failed = True
             logger.warning("Image generation returned None", step=step_number)
 
-        return {
+        result = {
             'step_number': step_number,
             'title': title,
             'description': description,
@@ -526,6 +786,9 @@ def process_single_step_image(step: Dict, query: str, query_hash: Optional[str]
             'image_failed': image_failed,
             'fallback_text': fallback_text if image_failed else None
         }
+        if upload_future is not None:
+            result['upload_future'] = upload_future
+        return result
 
     except Exception as e:
         # Tier 1: Exception during image generation
@@ -542,6 +805,17 @@ def process_single_step_image(step: Dict, query: str, query_hash: Optional[str]
         }
 
 
+def _resolve_upload(result: Dict) -> None:
+    """Fill in image_url/s3_key from a deferred upload; keeps the base64 image on failure."""
+    future = result.pop('upload_future', None)
+    if future is None:
+        return
+    try:
+        result['image_url'], result['s3_key'] = future.result(timeout=S3_UPLOAD_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.warning("Deferred S3 upload did not complete", step=result.get('step_number'), error=str(e))
+
+
 def calculate_image_budget(
     total_steps: int,
     elapsed_seconds: float = 0.0,
@@ -614,19 +888,8 @@ def prioritize_steps(steps: List[Dict], budget: int) -> List[Dict]:
     return prioritized
 
 
-def generate_all_step_images(
-    steps: List[Dict],
-    query: str,
-    query_hash: Optional[str] = None,
-    elapsed_seconds: float = 0.0
-) -> List[Dict]:
-    """
-    Generate images using Step-Aligned Visual Guidance.
-    1 step → 1 image (4-panel grid explaining that step in depth).
-
-    Dynamic time budgeting: calculates how many images fit in remaining
-    Lambda execution time, then prioritizes the most important steps.
-    """
+def _select_steps_for_images(steps: List[Dict], elapsed_seconds: float) -> List[Dict]:
+    """Apply the time budget and step prioritization to the parsed steps."""
     # Dynamic budget based on time remaining
     budget = calculate_image_budget(
         total_steps=len(steps),
@@ -643,58 +906,185 @@ def generate_all_step_images(
     logger.info("Generating step-aligned images",
                 step_count=len(steps_to_generate),
                 budget=budget)
+    return steps_to_generate
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        future_to_step = {
-            executor.submit(process_single_step_image, step, query, query_hash): step
-            for step in steps_to_generate
-        }
 
-        results = []
-        for future in concurrent.futures.as_completed(future_to_step):
-            result = future.result()
-            results.append(result)
+def _step_sort_key(result: Dict) -> int:
+    """Numeric step order; malformed step numbers sort first instead of aborting the sort."""
+    digits = _NON_DIGIT_RE.sub('', str(result.get('step_number') or ''))
+    return int(digits) if digits else 0
 
-    # Sort by step number
+
+def _sort_by_step_number(results: List[Dict]) -> None:
+    results.sort(key=_step_sort_key)
+
+
+def generate_all_step_images(
+    steps: List[Dict],
+    query: str,
+    query_hash: Optional[str] = None,
+    elapsed_seconds: float = 0.0,
+    upload_to_s3: bool = True,
+) -> List[Dict]:
+    """
+    Generate images using Step-Aligned Visual Guidance.
+    1 step → 1 image (4-panel grid explaining that step in depth).
+
+    Dynamic time budgeting: calculates how many images fit in remaining
+    Lambda execution time, then prioritizes the most important steps.
+    Pass upload_to_s3=False when only the inline base64 image is used.
+    """
+    steps_to_generate = _select_steps_for_images(steps, elapsed_seconds)
+    if not steps_to_generate:
+        return []
+
+    futures = [
+        _IMAGE_EXECUTOR.submit(process_single_step_image, step, query, query_hash, True, upload_to_s3)
+        for step in steps_to_generate
+    ]
+    results = [future.result() for future in concurrent.futures.as_completed(futures)]
+
+    # Uploads overlapped with the remaining generations; collect their URLs
+    for result in results:
+        _resolve_upload(result)
+
+    _sort_by_step_number(results)
+    return results
+
+
+async def _resolve_upload_async(result: Dict) -> None:
+    """Awaitable _resolve_upload: waits on the upload without blocking a thread."""
+    future = result.pop('upload_future', None)
+    if future is None:
+        return
     try:
-        results.sort(key=lambda x: int(re.sub(r'\D', '', str(x['step_number']))))
-    except Exception:
-        pass
+        result['image_url'], result['s3_key'] = await asyncio.wait_for(
+            asyncio.wrap_future(future), timeout=S3_UPLOAD_TIMEOUT_SECONDS
+        )
+    except Exception as e:
+        logger.warning("Deferred S3 upload did not complete", step=result.get('step_number'), error=str(e))
+
+
+async def generate_all_step_images_async(
+    steps: List[Dict],
+    query: str,
+    query_hash: Optional[str] = None,
+    elapsed_seconds: float = 0.0,
+    upload_to_s3: bool = True,
+) -> List[Dict]:
+    """
+    generate_all_step_images for async callers.
 
+    The Gemini SDK calls are blocking, so each step still runs on the image
+    pool, but the fan-out and the S3 uploads are awaited on the caller's
+    event loop instead of parking a threadpool worker until they finish.
+    """
+    steps_to_generate = _select_steps_for_images(steps, elapsed_seconds)
+    if not steps_to_generate:
+        return []
+
+    loop = asyncio.get_running_loop()
+    results = list(await asyncio.gather(*(
+        loop.run_in_executor(
+            _IMAGE_EXECUTOR, process_single_step_image, step, query, query_hash, True, upload_to_s3
+        )
+        for step in steps_to_generate
+    )))
+    await asyncio.gather(*(_resolve_upload_async(result) for result in results))
+
+    _sort_by_step_number(results)
     return results
 
 
+class StepImagePipeline:
+    """
+    Parse treatment steps while the LLM response is still streaming.
+
+    Feed streamed text chunks; steps are collected as their descriptions
+    complete, so they are ready when the stream ends. No image is started
+    until finish(), which the caller runs only once output safety has
+    passed, and which applies the same time budget and step prioritization
+    as generate_all_step_images.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        query_hash: Optional[str] = None,
+        upload_to_s3: bool = True,
+    ):
+        self._query = query
+        self._query_hash = query_hash
+        self._upload_to_s3 = upload_to_s3
+        self._parser = StepStreamParser()
+        self._steps: List[Dict] = []
+
+    def feed(self, text: str) -> None:
+        """Consume a streamed chunk and collect any steps it completed."""
+        self._steps.extend(self._parser.feed(text))
+
+    async def finish(self, elapsed_seconds: float = 0.0) -> List[Dict]:
+        """Flush the last step and generate images for the prioritized steps."""
+        self._steps.extend(self._parser.close())
+        return await generate_all_step_images_async(
+            self._steps, self._query, self._query_hash, elapsed_seconds, upload_to_s3=self._upload_to_s3
+        )
+
+
+_VISUAL_KEYWORDS = [
+    "cpr", "cardiopulmonary", "chest compression", "heimlich",
+    "bandage", "wrap", "splint", "immobilize", "position",
+    "wound", "cut", "bleeding", "burn", "fracture", "sprain",
+    "treat", "treatment", "first aid", "apply", "clean", "dress",
+    "choking", "fainting", "unconscious", "recovery position",
+    "how to", "steps", "procedure"
+]
+
+# One alternation scanned in a single pass (substring semantics, like the
+# old per-keyword `in` checks) instead of one scan per keyword.
+_VISUAL_KEYWORDS_RE = re.compile("|".join(map(re.escape, _VISUAL_KEYWORDS)), re.IGNORECASE)
+
+
 def should_generate_images(query: str, response: str) -> bool:
     """Determine if step-by-step images should be generated."""
-    visual_keywords = [
-        "cpr", "cardiopulmonary", "chest compression", "heimlich",
-        "bandage", "wrap", "splint", "immobilize", "position",
-        "wound", "cut", "bleeding", "burn", "fracture", "sprain",
-        "treat", "treatment", "first aid", "apply", "clean", "dress",
-        "choking", "fainting", "unconscious", "recovery position",
-        "how to", "steps", "procedure"
-    ]
+    return bool(_VISUAL_KEYWORDS_RE.search(query) or (response and _VISUAL_KEYWORDS_RE.search(response)))
+
 
-    combined_text = (query + " " + response).lower()
-    return any(keyword in combined_text for keyword in visual_keywords)
+_MEDICAL_TOPICS = {
+    "cpr": ["cpr", "cardiopulmonary", "chest compression", "cardiac arrest"],
+    "choking": ["choking", "heimlich", "can't breathe", "airway blocked"],
+    "bleeding": ["bleeding", "wound", "cut", "blood", "laceration"],
+    "burn": ["burn", "burned", "scalded"],
+    "fracture": ["fracture", "broken bone", "broken arm", "broken leg"],
+    "fainting": ["fainting", "fainted", "unconscious", "passed out"],
+    "sprain": ["sprain", "twisted", "ankle", "wrist injury"],
+}
+
+
+def _keyword_stem(keyword: str) -> str:
+    """Drop a trailing silent "e" so inflections match ("fracture" -> "fractur" -> "fractured")."""
+    return keyword[:-1] if keyword.endswith("e") and len(keyword) > 3 else keyword
+
+
+# One pattern per topic, compiled once. Single words match as prefixes that
+# start at a word boundary, so inflected forms ("fractured", "burning",
+# "cutting") count while "cut" inside "acute" does not; phrases keep the
+# plain substring match.
+_TOPIC_RES = {
+    topic: re.compile("|".join(
+        re.escape(kw) if not kw.isalpha() else r"\b" + re.escape(_keyword_stem(kw))
+        for kw in keywords
+    ))
+    for topic, keywords in _MEDICAL_TOPICS.items()
+}
 
 
 def detect_medical_topic(query: str) -> Optional[str]:
     """Detect the primary medical topic from the query."""
     query_lower = query.lower()
 
-    topics = {
-        "cpr": ["cpr", "cardiopulmonary", "chest compression", "cardiac arrest"],
-        "choking": ["choking", "heimlich", "can't breathe", "airway blocked"],
-        "bleeding": ["bleeding", "wound", "cut", "blood", "laceration"],
-        "burn": ["burn", "burned", "scalded"],
-        "fracture": ["fracture", "broken bone", "broken arm", "broken leg"],
-        "fainting": ["fainting", "fainted", "unconscious", "passed out"],
-        "sprain": ["sprain", "twisted", "ankle", "wrist injury"],
-    }
-
-    for topic, keywords in topics.items():
-        if any(keyword in query_lower for keyword in keywords):
+    for topic, pattern in _TOPIC_RES.items():
+        if pattern.search(query_lower):
             return topic
 
     return None
@@ -10,35 +10,113 @@ Stores:
 """
 
 import os
-import boto3
-from typing import Any, Dict, Optional
-from datetime import datetime
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+from aws_lambda_powertools import Logger
+
+from aws_clients import get_dynamodb_client, get_dynamodb_table
+
+logger = Logger(service="medibot")
 
 # Environment variables
 HEALTH_PROFILE_TABLE = os.getenv("HEALTH_PROFILE_TABLE", "medibot-health-profiles-production")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 
-# DynamoDB client
-dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
+# Table resource and low-level client, built once per container and reused by every call
+_table = None
+_client = None
+
+# Transient DynamoDB errors a profile write is retried on; everything else
+# (validation, failed conditions, access errors) is raised straight away
+_RETRYABLE_ERRORS = frozenset({
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "InternalServerError",
+    "InternalServerErrorException",
+    "RequestLimitExceeded",
+})
+WRITE_MAX_ATTEMPTS = int(os.getenv("PROFILE_WRITE_MAX_ATTEMPTS", "3"))
+
+# Fallback for the rare non-string entry field on the low-level write path
+_serializer = TypeSerializer()
+
+# Attributes rendered by get_context_summary; report_summaries etc. are left out
+_CONTEXT_PROJECTION = (
+    "conditions, medications, allergies, age, gender, key_facts, last_updated, context_updated_at"
+)
+
+# Writes that change the rendered fields stamp context_updated_at. The first read
+# after a change renders the block and stores it in context_summary_cached, tagged
+# with the stamp it was built from (context_summary_at); later reads fetch just
+# these and use the block while it is fresh.
+_MATERIALIZED_PROJECTION = (
+    "user_id, last_updated, context_updated_at, context_summary_at, context_summary_cached"
+)
+
+# Profiles without a fresh materialized block (no context_updated_at stamp, or
+# whose block write failed) are rendered here; keep recent renders per
+# container, tagged with the profile's last_updated so any write invalidates them.
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "512"))
+_context_cache: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+_context_cache_lock = threading.Lock()
+
+# Profile lists and the string sets holding their lowercased keys for dedup
+_LIST_KEY_ATTRS = {
+    "conditions": "condition_keys",
+    "medications": "medication_keys",
+    "allergies": "allergy_keys",
+    "key_facts": "key_fact_keys",
+}
+
+
+def _now() -> str:
+    """Current UTC time as an ISO 8601 string."""
+    return datetime.now(timezone.utc).isoformat()
 
 
 def get_table():
     """Get the DynamoDB table resource."""
-    return dynamodb.Table(HEALTH_PROFILE_TABLE)
+    global _table
+    if _table is None:
+        _table = get_dynamodb_table(HEALTH_PROFILE_TABLE)
+    return _table
+
 
+def get_client():
+    """Get the low-level DynamoDB client used by the add_* write paths."""
+    global _client
+    if _client is None:
+        _client = get_dynamodb_client()
+    return _client
 
-def get_health_profile(user_id: str) -> Optional[Dict[str, Any]]:
+
+def get_health_profile(user_id: str, projection: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
     Get a user's complete health profile.
 
+    Args:
+        user_id: User identifier
+        projection: Optional ProjectionExpression to fetch only some attributes
+
     Returns None if no profile exists.
     """
     try:
         table = get_table()
-        response = table.get_item(Key={"user_id": user_id})
+        kwargs = {"Key": {"user_id": user_id}}
+        if projection:
+            kwargs["ProjectionExpression"] = projection
+        response = table.get_item(**kwargs)
         return response.get("Item")
     except Exception as e:
-        print(f"Error getting health profile: {e}")
+        logger.exception("Error getting health profile", error=str(e))
         return None
 
 
@@ -46,6 +124,7 @@ def create_health_profile(user_id: str) -> Dict[str, Any]:
     """
     Create a new empty health profile for a user.
     """
+    now = _now()
     profile = {
         "user_id": user_id,
         "conditions": [],
@@ -56,17 +135,16 @@ def create_health_profile(user_id: str) -> Dict[str, Any]:
         "gender": "",
         "key_facts": [],
         "report_summaries": [],
-        "created_at": datetime.utcnow().isoformat(),
-        "last_updated": datetime.utcnow().isoformat()
+        "created_at": now,
+        "last_updated": now
     }
 
     try:
         table = get_table()
-        table.put_item(Item=profile)
-        print(f"Created health profile for user {user_id[:8]}...")
+        table.put_item(Item=profile, ReturnValues="NONE", ReturnConsumedCapacity="NONE")
         return profile
     except Exception as e:
-        print(f"Error creating health profile: {e}")
+        logger.exception("Error creating health profile", error=str(e))
         return profile
 
 
@@ -80,6 +158,116 @@ def get_or_create_profile(user_id: str) -> Dict[str, Any]:
     return profile
 
 
+def _entry_attr(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the low-level map value for a profile entry.
+
+    Entries are almost always flat string dicts, so those fields are wrapped
+    directly; anything else goes through the TypeSerializer.
+    """
+    return {"M": {
+        field: {"S": value} if isinstance(value, str) else _serializer.serialize(value)
+        for field, value in entry.items()
+    }}
+
+
+def _append_unique(user_id: str, list_attr: str, keys_attr: str, key: str, entry: Dict[str, Any]) -> bool:
+    """
+    Append an entry to one of the profile lists with a single UpdateItem.
+
+    The lowercased key is kept in a parallel string set so the condition
+    expression rejects duplicates server-side as an O(1) set lookup instead
+    of a GetItem and a scan of the list; the update also creates the profile
+    row if it does not exist yet. Profiles written before the key sets
+    existed are covered by scripts/backfill_profile_keys.py.
+
+    Returns True if the entry was appended, False if it was already present.
+    """
+    now = entry["added_at"]
+    try:
+        # The low-level client skips the Table resource's (de)serialization layer
+        _call_with_backoff(
+            get_client().update_item,
+            TableName=HEALTH_PROFILE_TABLE,
+            Key={"user_id": {"S": user_id}},
+            UpdateExpression=(
+                f"SET {list_attr} = list_append(if_not_exists({list_attr}, :empty), :new), "
+                "created_at = if_not_exists(created_at, :now), last_updated = :now, context_updated_at = :now "
+                f"ADD {keys_attr} :keyset"
+            ),
+            ConditionExpression=f"attribute_not_exists({keys_attr}) OR NOT contains({keys_attr}, :key)",
+            ExpressionAttributeValues={
+                ":new": {"L": [_entry_attr(entry)]},
+                ":empty": {"L": []},
+                ":now": {"S": now},
+                ":key": {"S": key},
+                ":keyset": {"SS": [key]}
+            },
+            ReturnValues="NONE",
+            ReturnValuesOnConditionCheckFailure="NONE",
+            ReturnConsumedCapacity="NONE"
+        )
+        return True
+    except ClientError as e:
+        if _is_conditional_check_failed(e):
+            return False
+        raise
+
+
+def _call_with_backoff(operation, **kwargs):
+    """
+    Run a DynamoDB write, backing off exponentially on transient errors only.
+
+    botocore already retries these internally; this outer loop covers a
+    throttling burst that outlasts its budget, so the profile update is not
+    silently dropped.
+    """
+    for attempt in range(WRITE_MAX_ATTEMPTS):
+        try:
+            return operation(**kwargs)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code not in _RETRYABLE_ERRORS or attempt == WRITE_MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt + random.random() * 0.05)
+
+
+def _is_conditional_check_failed(error: ClientError) -> bool:
+    """Check whether a ClientError is a failed condition expression."""
+    return error.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+def _store_context(user_id: str, profile: Dict[str, Any], context: str) -> None:
+    """
+    Store a context block rendered by get_context_summary on the profile.
+
+    The write is conditioned on context_updated_at still matching the version
+    the block was rendered from, so a slower writer can't overwrite a newer
+    block. Failures are only logged; the next read renders again.
+    """
+    version = profile.get("context_updated_at")
+    if not version:
+        return
+
+    try:
+        get_table().update_item(
+            Key={"user_id": user_id},
+            UpdateExpression="SET context_summary_cached = :ctx, context_summary_at = :at",
+            ConditionExpression="context_updated_at = :at",
+            ExpressionAttributeValues={
+                ":ctx": context,
+                ":at": version
+            },
+            ReturnValues="NONE",
+            ReturnConsumedCapacity="NONE"
+        )
+    except ClientError as e:
+        if not _is_conditional_check_failed(e):
+            logger.exception("Error storing context summary", error=str(e))
+    except Exception as e:
+        logger.exception("Error storing context summary", error=str(e))
+
+
 def add_condition(user_id: str, condition: str, source: str = "manual") -> bool:
     """
     Add a medical condition to the user's profile.
@@ -89,37 +277,20 @@ def add_condition(user_id: str, condition: str, source: str = "manual") -> bool:
         condition: Condition name (e.g., "Type 2 Diabetes")
         source: Where this info came from ("report", "chat", "manual")
     """
-    profile = get_or_create_profile(user_id)
-
-    # Check if condition already exists (case-insensitive)
-    existing = [c.get("name", "").lower() if isinstance(c, dict) else c.lower()
-                for c in profile.get("conditions", [])]
-    if condition.lower() in existing:
-        print(f"Condition '{condition}' already exists for user")
-        return True
-
     # Add new condition with metadata
     new_condition = {
         "name": condition,
-        "added_at": datetime.utcnow().isoformat(),
+        "added_at": _now(),
         "source": source
     }
 
     try:
-        table = get_table()
-        table.update_item(
-            Key={"user_id": user_id},
-            UpdateExpression="SET conditions = list_append(if_not_exists(conditions, :empty), :new), last_updated = :now",
-            ExpressionAttributeValues={
-                ":new": [new_condition],
-                ":empty": [],
-                ":now": datetime.utcnow().isoformat()
-            }
-        )
-        print(f"Added condition '{condition}' for user {user_id[:8]}...")
+        # Duplicates are rejected case-insensitively by the write itself
+        if not _append_unique(user_id, "conditions", "condition_keys", condition.lower(), new_condition):
+            logger.debug("Condition already in profile", user_id=user_id[:8])
         return True
     except Exception as e:
-        print(f"Error adding condition: {e}")
+        logger.exception("Error adding condition", error=str(e))
         return False
 
 
@@ -127,36 +298,19 @@ def add_medication(user_id: str, medication: str, dosage: str = "", source: str
     """
     Add a medication to the user's profile.
     """
-    profile = get_or_create_profile(user_id)
-
-    # Check if medication already exists
-    existing = [m.get("name", "").lower() if isinstance(m, dict) else m.lower()
-                for m in profile.get("medications", [])]
-    if medication.lower() in existing:
-        return True
-
     new_med = {
         "name": medication,
         "dosage": dosage,
-        "added_at": datetime.utcnow().isoformat(),
+        "added_at": _now(),
         "source": source
     }
 
     try:
-        table = get_table()
-        table.update_item(
-            Key={"user_id": user_id},
-            UpdateExpression="SET medications = list_append(if_not_exists(medications, :empty), :new), last_updated = :now",
-            ExpressionAttributeValues={
-                ":new": [new_med],
-                ":empty": [],
-                ":now": datetime.utcnow().isoformat()
-            }
-        )
-        print(f"Added medication '{medication}' for user {user_id[:8]}...")
+        if not _append_unique(user_id, "medications", "medication_keys", medication.lower(), new_med):
+            logger.debug("Medication already in profile", user_id=user_id[:8])
         return True
     except Exception as e:
-        print(f"Error adding medication: {e}")
+        logger.exception("Error adding medication", error=str(e))
         return False
 
 
@@ -164,33 +318,17 @@ def add_allergy(user_id: str, allergy: str, source: str = "manual") -> bool:
     """
     Add an allergy to the user's profile.
     """
-    profile = get_or_create_profile(user_id)
-
-    existing = [a.get("name", "").lower() if isinstance(a, dict) else a.lower()
-                for a in profile.get("allergies", [])]
-    if allergy.lower() in existing:
-        return True
-
     new_allergy = {
         "name": allergy,
-        "added_at": datetime.utcnow().isoformat(),
+        "added_at": _now(),
         "source": source
     }
 
     try:
-        table = get_table()
-        table.update_item(
-            Key={"user_id": user_id},
-            UpdateExpression="SET allergies = list_append(if_not_exists(allergies, :empty), :new), last_updated = :now",
-            ExpressionAttributeValues={
-                ":new": [new_allergy],
-                ":empty": [],
-                ":now": datetime.utcnow().isoformat()
-            }
-        )
+        _append_unique(user_id, "allergies", "allergy_keys", allergy.lower(), new_allergy)
         return True
     except Exception as e:
-        print(f"Error adding allergy: {e}")
+        logger.exception("Error adding allergy", error=str(e))
         return False
 
 
@@ -203,34 +341,118 @@ def add_key_fact(user_id: str, fact: str, source: str = "chat") -> bool:
     - "Had knee surgery in 2020"
     - "Vegetarian diet"
     """
-    profile = get_or_create_profile(user_id)
-
-    # Check for similar existing facts (exact match)
-    existing = [f.get("text", "").lower() if isinstance(f, dict) else f.lower()
-                for f in profile.get("key_facts", [])]
-    if fact.lower() in existing:
-        return True
-
     new_fact = {
         "text": fact,
-        "added_at": datetime.utcnow().isoformat(),
+        "added_at": _now(),
         "source": source
     }
 
     try:
-        table = get_table()
-        table.update_item(
-            Key={"user_id": user_id},
-            UpdateExpression="SET key_facts = list_append(if_not_exists(key_facts, :empty), :new), last_updated = :now",
-            ExpressionAttributeValues={
-                ":new": [new_fact],
-                ":empty": [],
-                ":now": datetime.utcnow().isoformat()
-            }
-        )
+        _append_unique(user_id, "key_facts", "key_fact_keys", fact.lower(), new_fact)
+        return True
+    except Exception as e:
+        logger.exception("Error adding key fact", error=str(e))
+        return False
+
+
+def bulk_add(
+    user_id: str,
+    conditions: Optional[List[str]] = None,
+    medications: Optional[List[Any]] = None,
+    allergies: Optional[List[str]] = None,
+    key_facts: Optional[List[str]] = None,
+    source: str = "report"
+) -> bool:
+    """
+    Add several conditions, medications, allergies and key facts at once.
+
+    All lists are appended by one UpdateItem instead of one call per entry.
+    If some entries already exist, the failed condition check returns the
+    old key sets, which are filtered out before retrying. Medications may be
+    names or {"name", "dosage"} dicts.
+    """
+    now = _now()
+
+    # list_attr -> {lowercased key: entry}, deduplicated within the batch
+    pending: Dict[str, Dict[str, Dict[str, Any]]] = {attr: {} for attr in _LIST_KEY_ATTRS}
+    for condition in conditions or []:
+        if condition:
+            pending["conditions"].setdefault(
+                condition.lower(), {"name": condition, "added_at": now, "source": source}
+            )
+    for med in medications or []:
+        name = med.get("name", "") if isinstance(med, dict) else med
+        dosage = med.get("dosage", "") if isinstance(med, dict) else ""
+        if name:
+            pending["medications"].setdefault(
+                name.lower(), {"name": name, "dosage": dosage, "added_at": now, "source": source}
+            )
+    for allergy in allergies or []:
+        if allergy:
+            pending["allergies"].setdefault(
+                allergy.lower(), {"name": allergy, "added_at": now, "source": source}
+            )
+    for fact in key_facts or []:
+        if fact:
+            pending["key_facts"].setdefault(
+                fact.lower(), {"text": fact, "added_at": now, "source": source}
+            )
+
+    try:
+        client = get_client()
+
+        for _ in range(2):
+            pending = {attr: entries for attr, entries in pending.items() if entries}
+            if not pending:
+                return True
+
+            set_parts = [
+                "created_at = if_not_exists(created_at, :now)",
+                "last_updated = :now",
+                "context_updated_at = :now"
+            ]
+            add_parts = []
+            checks = []
+            values: Dict[str, Any] = {":empty": {"L": []}, ":now": {"S": now}}
+            for i, (list_attr, entries) in enumerate(pending.items()):
+                keys_attr = _LIST_KEY_ATTRS[list_attr]
+                set_parts.append(f"{list_attr} = list_append(if_not_exists({list_attr}, :empty), :new{i})")
+                add_parts.append(f"{keys_attr} :keyset{i}")
+                values[f":new{i}"] = {"L": [_entry_attr(entry) for entry in entries.values()]}
+                values[f":keyset{i}"] = {"SS": list(entries)}
+                for j, key in enumerate(entries):
+                    checks.append(f"(attribute_not_exists({keys_attr}) OR NOT contains({keys_attr}, :key{i}_{j}))")
+                    values[f":key{i}_{j}"] = {"S": key}
+
+            try:
+                _call_with_backoff(
+                    client.update_item,
+                    TableName=HEALTH_PROFILE_TABLE,
+                    Key={"user_id": {"S": user_id}},
+                    UpdateExpression="SET " + ", ".join(set_parts) + " ADD " + ", ".join(add_parts),
+                    ConditionExpression=" AND ".join(checks),
+                    ExpressionAttributeValues=values,
+                    ReturnValues="NONE",
+                    ReturnValuesOnConditionCheckFailure="ALL_OLD",
+                    ReturnConsumedCapacity="NONE"
+                )
+                return True
+            except ClientError as e:
+                if not _is_conditional_check_failed(e):
+                    raise
+                # Drop the entries the profile already has and try again
+                old_item = e.response.get("Item", {})
+                for list_attr, entries in pending.items():
+                    for key in old_item.get(_LIST_KEY_ATTRS[list_attr], {}).get("SS", []):
+                        entries.pop(key, None)
+
+        # Still conflicting with a concurrent writer; fall back to one write per entry
+        for list_attr, entries in pending.items():
+            for key, entry in entries.items():
+                _append_unique(user_id, list_attr, _LIST_KEY_ATTRS[list_attr], key, entry)
         return True
     except Exception as e:
-        print(f"Error adding key fact: {e}")
+        logger.exception("Error bulk adding to health profile", error=str(e))
         return False
 
 
@@ -243,31 +465,34 @@ def add_report_summary(
     """
     Add a summarized report to the user's profile.
     """
+    now = _now()
     new_summary = {
         "summary": summary,
         "report_type": report_type,
         "source_file": source_file,
-        "added_at": datetime.utcnow().isoformat()
+        "added_at": now
     }
 
     try:
         table = get_table()
-
-        # First ensure profile exists
-        get_or_create_profile(user_id)
-
-        table.update_item(
+        _call_with_backoff(
+            table.update_item,
             Key={"user_id": user_id},
-            UpdateExpression="SET report_summaries = list_append(if_not_exists(report_summaries, :empty), :new), last_updated = :now",
+            UpdateExpression=(
+                "SET report_summaries = list_append(if_not_exists(report_summaries, :empty), :new), "
+                "created_at = if_not_exists(created_at, :now), last_updated = :now"
+            ),
             ExpressionAttributeValues={
                 ":new": [new_summary],
                 ":empty": [],
-                ":now": datetime.utcnow().isoformat()
-            }
+                ":now": now
+            },
+            ReturnValues="NONE",
+            ReturnConsumedCapacity="NONE"
         )
         return True
     except Exception as e:
-        print(f"Error adding report summary: {e}")
+        logger.exception("Error adding report summary", error=str(e))
         return False
 
 
@@ -284,8 +509,8 @@ def update_basic_info(
         table = get_table()
 
         # Build update expression dynamically
-        update_parts = ["last_updated = :now"]
-        values = {":now": datetime.utcnow().isoformat()}
+        update_parts = ["created_at = if_not_exists(created_at, :now)", "last_updated = :now"]
+        values = {":now": _now()}
 
         if age is not None:
             update_parts.append("age = :age")
@@ -299,17 +524,22 @@ def update_basic_info(
             update_parts.append("blood_type = :blood_type")
             values[":blood_type"] = blood_type
 
-        # Ensure profile exists first
-        get_or_create_profile(user_id)
+        # Age and gender are part of the rendered context; blood type is not
+        if age is not None or gender is not None:
+            update_parts.append("context_updated_at = :now")
 
-        table.update_item(
+        # The update creates the profile row if it does not exist yet
+        _call_with_backoff(
+            table.update_item,
             Key={"user_id": user_id},
             UpdateExpression="SET " + ", ".join(update_parts),
-            ExpressionAttributeValues=values
+            ExpressionAttributeValues=values,
+            ReturnValues="NONE",
+            ReturnConsumedCapacity="NONE"
         )
         return True
     except Exception as e:
-        print(f"Error updating basic info: {e}")
+        logger.exception("Error updating basic info", error=str(e))
         return False
 
 
@@ -323,66 +553,94 @@ def get_context_summary(user_id: str) -> str:
     Returns:
         A formatted string with the user's health context, or empty string if no profile.
     """
-    profile = get_health_profile(user_id)
+    # One small read: the version stamps plus the materialized block
+    stamp = get_health_profile(user_id, projection=_MATERIALIZED_PROJECTION)
+
+    if not stamp:
+        with _context_cache_lock:
+            _context_cache.pop(user_id, None)
+        return ""
+
+    context_version = stamp.get("context_updated_at")
+    if context_version and stamp.get("context_summary_at") == context_version:
+        return stamp.get("context_summary_cached", "")
+
+    last_updated = stamp.get("last_updated")
+    if last_updated:
+        with _context_cache_lock:
+            cached = _context_cache.get(user_id)
+            if cached is not None and cached[0] == last_updated:
+                _context_cache.move_to_end(user_id)
+                return cached[1]
+
+    profile = get_health_profile(user_id, projection=_CONTEXT_PROJECTION)
 
     if not profile:
         return ""
 
-    parts = []
+    context = _format_context(profile)
+    _store_context(user_id, profile, context)
 
-    # Add conditions
-    conditions = profile.get("conditions", [])
-    if conditions:
-        condition_names = [c.get("name", c) if isinstance(c, dict) else c for c in conditions]
-        parts.append(f"Medical conditions: {', '.join(condition_names)}")
+    last_updated = profile.get("last_updated")
+    if last_updated:
+        with _context_cache_lock:
+            _context_cache[user_id] = (last_updated, context)
+            _context_cache.move_to_end(user_id)
+            while len(_context_cache) > CONTEXT_CACHE_MAX_ENTRIES:
+                _context_cache.popitem(last=False)
 
-    # Add medications
-    medications = profile.get("medications", [])
-    if medications:
-        med_names = []
-        for m in medications:
-            if isinstance(m, dict):
-                name = m.get("name", "")
-                dosage = m.get("dosage", "")
-                med_names.append(f"{name} {dosage}".strip())
-            else:
-                med_names.append(m)
-        parts.append(f"Current medications: {', '.join(med_names)}")
+    return context
+
+
+def _context_cache_clear() -> None:
+    with _context_cache_lock:
+        _context_cache.clear()
 
-    # Add allergies
-    allergies = profile.get("allergies", [])
-    if allergies:
-        allergy_names = [a.get("name", a) if isinstance(a, dict) else a for a in allergies]
-        parts.append(f"Known allergies: {', '.join(allergy_names)}")
 
-    # Add basic info
+def _names(items: List[Any], key: str) -> List[str]:
+    """Pull the display text out of profile entries (legacy rows may hold bare strings)."""
+    return [item.get(key, "") if isinstance(item, dict) else item for item in items]
+
+
+def _format_context(profile: Dict[str, Any]) -> str:
+    """Render the health context block for a profile in a single pass."""
+    conditions = profile.get("conditions")
+    medications = profile.get("medications")
+    allergies = profile.get("allergies")
     age = profile.get("age")
     gender = profile.get("gender")
-    if age or gender:
-        info = []
-        if age:
-            info.append(f"Age: {age}")
-        if gender:
-            info.append(f"Gender: {gender}")
-        parts.append(", ".join(info))
-
-    # Add key facts
-    key_facts = profile.get("key_facts", [])
-    if key_facts:
-        fact_texts = [f.get("text", f) if isinstance(f, dict) else f for f in key_facts]
-        parts.append(f"Other relevant information: {'; '.join(fact_texts)}")
+    key_facts = profile.get("key_facts")
 
-    if not parts:
+    if not (conditions or medications or allergies or age or gender or key_facts):
         return ""
 
-    # Format as a clear context block
-    context = """
-=== USER HEALTH CONTEXT ===
-{}
-===========================
-""".format("\n".join(f"• {part}" for part in parts))
+    lines = ["\n=== USER HEALTH CONTEXT ===\n"]
 
-    return context
+    if conditions:
+        lines.append("• Medical conditions: " + ", ".join(_names(conditions, "name")) + "\n")
+
+    if medications:
+        med_names = [
+            f"{m.get('name', '')} {m.get('dosage', '')}".strip() if isinstance(m, dict) else m
+            for m in medications
+        ]
+        lines.append("• Current medications: " + ", ".join(med_names) + "\n")
+
+    if allergies:
+        lines.append("• Known allergies: " + ", ".join(_names(allergies, "name")) + "\n")
+
+    if age and gender:
+        lines.append(f"• Age: {age}, Gender: {gender}\n")
+    elif age:
+        lines.append(f"• Age: {age}\n")
+    elif gender:
+        lines.append(f"• Gender: {gender}\n")
+
+    if key_facts:
+        lines.append("• Other relevant information: " + "; ".join(_names(key_facts, "text")) + "\n")
+
+    lines.append("===========================\n")
+    return "".join(lines)
 
 
 def delete_health_profile(user_id: str) -> bool:
@@ -391,11 +649,11 @@ def delete_health_profile(user_id: str) -> bool:
     """
     try:
         table = get_table()
-        table.delete_item(Key={"user_id": user_id})
-        print(f"Deleted health profile for user {user_id[:8]}...")
+        table.delete_item(Key={"user_id": user_id}, ReturnValues="NONE", ReturnConsumedCapacity="NONE")
+        logger.info("Deleted health profile", user_id=user_id[:8])
         return True
     except Exception as e:
-        print(f"Error deleting health profile: {e}")
+        logger.exception("Error deleting health profile", error=str(e))
         return False
 
 
@@ -403,28 +661,61 @@ def remove_condition(user_id: str, condition_name: str) -> bool:
     """
     Remove a specific condition from the user's profile.
     """
-    profile = get_health_profile(user_id)
-    if not profile:
-        return False
-
-    conditions = profile.get("conditions", [])
-    updated = [c for c in conditions
-               if (c.get("name", c) if isinstance(c, dict) else c).lower() != condition_name.lower()]
-
-    if len(updated) == len(conditions):
-        return False  # Condition not found
-
-    try:
-        table = get_table()
-        table.update_item(
-            Key={"user_id": user_id},
-            UpdateExpression="SET conditions = :conditions, last_updated = :now",
-            ExpressionAttributeValues={
-                ":conditions": updated,
-                ":now": datetime.utcnow().isoformat()
-            }
-        )
-        return True
-    except Exception as e:
-        print(f"Error removing condition: {e}")
-        return False
+    key = condition_name.lower()
+
+    # A concurrent write that shifts the list fails the guard; re-read once and retry
+    for attempt in range(2):
+        profile = get_health_profile(user_id)
+        if not profile:
+            return False
+
+        conditions = profile.get("conditions", [])
+        indexes = [i for i, c in enumerate(conditions)
+                   if (c.get("name", c) if isinstance(c, dict) else c).lower() == key]
+
+        if not indexes:
+            return False  # Condition not found
+
+        # Only the matched slots are removed, each guarded on still holding the same entry
+        values = {":now": _now(), ":keyset": {key}}
+        guards = []
+        for i in indexes:
+            entry = conditions[i]
+            if isinstance(entry, dict):
+                guards.append(f"conditions[{i}].#n = :name{i}")
+                values[f":name{i}"] = entry.get("name", "")
+            else:
+                guards.append(f"conditions[{i}] = :name{i}")
+                values[f":name{i}"] = entry
+
+        kwargs = {}
+        if any(isinstance(conditions[i], dict) for i in indexes):
+            kwargs["ExpressionAttributeNames"] = {"#n": "name"}
+
+        try:
+            _call_with_backoff(
+                get_table().update_item,
+                Key={"user_id": user_id},
+                UpdateExpression=(
+                    "REMOVE " + ", ".join(f"conditions[{i}]" for i in indexes) + " "
+                    "SET last_updated = :now, context_updated_at = :now "
+                    "DELETE condition_keys :keyset"
+                ),
+                ConditionExpression=" AND ".join(guards),
+                ExpressionAttributeValues=values,
+                ReturnValues="NONE",
+                ReturnValuesOnConditionCheckFailure="NONE",
+                ReturnConsumedCapacity="NONE",
+                **kwargs
+            )
+            return True
+        except ClientError as e:
+            if _is_conditional_check_failed(e) and attempt == 0:
+                continue
+            logger.exception("Error removing condition", error=str(e))
+            return False
+        except Exception as e:
+            logger.exception("Error removing condition", error=str(e))
+            return False
+
+    return False
@@ -10,19 +10,40 @@ _init_start = time.time()
 
 # Pre-import heavy modules during Lambda init phase
 from mangum import Mangum  # noqa: E402
-from api_server import app  # noqa: E402
+from api_server import app, HEALTH_STATUS  # noqa: E402
 
 # Pre-warm AWS connections during init (not on each request)
 from aws_clients import get_dynamodb_resource, get_s3_client  # noqa: E402
 get_dynamodb_resource()
 get_s3_client()
 
-# Pre-import the Gemini client to initialize the API connection
-import gemini_client  # noqa: E402, F401
+# Pre-import the Gemini client and build it during init, so the first request
+# that calls Gemini does not pay for SDK client setup
+import gemini_client  # noqa: E402
+gemini_client.get_genai_client()
 
 _init_ms = int((time.time() - _init_start) * 1000)
 print(f"Lambda init completed in {_init_ms}ms")
 
 # Mangum adapter for AWS Lambda + API Gateway
 # api_gateway_base_path strips the stage name (e.g., /production) from the path
-handler = Mangum(app, lifespan="off", api_gateway_base_path="/production")
+API_GATEWAY_BASE_PATH = "/production"
+_mangum = Mangum(app, lifespan="off", api_gateway_base_path=API_GATEWAY_BASE_PATH)
+
+# Health probes get a prebuilt response without FastAPI routing or ASGI translation
+_HEALTH_PATHS = frozenset({"/health", API_GATEWAY_BASE_PATH + "/health"})
+_HEALTH_RESPONSE = {
+    "statusCode": 200,
+    "headers": {"content-type": "application/json"},
+    "body": HEALTH_STATUS.model_dump_json(),
+    "isBase64Encoded": False,
+}
+
+
+def handler(event, context):
+    """Lambda entry point: answer health probes directly, route everything else through Mangum."""
+    path = event.get("rawPath") or event.get("path") or ""
+    method = event.get("httpMethod") or event.get("requestContext", {}).get("http", {}).get("method")
+    if method == "GET" and path in _HEALTH_PATHS:
+        return dict(_HEALTH_RESPONSE)
+    return _mangum(event, context)
@@ -10,10 +10,17 @@ Key Features:
 """
 
 import re
+from collections import defaultdict
 from typing import Optional, List, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
+# Optional: Aho-Corasick automaton for the injection prefilter (falls back to substring checks)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 
 # ============================================
 # Safety Configuration
@@ -40,50 +47,82 @@ class SafetyCheckResult:
 # Prompt Injection Detection
 # ============================================
 
-# Known prompt injection patterns
+# Known prompt injection patterns, each with a lowercase literal that every
+# match must contain. The literals prefilter the text so only patterns whose
+# anchor occurs are run as regexes.
 INJECTION_PATTERNS = [
     # System prompt overrides
-    r"ignore\s+(previous|all|above)\s+(instructions?|prompts?|rules?)",
-    r"disregard\s+(your|the)\s+(instructions?|prompts?|guidelines?)",
-    r"forget\s+(everything|your|previous)\s+(instructions?|training)?",
-    r"override\s+(your|the)\s+(system|instructions?)",
-    r"new\s+(instructions?|rules?)\s*:",
+    ("ignore", r"ignore\s+(previous|all|above)\s+(instructions?|prompts?|rules?)"),
+    ("disregard", r"disregard\s+(your|the)\s+(instructions?|prompts?|guidelines?)"),
+    ("forget", r"forget\s+(everything|your|previous)\s+(instructions?|training)?"),
+    ("override", r"override\s+(your|the)\s+(system|instructions?)"),
+    ("new", r"new\s+(instructions?|rules?)\s*:"),
 
     # Role manipulation
-    r"you\s+are\s+now\s+a?\s*(different|new|evil|unrestricted)",
-    r"pretend\s+you\s+are\s+(?!a\s+doctor|a\s+nurse|a\s+medical)",
-    r"act\s+as\s+(?!a\s+medical|a\s+health|a\s+doctor)",
-    r"roleplay\s+as\s+(?!a\s+medical|a\s+healthcare)",
-    r"switch\s+to\s+(dan|developer|unrestricted)\s+mode",
+    ("now", r"you\s+are\s+now\s+a?\s*(different|new|evil|unrestricted)"),
+    ("pretend", r"pretend\s+you\s+are\s+(?!a\s+doctor|a\s+nurse|a\s+medical)"),
+    ("act", r"act\s+as\s+(?!a\s+medical|a\s+health|a\s+doctor)"),
+    ("roleplay", r"roleplay\s+as\s+(?!a\s+medical|a\s+healthcare)"),
+    ("switch", r"switch\s+to\s+(dan|developer|unrestricted)\s+mode"),
 
     # Data extraction attempts
-    r"reveal\s+(your|the)\s+(system|hidden|secret)\s+(prompt|instructions?)",
-    r"show\s+(me\s+)?(your|the)\s+(system|hidden)\s+(prompt|config)",
-    r"what\s+is\s+(your|the)\s+(system|initial)\s+(prompt|instructions?)",
-    r"print\s+(your|the)\s+(system|hidden)\s+(prompt|config)",
-    r"output\s+(your|the)\s+(system|internal)\s+(prompt|state)",
+    ("reveal", r"reveal\s+(your|the)\s+(system|hidden|secret)\s+(prompt|instructions?)"),
+    ("show", r"show\s+(me\s+)?(your|the)\s+(system|hidden)\s+(prompt|config)"),
+    ("what", r"what\s+is\s+(your|the)\s+(system|initial)\s+(prompt|instructions?)"),
+    ("print", r"print\s+(your|the)\s+(system|hidden)\s+(prompt|config)"),
+    ("output", r"output\s+(your|the)\s+(system|internal)\s+(prompt|state)"),
 
     # Jailbreak attempts
-    r"(dai|dan|dev|developer)\s*mode",
-    r"bypass\s+(your|the|any)\s+(restrictions?|filters?|safety)",
-    r"disable\s+(your|the)\s+(safety|content|moderation)",
-    r"remove\s+(all\s+)?(restrictions?|filters?|limits?)",
+    ("mode", r"(dai|dan|dev|developer)\s*mode"),
+    ("bypass", r"bypass\s+(your|the|any)\s+(restrictions?|filters?|safety)"),
+    ("disable", r"disable\s+(your|the)\s+(safety|content|moderation)"),
+    ("remove", r"remove\s+(all\s+)?(restrictions?|filters?|limits?)"),
 
     # Markdown/format injection
-    r"\[system\]",
-    r"\[assistant\]",
-    r"<\|.*?\|>",
-    r"```system",
-    r"<system>",
+    ("[system]", r"\[system\]"),
+    ("[assistant]", r"\[assistant\]"),
+    ("<|", r"<\|.*?\|>"),
+    ("```system", r"```system"),
+    ("<system>", r"<system>"),
 ]
 
 # Compile patterns for efficiency
 COMPILED_INJECTION_PATTERNS = [
     re.compile(pattern, re.IGNORECASE)
-    for pattern in INJECTION_PATTERNS
+    for _, pattern in INJECTION_PATTERNS
 ]
 
 
+def _build_anchor_automaton(patterns: list) -> "ahocorasick.Automaton":
+    """Build an automaton mapping each anchor to the indices of its patterns."""
+    indices = defaultdict(list)
+    for i, (anchor, _) in enumerate(patterns):
+        indices[anchor].append(i)
+    automaton = ahocorasick.Automaton()
+    for anchor, pattern_ids in indices.items():
+        automaton.add_word(anchor, tuple(pattern_ids))
+    automaton.make_automaton()
+    return automaton
+
+
+# Built once per container; one pass over the text finds every anchor
+_INJECTION_AUTOMATON = _build_anchor_automaton(INJECTION_PATTERNS) if ahocorasick else None
+
+
+# Non-ASCII characters that re.IGNORECASE treats as equal to an ASCII letter
+# (long s, Kelvin sign, dotted/dotless i). str.lower() leaves them alone, so
+# they are folded before the anchor lookup or "diſregard" would skip its regex.
+_ANCHOR_FOLD = str.maketrans({"\u017f": "s", "\u212a": "k", "\u0130": "i", "\u0131": "i"})
+
+
+def _candidate_patterns(text: str) -> List[int]:
+    """Indices of injection patterns whose anchor occurs in the text, in pattern order."""
+    lowered = text.translate(_ANCHOR_FOLD).lower()
+    if _INJECTION_AUTOMATON is not None:
+        return sorted({i for _, ids in _INJECTION_AUTOMATON.iter(lowered) for i in ids})
+    return [i for i, (anchor, _) in enumerate(INJECTION_PATTERNS) if anchor in lowered]
+
+
 def detect_prompt_injection(text: str) -> SafetyCheckResult:
     """
     Detect potential prompt injection attempts in user input.
@@ -93,9 +132,9 @@ def detect_prompt_injection(text: str) -> SafetyCheckResult:
     """
     issues = []
 
-    for pattern in COMPILED_INJECTION_PATTERNS:
-        matches = pattern.findall(text)
-        if matches:
+    for i in _candidate_patterns(text):
+        pattern = COMPILED_INJECTION_PATTERNS[i]
+        if pattern.search(text):
             issues.append(f"Pattern detected: {pattern.pattern[:50]}...")
 
     # Check for excessive special characters/delimiters
@@ -160,6 +199,10 @@ DANGEROUS_ADVICE_PATTERNS = [
     r"100%\s+(cure|healing|treatment)\s+rate",
 ]
 
+# Bump whenever output validation or sanitization changes, so responses
+# cached under an older policy are validated again
+OUTPUT_SAFETY_VERSION = 1
+
 COMPILED_DANGEROUS_PATTERNS = [
     re.compile(pattern, re.IGNORECASE)
     for pattern in DANGEROUS_ADVICE_PATTERNS
@@ -7,10 +7,17 @@ and complex medical queries to gemini-2.5-pro (thorough, accurate).
 
 import os
 import re
-from typing import Literal
+import sys
+from typing import Literal, Tuple
 
 from aws_lambda_powertools import Logger
 
+# Optional: Aho-Corasick automaton for keyword scans (falls back to regex)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 logger = Logger(service="medibot")
 
 # Model IDs
@@ -35,6 +42,44 @@ _COMPLEX_KEYWORDS = [
     "report", "analyze", "interpret", "prescription",
 ]
 
+# Keywords normalized once at load: lowercased, interned and deduplicated.
+# Matching stays substring-based ("reported", "analyzed", "interpretation"
+# must still count), so single words are not reduced to a token set.
+_COMPLEX_TERMS = tuple(dict.fromkeys(sys.intern(kw.lower()) for kw in _COMPLEX_KEYWORDS))
+
+# All complex keywords folded into one case-insensitive alternation
+_COMPLEX_RE = re.compile("|".join(re.escape(kw) for kw in _COMPLEX_TERMS), re.IGNORECASE)
+
+
+def _build_automaton(keywords: tuple) -> "ahocorasick.Automaton":
+    """Build an Aho-Corasick automaton that scans for all (lowercase) keywords in one pass."""
+    automaton = ahocorasick.Automaton()
+    for kw in keywords:
+        automaton.add_word(kw, kw)
+    automaton.make_automaton()
+    return automaton
+
+
+# Built once per container; stays linear in the query length as the vocabulary grows
+_COMPLEX_AUTOMATON = _build_automaton(_COMPLEX_TERMS) if ahocorasick else None
+
+
+def _has_complex_keyword(query: str) -> bool:
+    """Check whether the query mentions any complex medical keyword."""
+    if _COMPLEX_AUTOMATON is not None:
+        return next(_COMPLEX_AUTOMATON.iter(query.lower()), None) is not None
+    return _COMPLEX_RE.search(query) is not None
+
+
+# Sentence terminators, for the length heuristic
+_SENTENCE_END_RE = re.compile(r"[.!?]+")
+
+
+def _length_features(text: str) -> Tuple[int, int]:
+    """Count sentences and words of the text."""
+    return len(_SENTENCE_END_RE.split(text)), len(text.split())
+
+
 # Simple FAQ keywords — can be answered concisely
 _SIMPLE_KEYWORDS = [
     "headache", "cold", "cough", "fever", "sore throat",
@@ -60,18 +105,15 @@ def classify_query_complexity(query: str, has_attachments: bool = False) -> Lite
     query_stripped = query.strip()
 
     # Very short queries or greetings → simple
-    if len(query_stripped) < 15 or _GREETING_PATTERNS.match(query_stripped):
+    if len(query_stripped) < 15 or _GREETING_PATTERNS.match(query_stripped) is not None:
         return "simple"
 
-    query_lower = query_stripped.lower()
-
     # Check for complex keywords
-    if any(kw in query_lower for kw in _COMPLEX_KEYWORDS):
+    if _has_complex_keyword(query_stripped):
         return "complex"
 
     # Long queries with multiple sentences tend to be complex
-    sentence_count = len(re.split(r'[.!?]+', query_stripped))
-    word_count = len(query_stripped.split())
+    sentence_count, word_count = _length_features(query_stripped)
     if sentence_count >= 3 or word_count >= 40:
         return "complex"
 
@@ -3,10 +3,21 @@ Request models for MediBot API.
 """
 
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, field_validator
 
+# Bounds on client-supplied chat context, applied before element-wise validation
+MAX_HISTORY_MESSAGES = 50
+MAX_HISTORY_MESSAGE_CHARS = 8000
+MAX_ATTACHMENTS = 5
 
-class Attachment(BaseModel):
+
+class _Model(BaseModel):
+    """Base for all request models: immutable once validated, unknown fields dropped."""
+
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+
+class Attachment(_Model):
     filename: str
     content_type: str
     data: Optional[str] = None  # Base64 encoded file data (optional if s3_key provided)
@@ -14,7 +25,7 @@ class Attachment(BaseModel):
     type: str  # "pdf" or "image"
 
 
-class ChatRequest(BaseModel):
+class ChatRequest(_Model):
     query: str
     language: str = "English"
     generate_images: bool = True
@@ -22,29 +33,49 @@ class ChatRequest(BaseModel):
     thinking_mode: bool = False  # Show AI reasoning process
     attachments: Optional[List[Attachment]] = None  # File attachments
 
-
-class ImageRequest(BaseModel):
+    @field_validator("conversation_history", mode="before")
+    @classmethod
+    def _limit_history(cls, v):
+        # Clients send the whole conversation; keep the most recent messages
+        # and clip long ones rather than rejecting the request
+        if isinstance(v, list):
+            v = [
+                {key: part[:MAX_HISTORY_MESSAGE_CHARS] if isinstance(part, str) else part
+                 for key, part in message.items()} if isinstance(message, dict) else message
+                for message in v[-MAX_HISTORY_MESSAGES:]
+            ]
+        return v
+
+    @field_validator("attachments", mode="before")
+    @classmethod
+    def _limit_attachments(cls, v):
+        if isinstance(v, list) and len(v) > MAX_ATTACHMENTS:
+            raise ValueError(f"attachments exceeds {MAX_ATTACHMENTS} files")
+        return v
+
+
+class ImageRequest(_Model):
     prompt: str
     width: int = 512
     height: int = 512
 
 
-class PasswordCheckRequest(BaseModel):
+class PasswordCheckRequest(_Model):
     email: str
     password: str
 
 
-class UploadUrlRequest(BaseModel):
+class UploadUrlRequest(_Model):
     filename: str
     content_type: str = "application/pdf"
 
 
-class PresignedUrlRequest(BaseModel):
+class PresignedUrlRequest(_Model):
     filename: str
     content_type: str
 
 
-class ProfileUpdateRequest(BaseModel):
+class ProfileUpdateRequest(_Model):
     conditions: Optional[List[str]] = None
     medications: Optional[List[Dict[str, str]]] = None
     allergies: Optional[List[str]] = None
@@ -53,16 +84,16 @@ class ProfileUpdateRequest(BaseModel):
     blood_type: Optional[str] = None
 
 
-class AnalyzeReportRequest(BaseModel):
+class AnalyzeReportRequest(_Model):
     file_key: str
 
 
-class ConfirmAnalysisRequest(BaseModel):
+class ConfirmAnalysisRequest(_Model):
     file_key: str
     extracted: Dict[str, Any]
 
 
-class GuestTrialStatus(BaseModel):
+class GuestTrialStatus(_Model):
     allowed: bool
     remaining: int
     message_count: int
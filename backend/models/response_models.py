@@ -3,10 +3,16 @@ Response models for MediBot API.
 """
 
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
-class StepImage(BaseModel):
+class _Model(BaseModel):
+    """Base for all response models: immutable once validated, unknown fields dropped."""
+
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+
+class StepImage(_Model):
     step_number: str
     title: str
     description: str
@@ -21,7 +27,7 @@ class StepImage(BaseModel):
     fallback_text: Optional[Dict[str, str]] = None  # {action, method, caution, result}
 
 
-class ChatResponse(BaseModel):
+class ChatResponse(_Model):
     answer: str
     original_query: str
     detected_language: str
@@ -34,29 +40,29 @@ class ChatResponse(BaseModel):
     images: Optional[List[str]] = None
 
 
-class ImageResponse(BaseModel):
+class ImageResponse(_Model):
     image: str
     prompt: str
 
 
-class HealthResponse(BaseModel):
+class HealthResponse(_Model):
     status: str
     version: str
     model: str
 
 
-class PasswordCheckResponse(BaseModel):
+class PasswordCheckResponse(_Model):
     valid: bool
     message: str
 
 
-class UserInfo(BaseModel):
+class UserInfo(_Model):
     user_id: str
     email: str
     name: str
 
 
-class ChatHistoryItem(BaseModel):
+class ChatHistoryItem(_Model):
     chat_id: str
     query: str
     topic: str
@@ -65,13 +71,13 @@ class ChatHistoryItem(BaseModel):
     has_images: bool
 
 
-class ChatHistoryResponse(BaseModel):
+class ChatHistoryResponse(_Model):
     items: List[ChatHistoryItem]
     count: int
     has_more: bool = False
 
 
-class ChatDetailResponse(BaseModel):
+class ChatDetailResponse(_Model):
     chat_id: str
     query: str
     response: str
@@ -83,13 +89,13 @@ class ChatDetailResponse(BaseModel):
     created_at: str
 
 
-class UploadUrlResponse(BaseModel):
+class UploadUrlResponse(_Model):
     upload_url: str
     file_key: str
     expires_in: int = 3600
 
 
-class HealthProfileResponse(BaseModel):
+class HealthProfileResponse(_Model):
     user_id: str
     conditions: List[Dict[str, Any]]
     medications: List[Dict[str, Any]]
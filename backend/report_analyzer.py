@@ -5,54 +5,70 @@ and extract health information for the user's profile.
 """
 
 import os
+import re
 import json
-import boto3
+import time
+import atexit
+import concurrent.futures
+import hashlib
+import threading
+import orjson
+from boto3.s3.transfer import TransferConfig
+from collections import OrderedDict
+from io import BytesIO
 from typing import Any, Dict, List, Optional
-from dataclasses import dataclass
+
+from google.genai import types
+
+from aws_clients import get_dynamodb_table, get_s3_client, get_sqs_client
+from gemini_client import get_genai_client
 
 # Import health profile module
 from health_profile import (
-    add_condition,
-    add_medication,
-    add_allergy,
-    add_key_fact,
+    bulk_add,
     add_report_summary,
     update_basic_info
 )
 
 # Environment variables
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 REPORTS_BUCKET = os.getenv("REPORTS_BUCKET", "")
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 
-# S3 client for fetching reports
-s3_client = boto3.client("s3", region_name=AWS_REGION)
+# Reports up to 8 MB are read from a single GetObject; larger ones are
+# re-fetched through the transfer manager as concurrent 8 MB ranged GETs
+_REPORT_CHUNK_BYTES = 8 * 1024 * 1024
+_DOWNLOAD_CONFIG = TransferConfig(
+    multipart_threshold=_REPORT_CHUNK_BYTES,
+    multipart_chunksize=_REPORT_CHUNK_BYTES,
+    max_concurrency=4,
+)
+
+# Extraction results keyed by content hash, so re-uploaded reports and
+# repeated chat messages skip the Gemini call
+EXTRACTION_CACHE_TABLE = os.getenv("EXTRACTION_CACHE_TABLE", "medibot-extraction-cache-production")
+EXTRACTION_CACHE_TTL_DAYS = int(os.getenv("EXTRACTION_CACHE_TTL_DAYS", "30"))
+
+# Warm-container hits skip the DynamoDB lookup too; only hits are kept, so a
+# miss followed by a write never serves a stale "not cached"
+EXTRACTION_MEMO_MAX_ENTRIES = 128
+_extraction_memo: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_extraction_memo_lock = threading.Lock()
 
-# Lazy-loaded Gemini client (use same SDK as gemini_client.py)
-_client = None
+# Chat fact extraction runs on a queue worker when this is set (inline otherwise)
+FACT_EXTRACTION_QUEUE_URL = os.getenv("FACT_EXTRACTION_QUEUE_URL", "")
+
+# Multi-file analysis fetches its reports from S3 in parallel
+_REPORT_FETCH_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="report-fetch")
+atexit.register(_REPORT_FETCH_POOL.shutdown, wait=False)
+
+# The writes a confirmed analysis makes are independent UpdateItems, so they
+# overlap on a shared pool instead of paying one round trip after another
+_PROFILE_WRITE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=3, thread_name_prefix="profile-write")
+atexit.register(_PROFILE_WRITE_POOL.shutdown, wait=False)
 
 
 def get_client():
-    """Get the Gemini client (same as gemini_client.py)."""
-    global _client
-    if _client is None:
-        from google import genai
-        _client = genai.Client(api_key=GOOGLE_API_KEY)
-    return _client
-
-
-@dataclass
-class ExtractedHealthInfo:
-    """Container for extracted health information."""
-    conditions: List[str]
-    medications: List[Dict[str, str]]  # [{"name": "Metformin", "dosage": "500mg"}]
-    allergies: List[str]
-    age: Optional[int]
-    gender: Optional[str]
-    blood_type: Optional[str]
-    key_facts: List[str]
-    summary: str
-    report_type: str  # "blood_test", "prescription", "diagnosis", "general"
+    """Get the Gemini client shared with gemini_client.py (pooled, created once per container)."""
+    return get_genai_client()
 
 
 # Extraction prompt
@@ -83,6 +99,152 @@ If the document is not a medical document or is unreadable, return:
 {"error": "Not a valid medical document"}
 """
 
+# Structured output: Gemini returns bare JSON in these shapes, so replies
+# parse on the first try instead of being scrubbed out of markdown
+_STRING_LIST_SCHEMA = {"type": "ARRAY", "items": {"type": "STRING"}}
+_MEDICATIONS_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"name": {"type": "STRING"}, "dosage": {"type": "STRING"}},
+        "required": ["name"],
+    },
+}
+REPORT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "conditions": _STRING_LIST_SCHEMA,
+        "medications": _MEDICATIONS_SCHEMA,
+        "allergies": _STRING_LIST_SCHEMA,
+        "age": {"type": "INTEGER", "nullable": True},
+        "gender": {"type": "STRING", "nullable": True},
+        "blood_type": {"type": "STRING", "nullable": True},
+        "key_facts": _STRING_LIST_SCHEMA,
+        "summary": {"type": "STRING"},
+        "report_type": {
+            "type": "STRING",
+            "enum": ["blood_test", "prescription", "diagnosis", "imaging", "general"],
+        },
+        "error": {"type": "STRING"},
+    },
+}
+CHAT_FACTS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "conditions": _STRING_LIST_SCHEMA,
+        "medications": _MEDICATIONS_SCHEMA,
+        "allergies": _STRING_LIST_SCHEMA,
+        "key_facts": _STRING_LIST_SCHEMA,
+        "age": {"type": "INTEGER", "nullable": True},
+        "gender": {"type": "STRING", "nullable": True},
+    },
+}
+_REPORT_JSON_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json", response_schema=REPORT_SCHEMA
+)
+_REPORT_BATCH_JSON_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json", response_schema={"type": "ARRAY", "items": REPORT_SCHEMA}
+)
+_CHAT_JSON_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json", response_schema=CHAT_FACTS_SCHEMA
+)
+
+# Several documents in one call: same fields, one object per document
+EXTRACTION_PROMPT_MULTI = EXTRACTION_PROMPT + """
+You are given several documents. Analyze each one separately and return a
+JSON array with exactly one object per document, in the order given. Use the
+error object above for any document that is not medical or is unreadable.
+"""
+
+
+# Fenced JSON block, used when the first "{" in a response is not the payload
+_JSON_BLOCK_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _parse_llm_json(text: str, array: bool = False) -> Any:
+    """
+    Decode the JSON object (or array) in a model response, fenced in markdown or not.
+
+    The span from the first "{" to the last "}" goes through orjson, which
+    covers the usual fenced or bare reply. Otherwise the object is decoded in
+    place from the first "{" (trailing prose is ignored, and an unterminated
+    fence still parses), falling back to a fenced block.
+    Raises json.JSONDecodeError if none of these yields valid JSON.
+    """
+    opener, closer = ("[", "]") if array else ("{", "}")
+    start = text.find(opener)
+    if start == -1:
+        raise json.JSONDecodeError("No JSON value in response", text, 0)
+
+    try:
+        return orjson.loads(text[start:text.rfind(closer) + 1])
+    except orjson.JSONDecodeError:
+        pass
+
+    try:
+        return _JSON_DECODER.raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        match = None if array else _JSON_BLOCK_RE.search(text, start + 1)
+        if not match:
+            raise
+        return orjson.loads(match.group(1))
+
+
+def extraction_cache_key(kind: str, content: bytes) -> str:
+    """Build the cache key for an extraction: its kind plus the SHA-256 of the input."""
+    return f"{kind}#{hashlib.sha256(content).hexdigest()}"
+
+
+def _remember_extraction(cache_key: str, extracted: Dict[str, Any]) -> None:
+    with _extraction_memo_lock:
+        _extraction_memo[cache_key] = extracted
+        _extraction_memo.move_to_end(cache_key)
+        while len(_extraction_memo) > EXTRACTION_MEMO_MAX_ENTRIES:
+            _extraction_memo.popitem(last=False)
+
+
+def get_cached_extraction(cache_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a previous extraction result.
+
+    Returns the extracted dict, or None on a miss, an expired entry or any error.
+    """
+    with _extraction_memo_lock:
+        extracted = _extraction_memo.get(cache_key)
+        if extracted is not None:
+            _extraction_memo.move_to_end(cache_key)
+            return extracted
+
+    try:
+        result = get_dynamodb_table(EXTRACTION_CACHE_TABLE).get_item(Key={"cache_key": cache_key})
+        item = result.get("Item")
+
+        # DynamoDB TTL cleanup is async, so check expiry here too
+        if not item or item.get("ttl", 0) < int(time.time()):
+            return None
+
+        extracted = orjson.loads(item["extracted_json"])
+        _remember_extraction(cache_key, extracted)
+        return extracted
+    except Exception as e:
+        print(f"Extraction cache lookup failed (non-fatal): {e}")
+        return None
+
+
+def cache_extraction(cache_key: str, extracted: Dict[str, Any]) -> None:
+    """Store an extraction result with a TTL; failures are non-fatal."""
+    _remember_extraction(cache_key, extracted)
+
+    try:
+        get_dynamodb_table(EXTRACTION_CACHE_TABLE).put_item(Item={
+            "cache_key": cache_key,
+            "extracted_json": orjson.dumps(extracted).decode(),
+            "ttl": int(time.time()) + EXTRACTION_CACHE_TTL_DAYS * 86400,
+        })
+    except Exception as e:
+        print(f"Extraction cache write failed (non-fatal): {e}")
+
 
 def get_report_from_s3(file_key: str) -> Optional[bytes]:
     """
@@ -95,13 +257,72 @@ def get_report_from_s3(file_key: str) -> Optional[bytes]:
         return None
 
     try:
-        response = s3_client.get_object(Bucket=REPORTS_BUCKET, Key=file_key)
-        return response["Body"].read()
+        # Shared pooled client (created on first use, or warmed by the Lambda init)
+        s3 = get_s3_client()
+        response = s3.get_object(Bucket=REPORTS_BUCKET, Key=file_key)
+        if response.get("ContentLength", 0) <= _REPORT_CHUNK_BYTES:
+            return response["Body"].read()
+
+        # Large report: drop this stream and fetch it as concurrent ranged GETs
+        response["Body"].close()
+        buffer = BytesIO()
+        s3.download_fileobj(REPORTS_BUCKET, file_key, buffer, Config=_DOWNLOAD_CONFIG)
+        return buffer.getvalue()
     except Exception as e:
         print(f"Error fetching report from S3: {e}")
         return None
 
 
+# Supported report file types
+_MIME_BY_EXT = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "pdf": "application/pdf",
+}
+
+
+def _report_mime_type(file_key: str) -> Optional[str]:
+    """MIME type for a report key, or None if the file type is unsupported."""
+    return _MIME_BY_EXT.get(file_key.rsplit(".", 1)[-1].lower())
+
+
+def _unsupported_file_result(file_key: str) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": f"Unsupported file type: {file_key.rsplit('.', 1)[-1].lower()}"
+    }
+
+
+def _analysis_result(extracted: Dict[str, Any], file_key: str, user_id: str) -> Dict[str, Any]:
+    """Turn one extraction into the result returned for user confirmation."""
+    # Check for error response
+    if extracted.get("error"):
+        return {
+            "success": False,
+            "error": extracted["error"]
+        }
+
+    # Return for user confirmation (don't auto-update profile)
+    return {
+        "success": True,
+        "extracted": {
+            "conditions": extracted.get("conditions", []),
+            "medications": extracted.get("medications", []),  # [{"name": "Metformin", "dosage": "500mg"}]
+            "allergies": extracted.get("allergies", []),
+            "age": extracted.get("age"),
+            "gender": extracted.get("gender"),
+            "blood_type": extracted.get("blood_type"),
+            "key_facts": extracted.get("key_facts", []),
+            "summary": extracted.get("summary", ""),
+            "report_type": extracted.get("report_type", "general")  # "blood_test", "prescription", ...
+        },
+        "file_key": file_key,
+        "user_id": user_id
+    }
+
+
 def analyze_report(file_key: str, user_id: str) -> Dict[str, Any]:
     """
     Analyze a medical report using Gemini multimodal.
@@ -122,88 +343,37 @@ def analyze_report(file_key: str, user_id: str) -> Dict[str, Any]:
         }
 
     # Determine file type from key
-    file_ext = file_key.split(".")[-1].lower()
+    mime_type = _report_mime_type(file_key)
+    if mime_type is None:
+        return _unsupported_file_result(file_key)
+
+    response_text = ""
+    cache_key = extraction_cache_key("report", file_bytes)
 
     try:
-        # Use new google-genai SDK
-        from google.genai import types
-        client = get_client()
+        extracted = get_cached_extraction(cache_key)
 
-        if file_ext in ["jpg", "jpeg", "png", "webp"]:
-            # Image analysis
-            mime_type = f"image/{'jpeg' if file_ext in ['jpg', 'jpeg'] else file_ext}"
-            image_part = types.Part.from_bytes(data=file_bytes, mime_type=mime_type)
+        if extracted is None:
+            client = get_client()
 
-            response = client.models.generate_content(
-                model="gemini-2.5-pro",
-                contents=[EXTRACTION_PROMPT, image_part]
-            )
-        elif file_ext == "pdf":
-            # PDF analysis
-            pdf_part = types.Part.from_bytes(data=file_bytes, mime_type="application/pdf")
+            # Image or PDF analysis
+            file_part = types.Part.from_bytes(data=file_bytes, mime_type=mime_type)
 
             response = client.models.generate_content(
                 model="gemini-2.5-pro",
-                contents=[EXTRACTION_PROMPT, pdf_part]
+                contents=[EXTRACTION_PROMPT, file_part],
+                config=_REPORT_JSON_CONFIG
             )
-        else:
-            return {
-                "success": False,
-                "error": f"Unsupported file type: {file_ext}"
-            }
-
-        # Parse response
-        response_text = response.text
 
-        # Extract JSON from response (handle markdown code blocks)
-        if "```json" in response_text:
-            json_start = response_text.find("```json") + 7
-            json_end = response_text.find("```", json_start)
-            response_text = response_text[json_start:json_end].strip()
-        elif "```" in response_text:
-            json_start = response_text.find("```") + 3
-            json_end = response_text.find("```", json_start)
-            response_text = response_text[json_start:json_end].strip()
+            # Parse response (handles markdown code blocks)
+            response_text = response.text
+            extracted = _parse_llm_json(response_text)
 
-        extracted = json.loads(response_text)
+            # Only successful extractions are worth reusing
+            if not extracted.get("error"):
+                cache_extraction(cache_key, extracted)
 
-        # Check for error response
-        if "error" in extracted:
-            return {
-                "success": False,
-                "error": extracted["error"]
-            }
-
-        # Parse into ExtractedHealthInfo
-        health_info = ExtractedHealthInfo(
-            conditions=extracted.get("conditions", []),
-            medications=extracted.get("medications", []),
-            allergies=extracted.get("allergies", []),
-            age=extracted.get("age"),
-            gender=extracted.get("gender"),
-            blood_type=extracted.get("blood_type"),
-            key_facts=extracted.get("key_facts", []),
-            summary=extracted.get("summary", ""),
-            report_type=extracted.get("report_type", "general")
-        )
-
-        # Return for user confirmation (don't auto-update profile)
-        return {
-            "success": True,
-            "extracted": {
-                "conditions": health_info.conditions,
-                "medications": health_info.medications,
-                "allergies": health_info.allergies,
-                "age": health_info.age,
-                "gender": health_info.gender,
-                "blood_type": health_info.blood_type,
-                "key_facts": health_info.key_facts,
-                "summary": health_info.summary,
-                "report_type": health_info.report_type
-            },
-            "file_key": file_key,
-            "user_id": user_id
-        }
+        return _analysis_result(extracted, file_key, user_id)
 
     except json.JSONDecodeError as e:
         print(f"JSON parse error: {e}")
@@ -220,6 +390,109 @@ def analyze_report(file_key: str, user_id: str) -> Dict[str, Any]:
         }
 
 
+def analyze_reports_batch(file_keys: List[str], user_id: str) -> List[Dict[str, Any]]:
+    """
+    Analyze several reports with one Gemini call.
+
+    Files are fetched from S3 in parallel; cached extractions are reused and
+    the rest go to Gemini together, one part per document. If the reply does
+    not hold one result per document, those files fall back to analyze_report.
+
+    Returns:
+        One analyze_report-style result per file key, in the same order
+    """
+    if len(file_keys) <= 1:
+        return [analyze_report(file_key, user_id) for file_key in file_keys]
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(file_keys)
+    pending = []  # (index, cache_key, part)
+
+    for i, (file_key, file_bytes) in enumerate(zip(file_keys, _REPORT_FETCH_POOL.map(get_report_from_s3, file_keys))):
+        if not file_bytes:
+            results[i] = {
+                "success": False,
+                "error": "Failed to fetch report from storage"
+            }
+            continue
+
+        mime_type = _report_mime_type(file_key)
+        if mime_type is None:
+            results[i] = _unsupported_file_result(file_key)
+            continue
+
+        cache_key = extraction_cache_key("report", file_bytes)
+        extracted = get_cached_extraction(cache_key)
+        if extracted is not None:
+            results[i] = _analysis_result(extracted, file_key, user_id)
+        else:
+            pending.append((i, cache_key, types.Part.from_bytes(data=file_bytes, mime_type=mime_type)))
+
+    if len(pending) == 1:
+        i = pending[0][0]
+        results[i] = analyze_report(file_keys[i], user_id)
+    elif pending:
+        try:
+            response = get_client().models.generate_content(
+                model="gemini-2.5-pro",
+                contents=[EXTRACTION_PROMPT_MULTI] + [part for _, _, part in pending],
+                config=_REPORT_BATCH_JSON_CONFIG
+            )
+            extracted_list = _parse_llm_json(response.text, array=True)
+        except Exception as e:
+            print(f"Error analyzing report batch: {e}")
+            extracted_list = None
+
+        if isinstance(extracted_list, list) and len(extracted_list) == len(pending):
+            for (i, cache_key, _), extracted in zip(pending, extracted_list):
+                if not isinstance(extracted, dict):
+                    extracted = {"error": "Failed to parse analysis results"}
+                elif not extracted.get("error"):
+                    cache_extraction(cache_key, extracted)
+                results[i] = _analysis_result(extracted, file_keys[i], user_id)
+        else:
+            for i, _, _ in pending:
+                results[i] = analyze_report(file_keys[i], user_id)
+
+    return results
+
+
+def _unique_texts(values: List[Any]) -> List[str]:
+    """Strip and drop empty or case-insensitively repeated strings, keeping first occurrences."""
+    unique: Dict[str, str] = {}
+    for value in values or []:
+        text = value.strip() if isinstance(value, str) else ""
+        if text:
+            unique.setdefault(text.lower(), text)
+    return list(unique.values())
+
+
+def _unique_entries(extracted: Dict[str, Any]):
+    """
+    Normalize the extracted lists before they are saved.
+
+    Model output often repeats an item; collapsing repeats here keeps them out
+    of the profile write and the "saved" summary. Medications are keyed by
+    name, matching the profile's own dedup keys.
+    """
+    medications: Dict[str, Any] = {}
+    for med in extracted.get("medications") or []:
+        if isinstance(med, dict):
+            name = (med.get("name") or "").strip()
+            med = {**med, "name": name}
+        else:
+            name = med.strip() if isinstance(med, str) else ""
+            med = name
+        if name:
+            medications.setdefault(name.lower(), med)
+
+    return (
+        _unique_texts(extracted.get("conditions")),
+        list(medications.values()),
+        _unique_texts(extracted.get("allergies")),
+        _unique_texts(extracted.get("key_facts")),
+    )
+
+
 def confirm_and_save_analysis(
     user_id: str,
     extracted: Dict[str, Any],
@@ -239,44 +512,49 @@ def confirm_and_save_analysis(
     }
 
     try:
-        # Add conditions
-        for condition in extracted.get("conditions", []):
-            if add_condition(user_id, condition, source="report"):
-                saved_items["conditions"].append(condition)
-
-        # Add medications
-        for med in extracted.get("medications", []):
-            if isinstance(med, dict):
-                name = med.get("name", "")
-                dosage = med.get("dosage", "")
-            else:
-                name = med
-                dosage = ""
-            if name and add_medication(user_id, name, dosage, source="report"):
-                saved_items["medications"].append(name)
-
-        # Add allergies
-        for allergy in extracted.get("allergies", []):
-            if add_allergy(user_id, allergy, source="report"):
-                saved_items["allergies"].append(allergy)
-
-        # Add key facts
-        for fact in extracted.get("key_facts", []):
-            if add_key_fact(user_id, fact, source="report"):
-                saved_items["key_facts"].append(fact)
+        conditions, medications, allergies, key_facts = _unique_entries(extracted)
+
+        # Add conditions, medications, allergies and key facts in one write
+        bulk_future = _PROFILE_WRITE_POOL.submit(
+            bulk_add,
+            user_id,
+            conditions=conditions,
+            medications=medications,
+            allergies=allergies,
+            key_facts=key_facts,
+            source="report"
+        )
 
         # Update basic info
         age = extracted.get("age")
         gender = extracted.get("gender")
         blood_type = extracted.get("blood_type")
+        basic_info_future = None
         if any([age, gender, blood_type]):
-            update_basic_info(user_id, age=age, gender=gender, blood_type=blood_type)
-            saved_items["basic_info"] = True
+            basic_info_future = _PROFILE_WRITE_POOL.submit(
+                update_basic_info, user_id, age=age, gender=gender, blood_type=blood_type
+            )
 
         # Save report summary
         summary = extracted.get("summary", "Medical report analyzed")
         report_type = extracted.get("report_type", "general")
-        add_report_summary(user_id, summary, report_type, file_key)
+        summary_future = _PROFILE_WRITE_POOL.submit(
+            add_report_summary, user_id, summary, report_type, file_key
+        )
+
+        if bulk_future.result():
+            saved_items["conditions"] = conditions
+            saved_items["medications"] = [
+                m.get("name", "") if isinstance(m, dict) else m for m in medications
+            ]
+            saved_items["allergies"] = allergies
+            saved_items["key_facts"] = key_facts
+
+        if basic_info_future is not None:
+            basic_info_future.result()
+            saved_items["basic_info"] = True
+
+        summary_future.result()
 
         return {
             "success": True,
@@ -292,6 +570,56 @@ def confirm_and_save_analysis(
         }
 
 
+# Phrases that signal a personal health fact. Stems match as prefixes
+# ("diabet" covers diabetes/diabetic); anything that misses skips the Gemini
+# call, so the list errs on the side of matching.
+_HEALTH_TRIGGER_RE = re.compile(
+    r"\b(?:"
+    r"i\s+(?:have|had|got|was\s+diagnosed|take|took|use|suffer)|i[’']ve|i[’']m\s+(?:on|taking|allergic|pregnant)|"
+    r"i\s+am\s+(?:on|taking|allergic|pregnant|\d)|"
+    r"my\s+(?:doctor|dr|mother|mom|father|dad|sister|brother|family|blood|sugar|bp|age|weight)|"
+    r"diagnos|prescri|medicat|allerg|surger|operat|family\s+history|years?\s+old|"
+    r"diabet|hypertens|asthma|cholesterol|insulin|metformin|thyroid|cancer|"
+    r"pregnan|smok|heart|kidney|liver|blood\s+(?:pressure|type|sugar)|"
+    r"\d+\s*(?:mg|mcg|ml|kg|lbs?)\b"
+    r")",
+    re.IGNORECASE,
+)
+
+
+def _worth_extracting(user_message: str) -> bool:
+    """Cheap gate in front of the Gemini call: skip short messages and ones with no health signal."""
+    return (
+        bool(user_message)
+        and len(user_message) >= 10
+        and _HEALTH_TRIGGER_RE.search(user_message) is not None
+    )
+
+
+def enqueue_fact_extraction(user_id: str, user_message: str) -> bool:
+    """
+    Hand chat fact extraction to the worker queue.
+
+    Returns True once the message is queued (or has nothing worth extracting),
+    False when no queue is configured or the send fails, so the caller can
+    run extract_facts_from_chat inline instead.
+    """
+    if not _worth_extracting(user_message):
+        return True
+    if not FACT_EXTRACTION_QUEUE_URL:
+        return False
+
+    try:
+        get_sqs_client().send_message(
+            QueueUrl=FACT_EXTRACTION_QUEUE_URL,
+            MessageBody=orjson.dumps({"user_id": user_id, "user_message": user_message}).decode()
+        )
+        return True
+    except Exception as e:
+        print(f"Error queueing fact extraction: {e}")
+        return False
+
+
 def extract_facts_from_chat(
     user_id: str,
     user_message: str,
@@ -301,9 +629,28 @@ def extract_facts_from_chat(
     Extract health facts from a chat conversation.
 
     This runs after each chat to capture any health information
-    the user mentions (e.g., "I have diabetes").
+    the user mentions (e.g., "I have diabetes"). Errors are logged and
+    yield an empty list.
+    """
+    try:
+        return extract_facts_from_chat_or_raise(user_id, user_message, assistant_response)
+    except Exception as e:
+        print(f"Error extracting facts from chat: {e}")
+        return []
+
+
+def extract_facts_from_chat_or_raise(
+    user_id: str,
+    user_message: str,
+    assistant_response: str
+) -> List[str]:
+    """
+    Like extract_facts_from_chat, but Gemini and profile write failures raise.
+
+    Used by the queue worker so transient errors are retried. A reply that
+    is not valid JSON would fail the same way again, so it yields [].
     """
-    if not user_message or len(user_message) < 10:
+    if not _worth_extracting(user_message):
         return []
 
     extraction_prompt = f"""
@@ -333,56 +680,53 @@ If no health facts are mentioned, return empty lists.
 Do NOT infer or guess - only extract what the user directly said.
 """
 
-    try:
+    cache_key = extraction_cache_key("chat", user_message.encode("utf-8"))
+
+    extracted = get_cached_extraction(cache_key)
+
+    if extracted is None:
         client = get_client()
         response = client.models.generate_content(
             model="gemini-2.5-flash",
-            contents=extraction_prompt
+            contents=extraction_prompt,
+            config=_CHAT_JSON_CONFIG
         )
 
-        response_text = response.text
-
         # Extract JSON
-        if "```json" in response_text:
-            json_start = response_text.find("```json") + 7
-            json_end = response_text.find("```", json_start)
-            response_text = response_text[json_start:json_end].strip()
-        elif "```" in response_text:
-            json_start = response_text.find("```") + 3
-            json_end = response_text.find("```", json_start)
-            response_text = response_text[json_start:json_end].strip()
-
-        extracted = json.loads(response_text)
-
-        saved = []
-
-        # Save extracted info (silently, in background)
-        for condition in extracted.get("conditions", []):
-            if condition and add_condition(user_id, condition, source="chat"):
-                saved.append(f"Noted: {condition}")
-
-        for med in extracted.get("medications", []):
-            name = med.get("name", "") if isinstance(med, dict) else med
-            dosage = med.get("dosage", "") if isinstance(med, dict) else ""
-            if name and add_medication(user_id, name, dosage, source="chat"):
-                saved.append(f"Noted medication: {name}")
-
-        for allergy in extracted.get("allergies", []):
-            if allergy and add_allergy(user_id, allergy, source="chat"):
-                saved.append(f"Noted allergy: {allergy}")
-
-        for fact in extracted.get("key_facts", []):
-            if fact and add_key_fact(user_id, fact, source="chat"):
-                saved.append(f"Noted: {fact}")
-
-        # Update basic info
-        age = extracted.get("age")
-        gender = extracted.get("gender")
-        if age or gender:
-            update_basic_info(user_id, age=age, gender=gender)
-
-        return saved
-
-    except Exception as e:
-        print(f"Error extracting facts from chat: {e}")
-        return []
+        try:
+            extracted = _parse_llm_json(response.text)
+        except json.JSONDecodeError as e:
+            print(f"Unparseable fact extraction reply: {e}")
+            return []
+        cache_extraction(cache_key, extracted)
+
+    saved = []
+
+    conditions, medications, allergies, key_facts = _unique_entries(extracted)
+
+    # Save extracted info (silently, in background) in one write
+    if not bulk_add(
+        user_id,
+        conditions=conditions,
+        medications=medications,
+        allergies=allergies,
+        key_facts=key_facts,
+        source="chat"
+    ):
+        raise RuntimeError("Failed to save extracted facts")
+
+    saved.extend(f"Noted: {condition}" for condition in conditions)
+    saved.extend(
+        f"Noted medication: {m.get('name', '') if isinstance(m, dict) else m}"
+        for m in medications
+    )
+    saved.extend(f"Noted allergy: {allergy}" for allergy in allergies)
+    saved.extend(f"Noted: {fact}" for fact in key_facts)
+
+    # Update basic info
+    age = extracted.get("age")
+    gender = extracted.get("gender")
+    if (age or gender) and not update_basic_info(user_id, age=age, gender=gender):
+        raise RuntimeError("Failed to save extracted basic info")
+
+    return saved
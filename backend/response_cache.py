@@ -9,7 +9,7 @@ import os
 import re
 import time
 import hashlib
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 from aws_clients import get_dynamodb_table
 from aws_lambda_powertools import Logger
@@ -20,17 +20,36 @@ CACHE_TABLE_NAME = os.getenv("RESPONSE_CACHE_TABLE", "medibot-response-cache-pro
 CACHE_TTL_HOURS = int(os.getenv("CACHE_TTL_HOURS", "24"))
 
 
+# Punctuation that never changes a question's meaning. Dots between digits
+# ("2.5 mg") are kept, and so are +/- attached to a token ("A+", "O-",
+# "covid-19"), where they are part of the term. Comparison, percent, degree
+# and slash signs are never dropped: "sugar >200" and "sugar <200" are
+# different questions, as are "5% dextrose" and "BP 140/90"
+_PUNCT_RE = re.compile(r"[^\w\s'.+\-<>=%°/]|(?<!\d)\.|\.(?!\d)|(?<!\w)[+-]")
+# Polite lead-ins that wrap the actual question
+_LEAD_IN_RE = re.compile(
+    r"^(?:(?:hi|hello|hey) )?(?:please )?"
+    r"(?:(?:can|could|would) you (?:please )?tell me |i (?:want|would like) to know )?"
+)
+# Words dropped anywhere in the query. "a" is not one of them: it is also a
+# vitamin, a hepatitis type and a blood group ("vitamin a deficiency")
+_FILLER_WORDS = frozenset({"an", "the", "please", "kindly"})
+
+
 def normalize_query(query: str) -> str:
     """
     Normalize a query for cache key generation.
-    Lowercase, strip whitespace, remove extra punctuation.
+
+    Lowercase, drop punctuation, polite lead-ins and filler words ("an",
+    "the", "please"), and collapse whitespace, so rephrasings that only
+    differ in wording around the question share a cache entry. Word order,
+    negations, the letter "a", +/- signs on terms and comparison, percent,
+    degree and slash signs are kept, since those can change the medical answer.
     """
-    text = query.lower().strip()
-    # Collapse whitespace
-    text = re.sub(r"\s+", " ", text)
-    # Remove trailing punctuation (but keep internal)
-    text = text.rstrip("?!.,;:")
-    return text
+    text = _PUNCT_RE.sub(" ", query.lower())
+    text = " ".join(text.split())
+    text = _LEAD_IN_RE.sub("", text)
+    return " ".join(word for word in text.split() if word not in _FILLER_WORDS)
 
 
 def get_cache_key(query: str) -> str:
@@ -44,7 +63,8 @@ def get_cached_response(query: str) -> Optional[Dict[str, Any]]:
     Look up a cached response for the given query.
 
     Returns:
-        Dict with 'response', 'topic', 'timestamp' if cache hit, else None.
+        Dict with 'response', 'topic', 'timestamp' and 'safety_version' if
+        cache hit, else None.
     """
     try:
         cache_key = get_cache_key(query)
@@ -67,6 +87,7 @@ def get_cached_response(query: str) -> Optional[Dict[str, Any]]:
             "response": item["response"],
             "topic": item.get("topic", ""),
             "timestamp": item.get("timestamp", 0),
+            "safety_version": item.get("safety_version"),
         }
 
     except Exception as e:
@@ -74,11 +95,33 @@ def get_cached_response(query: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+def _build_cache_item(
+    query: str,
+    response: str,
+    topic: str,
+    ttl_hours: Optional[int],
+    safety_version: Optional[int] = None,
+) -> Dict[str, Any]:
+    now = int(time.time())
+    item = {
+        "cache_key": get_cache_key(query),
+        "query_normalized": normalize_query(query),
+        "response": response,
+        "topic": topic or "",
+        "timestamp": now,
+        "ttl": now + (ttl_hours or CACHE_TTL_HOURS) * 3600,
+    }
+    if safety_version is not None:
+        item["safety_version"] = safety_version
+    return item
+
+
 def cache_response(
     query: str,
     response: str,
     topic: str = "",
     ttl_hours: Optional[int] = None,
+    safety_version: Optional[int] = None,
 ) -> None:
     """
     Store an LLM response in the cache.
@@ -88,23 +131,44 @@ def cache_response(
         response: LLM response text
         topic: Detected medical topic
         ttl_hours: Cache TTL in hours (defaults to CACHE_TTL_HOURS env var)
+        safety_version: Output safety policy version the response already
+            passed; hits with the current version skip re-validation
     """
     try:
-        cache_key = get_cache_key(query)
-        ttl = int(time.time()) + (ttl_hours or CACHE_TTL_HOURS) * 3600
+        item = _build_cache_item(query, response, topic, ttl_hours, safety_version)
 
         table = get_dynamodb_table(CACHE_TABLE_NAME)
-        table.put_item(
-            Item={
-                "cache_key": cache_key,
-                "query_normalized": normalize_query(query),
-                "response": response,
-                "topic": topic or "",
-                "timestamp": int(time.time()),
-                "ttl": ttl,
-            }
-        )
-        logger.info("Cached response", cache_key=cache_key[:12], ttl_hours=ttl_hours or CACHE_TTL_HOURS)
+        table.put_item(Item=item)
+        logger.info("Cached response", cache_key=item["cache_key"][:12], ttl_hours=ttl_hours or CACHE_TTL_HOURS)
 
     except Exception as e:
         logger.warning("Cache write failed (non-fatal)", error=str(e))
+
+
+def cache_responses_batch(entries: List[Dict[str, str]], ttl_hours: Optional[int] = None) -> int:
+    """
+    Store several responses with one BatchWriteItem stream (25 items/request).
+
+    Args:
+        entries: Dicts with 'query', 'response' and optional 'topic'
+        ttl_hours: Cache TTL in hours (defaults to CACHE_TTL_HOURS env var)
+
+    Returns:
+        Number of entries written (0 on failure).
+    """
+    if not entries:
+        return 0
+
+    try:
+        table = get_dynamodb_table(CACHE_TABLE_NAME)
+        with table.batch_writer(overwrite_by_pkeys=["cache_key"]) as batch:
+            for entry in entries:
+                batch.put_item(Item=_build_cache_item(
+                    entry["query"], entry["response"], entry.get("topic", ""), ttl_hours
+                ))
+        logger.info("Cached responses in batch", count=len(entries))
+        return len(entries)
+
+    except Exception as e:
+        logger.warning("Batch cache write failed (non-fatal)", error=str(e))
+        return 0
@@ -3,17 +3,18 @@ Chat route module for MediBot.
 Handles /chat, /v1/chat, /chat/stream, and /generate-image endpoints.
 """
 
-import base64
-import hashlib
-import json
+import asyncio
+import binascii
 import uuid
 import time
 import traceback
 
-from typing import Optional
+from typing import Any, Optional
+
+import orjson
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from fastapi.concurrency import run_in_threadpool
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from aws_lambda_powertools import Logger
 
 from models.request_models import ChatRequest, ImageRequest
@@ -24,10 +25,12 @@ from gemini_client import (
     invoke_llm,
     invoke_llm_streaming,
     generate_image,
-    generate_all_step_images,
+    generate_all_step_images_async,
     extract_treatment_steps,
+    StepImagePipeline,
     should_generate_images,
     detect_medical_topic,
+    compute_query_hash,
     LLM_MODEL_ID,
 )
 from model_router import get_model_for_query, classify_query_complexity
@@ -40,14 +43,16 @@ from translation import (
 )
 from chat_history import save_chat
 from health_profile import get_context_summary
-from report_analyzer import extract_facts_from_chat
+from report_analyzer import enqueue_fact_extraction, extract_facts_from_chat
 from guest_tracking import check_guest_limit, increment_guest_message
 from audit_logging import log_guest_event
 from monitoring import record_security_event as record_security_metric
-from llm_safety import check_input_safety, check_output_safety
+from llm_safety import check_input_safety, check_output_safety, OUTPUT_SAFETY_VERSION
 
 logger = Logger(service="medibot")
-router = APIRouter()
+# Chat replies can carry inline base64 step images; orjson encodes them faster
+# than the stdlib json encoder behind the default JSONResponse
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 def _should_inject_health_context(
@@ -66,6 +71,142 @@ def _should_inject_health_context(
     return classify_query_complexity(query, has_attachments=False) != "simple"
 
 
+# History window fed to the model. The window start only advances in steps of
+# this size, so consecutive turns usually share a byte-identical prompt prefix
+# (system prompt, health context, earlier history) that Gemini's implicit
+# prompt caching can reuse; the window holds between 4 and 7 messages.
+HISTORY_WINDOW = 4
+
+
+# Speaker label per history role; any other role is shown as the assistant
+_ROLE_PREFIX = {"user": "User: ", "assistant": "Assistant: "}
+
+
+def _history_window(history: list) -> list:
+    """Return the recent history slice, aligned so its start moves rarely."""
+    start = max(0, len(history) - HISTORY_WINDOW) // HISTORY_WINDOW * HISTORY_WINDOW
+    return history[start:]
+
+
+def _build_context(health_context: str, history: Optional[list]) -> str:
+    """
+    Assemble the model context, most stable part first.
+
+    Health context changes least between turns, then the history window, so
+    the prompt only grows at its tail until the window advances.
+    """
+    context = ""
+    if history:
+        context = "\n".join(
+            _ROLE_PREFIX.get(msg.get("role"), "Assistant: ") + msg.get("content", "")
+            for msg in _history_window(history)
+        )
+    if health_context:
+        context = health_context + "\n" + context
+    return context
+
+
+# Step image fields persisted with a chat and their defaults (the inline
+# base64 image is not persisted)
+_SAVED_STEP_FIELDS = {
+    "step_number": None,
+    "title": None,
+    "description": None,
+    "image_url": None,
+    "s3_key": None,
+    "image_failed": False,
+    "fallback_text": None,
+}
+
+
+def _translate_response(response: str, target_lang: str, request_id: str) -> str:
+    """Translate the English reply, returning it untranslated on failure."""
+    try:
+        return translate_from_english(response, target_lang)
+    except Exception as e:
+        logger.warning(
+            "Translation from English failed, returning English response",
+            request_id=request_id,
+            error=str(e),
+            target_language=target_lang,
+        )
+        return response
+
+
+def _load_attachment(att) -> Optional[bytes]:
+    """
+    Return an attachment's bytes, from S3 or its inline base64 data.
+
+    Blocking (S3 GET / multi-MB decode), so callers run it in the threadpool.
+    """
+    if att.s3_key:
+        from report_analyzer import get_report_from_s3
+
+        logger.info("Processing S3 attachment", key=att.s3_key)
+        return get_report_from_s3(att.s3_key)
+    if att.data:
+        return binascii.a2b_base64(att.data)
+    return None
+
+
+async def _none() -> None:
+    """Placeholder awaitable for a skipped lookup in asyncio.gather."""
+    return None
+
+
+def _enforce_guest_limit(query: str, client_info: dict) -> None:
+    """
+    Check and count a guest message, raising 429 once the trial is used up.
+
+    Blocking (DynamoDB), so callers run it in the threadpool.
+    """
+    ip_address = client_info["ip_address"]
+    client_user_agent = client_info["user_agent"]
+    client_fingerprint = client_info["fingerprint"]
+
+    guest_status = check_guest_limit(
+        ip_address=ip_address,
+        user_agent=client_user_agent,
+        fingerprint=client_fingerprint,
+    )
+
+    if not guest_status["allowed"]:
+        log_guest_event(
+            guest_id=guest_status["guest_id"],
+            ip_address=ip_address,
+            action="limit_reached",
+        )
+        logger.warning("Guest limit reached", guest_id=guest_status["guest_id"])
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": "Guest trial limit reached. Please sign up for unlimited access.",
+                "limit": guest_status["limit"],
+                "message_count": guest_status["message_count"],
+            },
+        )
+
+    increment_result = increment_guest_message(
+        ip_address=ip_address,
+        user_agent=client_user_agent,
+        fingerprint=client_fingerprint,
+        query=query[:100],
+    )
+
+    log_guest_event(
+        guest_id=increment_result["guest_id"],
+        ip_address=ip_address,
+        action="chat",
+        details={"remaining": increment_result["remaining"]},
+    )
+
+    logger.info(
+        "Guest chat",
+        guest_id=increment_result["guest_id"][:12],
+        remaining=increment_result["remaining"],
+    )
+
+
 @router.post("/chat", response_model=ChatResponse)
 @router.post("/v1/chat", response_model=ChatResponse)
 async def chat(
@@ -119,6 +260,7 @@ async def _handle_chat(
 
     query = request.query.strip()
     language = request.language
+    target_lang = SUPPORTED_LANGUAGES.get(language, "en")
 
     if not query:
         raise HTTPException(status_code=400, detail="Query cannot be empty")
@@ -138,56 +280,10 @@ async def _handle_chat(
         )
     query = sanitized_query
 
-    # Extract client info
-    ip_address = client_info["ip_address"]
-    client_user_agent = client_info["user_agent"]
-    client_fingerprint = client_info["fingerprint"]
-
-    # Phase 3: Guest trial enforcement for unauthenticated users
-    if not user_info:
-        guest_status = check_guest_limit(
-            ip_address=ip_address,
-            user_agent=client_user_agent,
-            fingerprint=client_fingerprint,
-        )
-
-        if not guest_status["allowed"]:
-            log_guest_event(
-                guest_id=guest_status["guest_id"],
-                ip_address=ip_address,
-                action="limit_reached",
-            )
-            logger.warning("Guest limit reached", guest_id=guest_status["guest_id"])
-            raise HTTPException(
-                status_code=429,
-                detail={
-                    "message": "Guest trial limit reached. Please sign up for unlimited access.",
-                    "limit": guest_status["limit"],
-                    "message_count": guest_status["message_count"],
-                },
-            )
-
-        increment_result = increment_guest_message(
-            ip_address=ip_address,
-            user_agent=client_user_agent,
-            fingerprint=client_fingerprint,
-            query=query[:100],
-        )
-
-        log_guest_event(
-            guest_id=increment_result["guest_id"],
-            ip_address=ip_address,
-            action="chat",
-            details={"remaining": increment_result["remaining"]},
-        )
-
-        logger.info(
-            "Guest chat",
-            guest_id=increment_result["guest_id"][:12],
-            remaining=increment_result["remaining"],
-        )
+    has_attachments = bool(request.attachments and len(request.attachments) > 0)
+    has_history = bool(request.conversation_history)
 
-    # Detect input language and translate to English if needed
+    # Detect input language (a local character-range check)
     detected_lang = "en"
     try:
         detected_lang = detect_language(query)
@@ -197,11 +293,28 @@ async def _handle_chat(
             request_id=request_id,
             error=str(e),
         )
+
+    # English queries need no translation, so the cache probe can start now
+    # and overlap the guest check and health context fetch
+    cache_probe = None
+    if not has_attachments and detected_lang == "en":
+        cache_probe = asyncio.ensure_future(run_in_threadpool(get_cached_response, query))
+
+    # Phase 3: Guest trial enforcement for unauthenticated users
+    if not user_info:
+        try:
+            await run_in_threadpool(_enforce_guest_limit, query, client_info)
+        except Exception:
+            if cache_probe:
+                cache_probe.cancel()
+            raise
+
+    # Translate to English if needed
     english_query = query
 
     if detected_lang != "en":
         try:
-            english_query, _ = translate_to_english(query, detected_lang)
+            english_query, _ = await run_in_threadpool(translate_to_english, query, detected_lang)
         except Exception as e:
             logger.warning(
                 "Translation to English failed, using original query",
@@ -211,28 +324,20 @@ async def _handle_chat(
             )
             english_query = query
 
-    has_attachments = bool(request.attachments and len(request.attachments) > 0)
-    has_history = bool(request.conversation_history)
-
-    # Build context from conversation history if provided
-    context = ""
-    if has_history:
-        context = "\n".join(
-            [
-                f"{'User' if msg.get('role') == 'user' else 'Assistant'}: {msg.get('content', '')}"
-                for msg in request.conversation_history[-4:]
-            ]
-        )
+    # Topic depends only on the query; used for the cache entry and the reply
+    topic = detect_medical_topic(english_query)
 
     # Phase 2.5: Inject health context for personalized RAG
     health_context = ""
     if user_info and _should_inject_health_context(
         english_query, has_attachments=has_attachments, has_history=has_history
     ):
-        health_context = get_context_summary(user_info["user_id"])
+        health_context = await run_in_threadpool(get_context_summary, user_info["user_id"])
         if health_context:
             logger.info("Injecting health context", user_id=user_info["user_id"][:8])
-            context = health_context + "\n" + context
+
+    # Health context first, then history, so the prompt prefix stays stable
+    context = _build_context(health_context, request.conversation_history)
 
     # Process file attachments if present
     response = None
@@ -240,46 +345,39 @@ async def _handle_chat(
         logger.info("Processing attachments", count=len(request.attachments))
 
         from gemini_client import invoke_llm_with_files
-        from report_analyzer import get_report_from_s3
+
+        # Fetch/decode every attachment concurrently; results keep request order
+        loaded = await asyncio.gather(
+            *(run_in_threadpool(_load_attachment, att) for att in request.attachments),
+            return_exceptions=True,
+        )
 
         file_parts = []
         report_tasks = []
 
-        for att in request.attachments:
-            try:
-                if att.s3_key:
-                    logger.info("Processing S3 attachment", key=att.s3_key)
-                    file_bytes = get_report_from_s3(att.s3_key)
-                    if not file_bytes:
-                        logger.error("Failed to fetch S3 attachment", key=att.s3_key)
-                        continue
-
-                    file_parts.append(
-                        {
-                            "data": file_bytes,
-                            "mime_type": att.content_type,
-                            "filename": att.filename,
-                        }
-                    )
-
-                    if att.type == "pdf" and user_info:
-                        report_tasks.append(att.s3_key)
-
-                elif att.data:
-                    file_bytes = base64.b64decode(att.data)
-                    file_parts.append(
-                        {
-                            "data": file_bytes,
-                            "mime_type": att.content_type,
-                            "filename": att.filename,
-                        }
-                    )
-            except Exception as e:
+        for att, file_bytes in zip(request.attachments, loaded):
+            if isinstance(file_bytes, Exception):
                 logger.error(
                     "Failed to process attachment",
                     filename=att.filename,
-                    error=str(e),
+                    error=str(file_bytes),
                 )
+                continue
+            if not file_bytes:
+                if att.s3_key:
+                    logger.error("Failed to fetch S3 attachment", key=att.s3_key)
+                continue
+
+            file_parts.append(
+                {
+                    "data": file_bytes,
+                    "mime_type": att.content_type,
+                    "filename": att.filename,
+                }
+            )
+
+            if att.s3_key and att.type == "pdf" and user_info:
+                report_tasks.append(att.s3_key)
 
         if file_parts:
             response = await run_in_threadpool(
@@ -292,18 +390,22 @@ async def _handle_chat(
 
             # Improvement 1.3: Background report analysis (was no-op pass before)
             if report_tasks and user_info:
-                from report_analyzer import analyze_report
+                from report_analyzer import analyze_reports_batch
 
-                for s3_key in report_tasks:
-                    logger.info("Triggering background report analysis", key=s3_key)
-                    background_tasks.add_task(
-                        analyze_report, s3_key, user_info["user_id"]
-                    )
+                # All attached reports go to Gemini in one call
+                logger.info("Triggering background report analysis", keys=report_tasks)
+                background_tasks.add_task(
+                    analyze_reports_batch, report_tasks, user_info["user_id"]
+                )
 
     # Standard LLM call (no attachments) — with cache + model routing
+    cached = None
     if not response:
         # Check response cache first
-        cached = None if has_attachments else get_cached_response(english_query)
+        if cache_probe:
+            cached = await cache_probe
+        else:
+            cached = None if has_attachments else await run_in_threadpool(get_cached_response, english_query)
 
         if cached:
             response = cached["response"]
@@ -355,27 +457,22 @@ async def _handle_chat(
                 llm_duration_ms = int((time.time() - llm_start) * 1000)
                 logger.info("LLM fallback completed", request_id=request_id, duration_ms=llm_duration_ms)
 
-            # Cache the response (non-blocking, best-effort)
-            if response and not has_attachments:
-                topic_for_cache = detect_medical_topic(english_query)
-                try:
-                    cache_response(english_query, response, topic=topic_for_cache or "")
-                except Exception:
-                    pass  # Non-fatal
-
     if not response:
         logger.error("LLM failed to respond", request_id=request_id)
         raise HTTPException(status_code=500, detail="Failed to get response from AI")
 
-    # Phase 4: LLM Safety - Output validation
-    output_safe, sanitized_response, output_fallback = check_output_safety(response)
+    # Phase 4: LLM Safety - Output validation. Cached responses were stored
+    # after passing it, so they skip it unless the policy changed since.
+    if cached and cached.get("safety_version") == OUTPUT_SAFETY_VERSION:
+        output_safe, sanitized_response, output_fallback = True, response, None
+    else:
+        output_safe, sanitized_response, output_fallback = check_output_safety(response)
     if not output_safe:
         logger.warning("Blocked unsafe output", request_id=request_id)
         record_security_metric("suspicious")
-        target_lang = SUPPORTED_LANGUAGES.get(language, "en")
         fallback = output_fallback or "I'm sorry, but I can't provide that response."
         if target_lang != "en":
-            fallback = translate_from_english(fallback, target_lang)
+            fallback = await run_in_threadpool(translate_from_english, fallback, target_lang)
         return ChatResponse(
             answer=fallback,
             original_query=query,
@@ -387,27 +484,24 @@ async def _handle_chat(
 
     response = sanitized_response
 
-    # Translate response back if needed
-    final_response = response
-    target_lang = SUPPORTED_LANGUAGES.get(language, "en")
+    # Cache the validated response (non-blocking, best-effort)
+    if not cached and not has_attachments:
+        background_tasks.add_task(
+            cache_response, english_query, response, topic=topic or "",
+            safety_version=OUTPUT_SAFETY_VERSION,
+        )
 
+    # Translate response back if needed; the translation round-trip runs
+    # while step images are generated and is awaited before the reply
+    translation = None
     if target_lang != "en":
-        try:
-            final_response = translate_from_english(response, target_lang)
-        except Exception as e:
-            logger.warning(
-                "Translation from English failed, returning English response",
-                request_id=request_id,
-                error=str(e),
-                target_language=target_lang,
-            )
-            final_response = response
-
-    # Detect topic
-    topic = detect_medical_topic(english_query)
+        translation = asyncio.ensure_future(
+            run_in_threadpool(_translate_response, response, target_lang, request_id)
+        )
 
     # Generate step-by-step images
     step_images_list = None
+    step_images_data = []
     all_images = []
     primary_image = None
 
@@ -435,8 +529,7 @@ async def _handle_chat(
         logger.info("Extracted treatment steps", count=len(steps))
 
         if steps:
-            # Improvement 3.3: Use SHA-256 instead of MD5
-            query_hash = hashlib.sha256(english_query.encode()).hexdigest()[:12]
+            query_hash = compute_query_hash(english_query)
 
             logger.info(
                 "Generating step-aligned visual guides",
@@ -447,9 +540,11 @@ async def _handle_chat(
             elapsed_seconds = time.time() - request_start
             image_gen_start = time.time()
             try:
-                step_images_data = await run_in_threadpool(
-                    generate_all_step_images, steps, english_query, query_hash,
-                    elapsed_seconds,
+                # Guest chats are not persisted, so the inline base64 image is
+                # all they need; skip the S3 upload + presign for them.
+                step_images_data = await generate_all_step_images_async(
+                    steps, english_query, query_hash, elapsed_seconds,
+                    upload_to_s3=bool(user_info),
                 )
             except Exception as e:
                 logger.error(
@@ -471,50 +566,27 @@ async def _handle_chat(
             step_images_list = []
             for step_data in step_images_data:
                 image_url = step_data.get("image_url")
-                image_base64 = step_data.get("image")
-
-                step_images_list.append(
-                    StepImage(
-                        step_number=step_data["step_number"],
-                        title=step_data["title"],
-                        description=step_data["description"],
-                        image_prompt=step_data.get("image_prompt"),
-                        image=image_base64 if not image_url else None,
-                        image_url=image_url,
-                        s3_key=step_data.get("s3_key"),
-                        is_composite=step_data.get("is_composite", False),
-                        panel_index=step_data.get("panel_index"),
-                        image_failed=step_data.get("image_failed", False),
-                        fallback_text=step_data.get("fallback_text"),
-                    )
-                )
-
                 if image_url:
+                    # Served from S3, so the inline base64 copy is not sent
+                    step_data["image"] = None
                     all_images.append(image_url)
-                elif image_base64:
-                    all_images.append(image_base64)
+                elif step_data.get("image"):
+                    all_images.append(step_data["image"])
+
+                # Built by the image pipeline, so field validation is skipped
+                step_images_list.append(StepImage.model_construct(**step_data))
 
             if all_images:
                 primary_image = all_images[0]
 
+    final_response = await translation if translation else response
+
     # Improvement 3.2: Move save_chat and extract_facts to BackgroundTasks
     if user_info:
-        step_images_data = (
-            [
-                {
-                    "step_number": img.step_number,
-                    "title": img.title,
-                    "description": img.description,
-                    "image_url": img.image_url,
-                    "s3_key": img.s3_key,
-                    "image_failed": img.image_failed,
-                    "fallback_text": img.fallback_text,
-                }
-                for img in step_images_list
-            ]
-            if step_images_list
-            else []
-        )
+        saved_step_images = [
+            {field: step_data.get(field, default) for field, default in _SAVED_STEP_FIELDS.items()}
+            for step_data in step_images_data
+        ]
 
         attachments_data = (
             [
@@ -529,25 +601,20 @@ async def _handle_chat(
             else []
         )
 
-        # Save chat in background (non-blocking)
+        # Save chat and extract health facts in one background task that
+        # runs both concurrently (non-blocking)
         background_tasks.add_task(
-            save_chat,
-            user_id=user_info["user_id"],
-            query=query,
-            response=final_response,
-            images=all_images if all_images else [],
-            topic=topic,
-            language=language,
-            step_images=step_images_data,
-            attachments=attachments_data,
-        )
-
-        # Extract health facts in background (non-blocking)
-        background_tasks.add_task(
-            _extract_facts_background,
-            user_info["user_id"],
-            query,
-            final_response,
+            _finalize_chat_background,
+            dict(
+                user_id=user_info["user_id"],
+                query=query,
+                response=final_response,
+                images=all_images if all_images else [],
+                topic=topic,
+                language=language,
+                step_images=saved_step_images,
+                attachments=attachments_data,
+            ),
         )
 
     # Log total request duration
@@ -571,9 +638,31 @@ async def _handle_chat(
     )
 
 
+async def _finalize_chat_background(chat: dict):
+    """
+    Background task: persist the chat and extract health facts from it.
+
+    Starlette runs background tasks one after another, and under Mangum they
+    finish before the Lambda returns, so the two independent writes overlap
+    in the threadpool instead.
+    """
+    results = await asyncio.gather(
+        run_in_threadpool(save_chat, **chat),
+        run_in_threadpool(_extract_facts_background, chat["user_id"], chat["query"], chat["response"]),
+        return_exceptions=True,
+    )
+    if isinstance(results[0], Exception):
+        logger.error("Failed to save chat", error=str(results[0]))
+
+
 def _extract_facts_background(user_id: str, query: str, response: str):
     """Background task to extract health facts from chat."""
     try:
+        # Under Mangum background tasks still run before the Lambda returns,
+        # so hand the Gemini call to the queue worker when one is configured
+        if enqueue_fact_extraction(user_id, query):
+            return
+
         extracted = extract_facts_from_chat(user_id, query, response)
         if extracted:
             logger.info("Extracted facts", facts=extracted)
@@ -584,20 +673,36 @@ def _extract_facts_background(user_id: str, query: str, response: str):
 @router.post("/generate-image", response_model=ImageResponse)
 async def create_image(request: ImageRequest):
     """Generate a single medical illustration."""
-    image_bytes = generate_image(
-        request.prompt, width=request.width, height=request.height
+    image_bytes = await run_in_threadpool(
+        generate_image, request.prompt, width=request.width, height=request.height
     )
 
     if not image_bytes:
         raise HTTPException(status_code=500, detail="Failed to generate image")
 
-    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
+    image_b64 = (await run_in_threadpool(binascii.b2a_base64, image_bytes, newline=False)).decode("ascii")
     return ImageResponse(image=image_b64, prompt=request.prompt)
 
 
 # ============================================
 # SSE Streaming Endpoint
 # ============================================
+def _sse_event(event: str, payload: Any) -> str:
+    """Format one Server-Sent Event (orjson keeps base64 step-image payloads cheap to encode)."""
+    return f"event: {event}\ndata: {orjson.dumps(payload, default=str).decode()}\n\n"
+
+
+# Token frames are the hot path of a stream: the framing is pre-encoded and
+# orjson escapes the chunk straight into a JSON string, with no dict per token.
+_TOKEN_PREFIX = b'event: token\ndata: {"text":'
+_TOKEN_SUFFIX = b"}\n\n"
+
+
+def _sse_token(text: str) -> bytes:
+    """Format one token event, byte-identical to _sse_event("token", {"text": text})."""
+    return _TOKEN_PREFIX + orjson.dumps(text) + _TOKEN_SUFFIX
+
+
 @router.post("/chat/stream")
 async def chat_stream(
     request: ChatRequest,
@@ -622,7 +727,7 @@ async def chat_stream(
     input_safe, sanitized_query, fallback_response = check_input_safety(query)
     if not input_safe:
         async def error_stream():
-            yield f"event: error\ndata: {json.dumps({'message': fallback_response})}\n\n"
+            yield _sse_event("error", {'message': fallback_response})
             yield "event: done\ndata: {}\n\n"
         return StreamingResponse(error_stream(), media_type="text/event-stream")
     query = sanitized_query
@@ -636,46 +741,54 @@ async def chat_stream(
     english_query = query
     if detected_lang != "en":
         try:
-            english_query, _ = translate_to_english(query, detected_lang)
+            english_query, _ = await run_in_threadpool(translate_to_english, query, detected_lang)
         except Exception as e:
             logger.warning("Stream translation to English failed", error=str(e))
             english_query = query
+    topic = detect_medical_topic(english_query)
 
     # Build context
-    context = ""
     has_attachments = bool(request.attachments and len(request.attachments) > 0)
     has_history = bool(request.conversation_history)
 
-    if has_history:
-        context = "\n".join(
-            f"{'User' if m.get('role')=='user' else 'Assistant'}: {m.get('content','')}"
-            for m in request.conversation_history[-4:]
-        )
-    if user_info and _should_inject_health_context(
+    # Health context and cache lookup are independent DynamoDB reads
+    want_health = bool(user_info) and _should_inject_health_context(
         english_query, has_attachments=has_attachments, has_history=has_history
-    ):
-        hc = get_context_summary(user_info["user_id"])
-        if hc:
-            context = hc + "\n" + context
+    )
+    hc, cached = await asyncio.gather(
+        run_in_threadpool(get_context_summary, user_info["user_id"]) if want_health else _none(),
+        _none() if has_attachments else run_in_threadpool(get_cached_response, english_query),
+    )
+    context = _build_context(hc or "", request.conversation_history)
 
     # Model routing
     selected_model = get_model_for_query(english_query, has_attachments=has_attachments)
 
-    # Check cache
-    cached = None if has_attachments else get_cached_response(english_query)
-
     async def event_generator():
         request_start = time.time()
         full_response = ""
 
+        # When the query alone already calls for visuals, parse steps while
+        # tokens are still streaming; images start only after output safety.
+        image_pipeline = None
+        if request.generate_images:
+            try:
+                if should_generate_images(english_query, ""):
+                    query_hash = compute_query_hash(english_query)
+                    image_pipeline = StepImagePipeline(
+                        english_query, query_hash, upload_to_s3=bool(user_info)
+                    )
+            except Exception as e:
+                logger.warning("Stream image pipeline setup failed", error=str(e))
+
         try:
             if cached:
-                # Stream cached response in chunks for consistent UX
+                # A cached response is static, so it goes out as one token
+                # event (the client appends token text either way)
                 text = cached["response"]
-                chunk_size = 80
-                for i in range(0, len(text), chunk_size):
-                    chunk = text[i:i + chunk_size]
-                    yield f"event: token\ndata: {json.dumps({'text': chunk})}\n\n"
+                if image_pipeline:
+                    image_pipeline.feed(text)
+                yield _sse_token(text)
                 full_response = text
             else:
                 # Stream from LLM
@@ -684,41 +797,49 @@ async def chat_stream(
                     request.thinking_mode, selected_model
                 ):
                     full_response += chunk
-                    yield f"event: token\ndata: {json.dumps({'text': chunk})}\n\n"
-
-                # Cache the response
-                if full_response:
-                    topic_for_cache = detect_medical_topic(english_query)
-                    try:
-                        cache_response(english_query, full_response, topic=topic_for_cache or "")
-                    except Exception:
-                        pass
+                    if image_pipeline:
+                        image_pipeline.feed(chunk)
+                    yield _sse_token(chunk)
 
             if not full_response:
-                yield f"event: error\ndata: {json.dumps({'message': 'No response from AI'})}\n\n"
+                yield _sse_event("error", {'message': 'No response from AI'})
                 yield "event: done\ndata: {}\n\n"
                 return
 
-            # Output safety
-            output_safe, sanitized, fallback = check_output_safety(full_response)
+            # Output safety (skipped for cache hits validated under this policy)
+            if cached and cached.get("safety_version") == OUTPUT_SAFETY_VERSION:
+                output_safe, sanitized, fallback = True, full_response, None
+            else:
+                output_safe, sanitized, fallback = check_output_safety(full_response)
             if not output_safe:
-                yield f"event: error\ndata: {json.dumps({'message': fallback or 'Response blocked by safety filter'})}\n\n"
+                yield _sse_event("error", {'message': fallback or 'Response blocked by safety filter'})
                 yield "event: done\ndata: {}\n\n"
                 return
 
-            # Translate if needed
-            target_lang = SUPPORTED_LANGUAGES.get(request.language, "en")
-            translated = sanitized  # noqa: F841
-            if target_lang != "en":
+            # Cache the validated response
+            if not cached and not has_attachments:
                 try:
-                    translated = translate_from_english(sanitized, target_lang)  # noqa: F841
-                except Exception as e:
-                    logger.warning("Stream translation from English failed", error=str(e))
-                    translated = sanitized  # noqa: F841
+                    await run_in_threadpool(
+                        cache_response, english_query, sanitized, topic=topic or "",
+                        safety_version=OUTPUT_SAFETY_VERSION,
+                    )
+                except Exception:
+                    pass
 
             # Metadata event
-            topic = detect_medical_topic(english_query)
-            yield f"event: metadata\ndata: {json.dumps({'topic': topic, 'detected_language': detected_lang})}\n\n"
+            yield _sse_event("metadata", {'topic': topic, 'detected_language': detected_lang})
+
+            # Steps already parsed from the token stream, unless safety rewrote the text
+            if image_pipeline and sanitized == full_response:
+                try:
+                    step_images_data = await image_pipeline.finish(time.time() - request_start)
+                except Exception as e:
+                    logger.error("Stream image generation failed", error=str(e))
+                    step_images_data = []
+                if step_images_data:
+                    yield _sse_event("step_images", step_images_data)
+                yield "event: done\ndata: {}\n\n"
+                return
 
             # Generate images if requested
             should_generate_stream_images = False
@@ -736,21 +857,22 @@ async def chat_stream(
                     steps = []
                 if steps:
                     elapsed = time.time() - request_start
-                    query_hash = hashlib.sha256(english_query.encode()).hexdigest()[:12]
+                    query_hash = compute_query_hash(english_query)
                     try:
-                        step_images_data = await run_in_threadpool(
-                            generate_all_step_images, steps, english_query, query_hash, elapsed
+                        step_images_data = await generate_all_step_images_async(
+                            steps, english_query, query_hash, elapsed,
+                            upload_to_s3=bool(user_info),
                         )
                     except Exception as e:
                         logger.error("Stream image generation failed", error=str(e))
                         step_images_data = []
-                    yield f"event: step_images\ndata: {json.dumps(step_images_data, default=str)}\n\n"
+                    yield _sse_event("step_images", step_images_data)
 
             yield "event: done\ndata: {}\n\n"
 
         except Exception as e:
             logger.error("Stream error", error=str(e))
-            yield f"event: error\ndata: {json.dumps({'message': str(e)})}\n\n"
+            yield _sse_event("error", {'message': str(e)})
             yield "event: done\ndata: {}\n\n"
 
     return StreamingResponse(
@@ -12,7 +12,7 @@ from models.response_models import (
     ChatDetailResponse,
 )
 from dependencies import require_auth
-from chat_history import get_user_chats, get_chat, delete_chat, get_chat_summary
+from chat_history import get_user_chats, get_chat, delete_chat, get_chat_summary, get_created_at
 
 logger = Logger(service="medibot")
 router = APIRouter()
@@ -54,7 +54,7 @@ async def get_chat_detail(
         topic=chat.get("topic", ""),
         language=chat.get("language", "English"),
         timestamp=chat.get("timestamp", 0),
-        created_at=chat.get("created_at", ""),
+        created_at=get_created_at(chat),
     )
 
 
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Migration Script: Backfill the dedup key sets on existing health profiles.
+
+Profile additions are deduplicated server-side against string sets holding
+the lowercased names of each list (condition_keys, medication_keys,
+allergy_keys, key_fact_keys). Profiles written before those sets existed
+only have the lists, so this script scans the health profile table and:
+1. Finds profiles whose lists have entries missing from the key sets
+2. Builds the lowercased keys from the stored names / fact texts
+3. ADDs them to the matching string sets (existing keys are kept)
+
+Usage:
+    python backfill_profile_keys.py [--dry-run] [--limit N]
+
+Options:
+    --dry-run   Show what would be updated without making changes
+    --limit N   Process only N profiles (default: all)
+"""
+
+import os
+
+import boto3
+import argparse
+from typing import Optional, Dict, Any, Set
+
+# Configuration from environment
+HEALTH_PROFILE_TABLE = os.getenv("HEALTH_PROFILE_TABLE", "medibot-health-profiles-production")
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+
+# Profile lists, the field holding each entry's name, and their key sets
+LIST_KEY_ATTRS = {
+    "conditions": ("name", "condition_keys"),
+    "medications": ("name", "medication_keys"),
+    "allergies": ("name", "allergy_keys"),
+    "key_facts": ("text", "key_fact_keys"),
+}
+
+# Initialize clients
+dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
+table = dynamodb.Table(HEALTH_PROFILE_TABLE)
+
+
+def missing_keys(profile: Dict[str, Any]) -> Dict[str, Set[str]]:
+    """
+    Work out which lowercased keys each key set is missing.
+    Returns {keys_attr: missing_keys} for the sets that need updating.
+    """
+    missing = {}
+
+    for list_attr, (name_field, keys_attr) in LIST_KEY_ATTRS.items():
+        keys = set()
+        for entry in profile.get(list_attr, []):
+            name = entry.get(name_field, "") if isinstance(entry, dict) else entry
+            if name:
+                keys.add(name.lower())
+
+        keys -= set(profile.get(keys_attr, set()))
+        if keys:
+            missing[keys_attr] = keys
+
+    return missing
+
+
+def scan_and_backfill(dry_run: bool = True, limit: Optional[int] = None):
+    """
+    Scan all profiles and backfill missing key sets.
+    """
+    print(f"\n{'='*60}")
+    print("Health Profile Key Backfill Script")
+    print(f"{'='*60}")
+    print(f"Table: {HEALTH_PROFILE_TABLE}")
+    print(f"Region: {AWS_REGION}")
+    print(f"Mode: {'DRY RUN' if dry_run else 'LIVE UPDATE'}")
+    if limit:
+        print(f"Limit: {limit} profiles")
+    print(f"{'='*60}\n")
+
+    total_scanned = 0
+    total_fixed = 0
+    total_keys_added = 0
+
+    # Only the lists and key sets are needed
+    attrs = list(LIST_KEY_ATTRS) + [keys_attr for _, keys_attr in LIST_KEY_ATTRS.values()]
+    scan_kwargs = {
+        'ProjectionExpression': ", ".join(["user_id"] + attrs)
+    }
+
+    if limit:
+        scan_kwargs['Limit'] = limit
+
+    try:
+        # Paginated scan
+        last_key = None
+
+        while True:
+            if last_key:
+                scan_kwargs['ExclusiveStartKey'] = last_key
+
+            response = table.scan(**scan_kwargs)
+            items = response.get('Items', [])
+
+            for profile in items:
+                total_scanned += 1
+
+                missing = missing_keys(profile)
+                if not missing:
+                    continue
+
+                key_count = sum(len(keys) for keys in missing.values())
+                total_fixed += 1
+                total_keys_added += key_count
+                print(f"\nProfile: {profile['user_id'][:8]}...")
+
+                if not dry_run:
+                    # ADD merges into the sets, so concurrent additions are kept
+                    table.update_item(
+                        Key={'user_id': profile['user_id']},
+                        UpdateExpression='ADD ' + ', '.join(
+                            f'{keys_attr} :{keys_attr}' for keys_attr in missing
+                        ),
+                        ExpressionAttributeValues={
+                            f':{keys_attr}': keys for keys_attr, keys in missing.items()
+                        }
+                    )
+                    print(f"  ✅ Added {key_count} keys")
+                else:
+                    print(f"  📝 Would add {key_count} keys")
+
+                if limit and total_scanned >= limit:
+                    break
+
+            # Check for more pages
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key or (limit and total_scanned >= limit):
+                break
+
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return
+
+    # Summary
+    print(f"\n{'='*60}")
+    print("SUMMARY")
+    print(f"{'='*60}")
+    print(f"Profiles scanned: {total_scanned}")
+    print(f"Profiles needing fix: {total_fixed}")
+    print(f"Keys added: {total_keys_added}")
+
+    if dry_run and total_fixed > 0:
+        print("\n⚠️  Run without --dry-run to apply changes")
+    elif not dry_run and total_fixed > 0:
+        print("\n✅ All changes applied!")
+    else:
+        print("\n✨ No changes needed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill health profile dedup key sets')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Show what would be updated without making changes')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Process only N profiles')
+
+    args = parser.parse_args()
+
+    # Safety: default to dry run
+    if not args.dry_run:
+        confirm = input("\n⚠️  This will modify your DynamoDB table. Continue? [y/N]: ")
+        if confirm.lower() != 'y':
+            print("Aborted.")
+            return
+
+    scan_and_backfill(dry_run=args.dry_run, limit=args.limit)
+
+
+if __name__ == '__main__':
+    main()
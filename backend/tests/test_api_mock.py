@@ -1,7 +1,7 @@
 import sys
 import os
 from fastapi.testclient import TestClient
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
 
 # Add backend to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -47,7 +47,7 @@ MOCK_IMAGE_DATA = {
 @patch('routes.chat.log_guest_event')
 @patch('routes.chat.invoke_llm')
 @patch('routes.chat.extract_treatment_steps')
-@patch('routes.chat.generate_all_step_images')
+@patch('routes.chat.generate_all_step_images_async', new_callable=AsyncMock)
 @patch('routes.chat.should_generate_images')
 def test_chat_endpoint(
     mock_should,
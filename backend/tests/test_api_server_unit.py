@@ -3,7 +3,8 @@ Unit tests for api_server.py - FastAPI endpoint tests.
 Uses TestClient with mocked dependencies.
 """
 
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
+import pytest
 import base64
 from fastapi.testclient import TestClient
 
@@ -72,7 +73,7 @@ class TestHealthEndpoint:
              patch("routes.chat.invoke_llm") as mock_llm, \
              patch("routes.chat.extract_treatment_steps") as mock_steps, \
              patch("routes.chat.detect_medical_topic") as mock_topic, \
-             patch("routes.chat.generate_all_step_images") as mock_images, \
+             patch("routes.chat.generate_all_step_images_async", new_callable=AsyncMock) as mock_images, \
              patch("routes.chat.check_guest_limit") as mock_check_guest, \
              patch("routes.chat.increment_guest_message") as mock_increment_guest, \
              patch("routes.chat.log_guest_event") as _mock_log_guest:  # noqa: F841
@@ -106,7 +107,7 @@ class TestHealthEndpoint:
              patch("routes.chat.invoke_llm") as mock_llm, \
              patch("routes.chat.extract_treatment_steps") as mock_steps, \
              patch("routes.chat.detect_medical_topic") as mock_topic, \
-             patch("routes.chat.generate_all_step_images") as mock_images, \
+             patch("routes.chat.generate_all_step_images_async", new_callable=AsyncMock) as mock_images, \
              patch("routes.chat.check_guest_limit") as mock_check_guest, \
              patch("routes.chat.increment_guest_message") as mock_increment_guest, \
              patch("routes.chat.log_guest_event") as _mock_log_guest:  # noqa: F841
@@ -138,7 +139,7 @@ class TestHealthEndpoint:
              patch("routes.chat.invoke_llm") as mock_llm, \
              patch("routes.chat.extract_treatment_steps") as mock_steps, \
              patch("routes.chat.detect_medical_topic") as mock_topic, \
-             patch("routes.chat.generate_all_step_images") as mock_images, \
+             patch("routes.chat.generate_all_step_images_async", new_callable=AsyncMock) as mock_images, \
              patch("dependencies.get_user_info") as mock_auth, \
              patch("routes.chat.save_chat") as mock_save, \
              patch("routes.chat.get_context_summary") as mock_context:
@@ -172,7 +173,7 @@ class TestHealthEndpoint:
              patch("routes.chat.invoke_llm") as mock_llm, \
              patch("routes.chat.extract_treatment_steps") as mock_steps, \
              patch("routes.chat.detect_medical_topic") as mock_topic, \
-             patch("routes.chat.generate_all_step_images") as mock_images, \
+             patch("routes.chat.generate_all_step_images_async", new_callable=AsyncMock) as mock_images, \
              patch("dependencies.get_user_info") as mock_auth, \
              patch("routes.chat.save_chat") as mock_save, \
              patch("routes.chat.get_context_summary") as mock_context:
@@ -209,7 +210,7 @@ class TestHealthEndpoint:
              patch("routes.chat.invoke_llm") as mock_llm, \
              patch("routes.chat.extract_treatment_steps") as mock_steps, \
              patch("routes.chat.detect_medical_topic") as mock_topic, \
-             patch("routes.chat.generate_all_step_images") as mock_images, \
+             patch("routes.chat.generate_all_step_images_async", new_callable=AsyncMock) as mock_images, \
              patch("routes.chat.check_guest_limit") as mock_check_guest, \
              patch("routes.chat.increment_guest_message") as mock_increment_guest, \
              patch("routes.chat.log_guest_event") as _mock_log_guest:  # noqa: F841
@@ -244,7 +245,7 @@ class TestHealthEndpoint:
              patch("routes.chat.invoke_llm") as mock_llm, \
              patch("routes.chat.should_generate_images") as mock_should, \
              patch("routes.chat.extract_treatment_steps") as mock_steps, \
-             patch("routes.chat.generate_all_step_images") as mock_images, \
+             patch("routes.chat.generate_all_step_images_async", new_callable=AsyncMock) as mock_images, \
              patch("routes.chat.detect_medical_topic") as mock_topic, \
              patch("routes.chat.check_guest_limit") as mock_check_guest, \
              patch("routes.chat.increment_guest_message") as mock_increment_guest, \
@@ -359,6 +360,292 @@ class TestChatGuestLimitHeaders:
             assert kwargs["fingerprint"] == "fp"
 
 
+class TestChatRequestLimits:
+    """Tests for size limits on chat request context."""
+
+    def test_long_history_keeps_most_recent_messages(self):
+        from models.request_models import ChatRequest, MAX_HISTORY_MESSAGES
+
+        history = [{"role": "user", "content": str(i)} for i in range(MAX_HISTORY_MESSAGES + 10)]
+        request = ChatRequest(query="Test query", conversation_history=history)
+
+        assert len(request.conversation_history) == MAX_HISTORY_MESSAGES
+        assert request.conversation_history[0]["content"] == "10"
+        assert request.conversation_history[-1]["content"] == str(MAX_HISTORY_MESSAGES + 9)
+
+    def test_oversized_history_message_is_clipped(self):
+        from models.request_models import ChatRequest, MAX_HISTORY_MESSAGE_CHARS
+
+        history = [{"role": "user", "content": "x" * (MAX_HISTORY_MESSAGE_CHARS + 1)}]
+        request = ChatRequest(query="Test query", conversation_history=history)
+
+        assert request.conversation_history == [{"role": "user", "content": "x" * MAX_HISTORY_MESSAGE_CHARS}]
+
+    def test_chat_rejects_too_many_attachments(self):
+        from api_server import app
+        client = TestClient(app)
+
+        attachment = {"filename": "a.png", "content_type": "image/png", "type": "image"}
+        response = client.post("/chat", json={"query": "Test query", "attachments": [attachment] * 6})
+
+        assert response.status_code == 422
+
+
+class TestChatCacheProbe:
+    """Tests for the early response-cache probe on English queries."""
+
+    def test_cached_english_query_skips_llm(self):
+        from api_server import app
+
+        cached = {"response": "Rest and fluids.", "topic": "", "timestamp": 0}
+        with patch("routes.chat.get_cached_response", return_value=cached) as mock_cache, \
+             patch("routes.chat.invoke_llm") as mock_llm, \
+             patch("routes.chat.check_guest_limit") as mock_check_guest, \
+             patch("routes.chat.increment_guest_message") as mock_increment_guest, \
+             patch("routes.chat.log_guest_event"):
+            mock_check_guest.return_value = {"allowed": True, "remaining": 2, "message_count": 0, "limit": 3, "guest_id": "guest_1"}
+            mock_increment_guest.return_value = {"guest_id": "guest_1", "remaining": 2}
+
+            client = TestClient(app)
+            response = client.post("/chat", json={"query": "How to treat a cold?", "generate_images": False})
+
+        assert response.status_code == 200
+        assert response.json()["answer"] == "Rest and fluids."
+        mock_cache.assert_called_once_with("How to treat a cold?")
+        mock_llm.assert_not_called()
+
+    @pytest.mark.parametrize("safety_version,expect_check", [(1, False), (None, True), (0, True)])
+    def test_output_safety_skipped_only_for_current_policy(self, safety_version, expect_check):
+        from api_server import app
+
+        cached = {"response": "Rest and fluids.", "topic": "", "timestamp": 0, "safety_version": safety_version}
+        with patch("routes.chat.OUTPUT_SAFETY_VERSION", 1), \
+             patch("routes.chat.get_cached_response", return_value=cached), \
+             patch("routes.chat.check_output_safety", return_value=(True, "Rest and fluids.", None)) as mock_output, \
+             patch("routes.chat.cache_response") as mock_cache_write, \
+             patch("routes.chat.check_guest_limit") as mock_check_guest, \
+             patch("routes.chat.increment_guest_message") as mock_increment_guest, \
+             patch("routes.chat.log_guest_event"):
+            mock_check_guest.return_value = {"allowed": True, "remaining": 2, "message_count": 0, "limit": 3, "guest_id": "guest_1"}
+            mock_increment_guest.return_value = {"guest_id": "guest_1", "remaining": 2}
+
+            client = TestClient(app)
+            response = client.post("/chat", json={"query": "How to treat a cold?", "generate_images": False})
+
+        assert response.status_code == 200
+        assert mock_output.called is expect_check
+        mock_cache_write.assert_not_called()
+
+    def test_validated_llm_response_is_cached(self):
+        from api_server import app
+
+        with patch("routes.chat.get_cached_response", return_value=None), \
+             patch("routes.chat.invoke_llm", return_value="Rest and fluids."), \
+             patch("routes.chat.cache_response") as mock_cache_write, \
+             patch("routes.chat.check_guest_limit") as mock_check_guest, \
+             patch("routes.chat.increment_guest_message") as mock_increment_guest, \
+             patch("routes.chat.log_guest_event"):
+            mock_check_guest.return_value = {"allowed": True, "remaining": 2, "message_count": 0, "limit": 3, "guest_id": "guest_1"}
+            mock_increment_guest.return_value = {"guest_id": "guest_1", "remaining": 2}
+
+            client = TestClient(app)
+            client.post("/chat", json={"query": "How to treat a cold?", "generate_images": False})
+
+        from llm_safety import OUTPUT_SAFETY_VERSION
+        args, kwargs = mock_cache_write.call_args
+        assert args == ("How to treat a cold?", "Rest and fluids.")
+        assert kwargs["safety_version"] == OUTPUT_SAFETY_VERSION
+
+    def test_guest_limit_still_rejects_with_probe_in_flight(self):
+        from api_server import app
+
+        with patch("routes.chat.get_cached_response", return_value=None), \
+             patch("routes.chat.invoke_llm") as mock_llm, \
+             patch("routes.chat.check_guest_limit") as mock_check_guest, \
+             patch("routes.chat.log_guest_event"):
+            mock_check_guest.return_value = {"allowed": False, "remaining": 0, "message_count": 3, "limit": 3, "guest_id": "guest_1"}
+
+            client = TestClient(app)
+            response = client.post("/chat", json={"query": "How to treat a cold?", "generate_images": False})
+
+        assert response.status_code == 429
+        mock_llm.assert_not_called()
+
+
+class TestChatResponseTranslation:
+    """Tests for translating the reply into the requested language."""
+
+    def _post(self, language, translate):
+        from api_server import app
+
+        with patch("routes.chat.get_cached_response", return_value=None), \
+             patch("routes.chat.invoke_llm", return_value="Drink water."), \
+             patch("routes.chat.translate_from_english", side_effect=translate) as mock_translate, \
+             patch("routes.chat.check_guest_limit") as mock_check_guest, \
+             patch("routes.chat.increment_guest_message") as mock_increment_guest, \
+             patch("routes.chat.log_guest_event"):
+            mock_check_guest.return_value = {"allowed": True, "remaining": 2, "message_count": 0, "limit": 3, "guest_id": "guest_1"}
+            mock_increment_guest.return_value = {"guest_id": "guest_1", "remaining": 2}
+
+            client = TestClient(app)
+            response = client.post(
+                "/chat",
+                json={"query": "How to stay hydrated?", "language": language, "generate_images": False},
+            )
+        return response, mock_translate
+
+    def test_english_reply_skips_translation(self):
+        response, mock_translate = self._post("English", lambda text, lang: "unused")
+
+        assert response.json()["answer"] == "Drink water."
+        mock_translate.assert_not_called()
+
+    def test_reply_translated_to_requested_language(self):
+        response, mock_translate = self._post("Hindi", lambda text, lang: f"[{lang}] {text}")
+
+        assert response.json()["answer"] == "[hi] Drink water."
+        mock_translate.assert_called_once_with("Drink water.", "hi")
+
+    def test_failed_translation_returns_english(self):
+        def fail(text, lang):
+            raise RuntimeError("translator down")
+
+        response, _ = self._post("Telugu", fail)
+
+        assert response.status_code == 200
+        assert response.json()["answer"] == "Drink water."
+
+
+class TestChatAttachments:
+    """Tests for loading chat attachments."""
+
+    def test_inline_attachment_decoded(self):
+        from api_server import app
+
+        data = base64.b64encode(b"%PDF-1.4 report").decode()
+        attachment = {"filename": "r.pdf", "content_type": "application/pdf", "type": "pdf", "data": data}
+        with patch("gemini_client.invoke_llm_with_files", return_value="Looks normal.") as mock_files, \
+             patch("routes.chat.check_guest_limit") as mock_check_guest, \
+             patch("routes.chat.increment_guest_message") as mock_increment_guest, \
+             patch("routes.chat.log_guest_event"):
+            mock_check_guest.return_value = {"allowed": True, "remaining": 2, "message_count": 0, "limit": 3, "guest_id": "guest_1"}
+            mock_increment_guest.return_value = {"guest_id": "guest_1", "remaining": 2}
+
+            client = TestClient(app)
+            response = client.post(
+                "/chat",
+                json={"query": "Read my report", "attachments": [attachment], "generate_images": False},
+            )
+
+        assert response.status_code == 200
+        file_parts = mock_files.call_args[0][1]
+        assert file_parts == [{"data": b"%PDF-1.4 report", "mime_type": "application/pdf", "filename": "r.pdf"}]
+
+    def test_s3_attachments_keep_request_order(self):
+        from api_server import app
+
+        blobs = {"a.png": b"first", "b.png": None, "c.png": b"third"}
+        attachments = [
+            {"filename": name, "content_type": "image/png", "type": "image", "s3_key": name}
+            for name in blobs
+        ]
+        with patch("report_analyzer.get_report_from_s3", side_effect=blobs.get), \
+             patch("gemini_client.invoke_llm_with_files", return_value="Looks fine.") as mock_files, \
+             patch("routes.chat.check_guest_limit") as mock_check_guest, \
+             patch("routes.chat.increment_guest_message") as mock_increment_guest, \
+             patch("routes.chat.log_guest_event"):
+            mock_check_guest.return_value = {"allowed": True, "remaining": 2, "message_count": 0, "limit": 3, "guest_id": "guest_1"}
+            mock_increment_guest.return_value = {"guest_id": "guest_1", "remaining": 2}
+
+            client = TestClient(app)
+            response = client.post(
+                "/chat",
+                json={"query": "Check these", "attachments": attachments, "generate_images": False},
+            )
+
+        assert response.status_code == 200
+        file_parts = mock_files.call_args[0][1]
+        assert [part["filename"] for part in file_parts] == ["a.png", "c.png"]
+        assert [part["data"] for part in file_parts] == [b"first", b"third"]
+
+
+class TestChatResponseClass:
+    """Tests for the JSON encoder used by chat routes."""
+
+    def test_chat_routes_use_orjson(self):
+        from fastapi.responses import ORJSONResponse
+        from routes.chat import router
+
+        routes = {route.path: route for route in router.routes}
+        assert routes["/chat"].response_class is ORJSONResponse
+        assert routes["/generate-image"].response_class is ORJSONResponse
+
+
+class TestFinalizeChatBackground:
+    """Tests for the combined post-response background task."""
+
+    CHAT = {"user_id": "user-123", "query": "q", "response": "r", "topic": None}
+
+    def test_saves_chat_and_extracts_facts(self):
+        import asyncio
+        from routes.chat import _finalize_chat_background
+
+        with patch("routes.chat.save_chat") as mock_save, \
+             patch("routes.chat._extract_facts_background") as mock_extract:
+            asyncio.run(_finalize_chat_background(dict(self.CHAT)))
+
+        mock_save.assert_called_once_with(**self.CHAT)
+        mock_extract.assert_called_once_with("user-123", "q", "r")
+
+    def test_save_failure_does_not_stop_extraction(self):
+        import asyncio
+        from routes.chat import _finalize_chat_background
+
+        with patch("routes.chat.save_chat", side_effect=RuntimeError("ddb down")), \
+             patch("routes.chat._extract_facts_background") as mock_extract:
+            asyncio.run(_finalize_chat_background(dict(self.CHAT)))
+
+        mock_extract.assert_called_once()
+
+
+class TestChatContextAssembly:
+    """Tests for the prompt context built from health context and history."""
+
+    def test_health_context_precedes_history(self):
+        from routes.chat import _build_context
+
+        history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+        context = _build_context("Conditions: asthma", history)
+
+        assert context == "Conditions: asthma\nUser: hi\nAssistant: hello"
+
+    def test_unknown_role_and_missing_content(self):
+        from routes.chat import _build_context
+
+        history = [{"role": "model", "content": "ok"}, {"role": "user"}]
+
+        assert _build_context("", history) == "Assistant: ok\nUser: "
+
+    def test_history_window_start_advances_in_steps(self):
+        from routes.chat import _history_window
+
+        history = [{"role": "user", "content": str(i)} for i in range(10)]
+
+        assert _history_window(history[:4]) == history[:4]
+        assert _history_window(history[:7]) == history[:7]
+        assert _history_window(history[:8]) == history[4:8]
+        assert _history_window(history[:10]) == history[4:10]
+
+    def test_consecutive_turns_share_context_prefix(self):
+        from routes.chat import _build_context
+
+        history = [{"role": "user", "content": str(i)} for i in range(8)]
+        earlier = _build_context("Allergies: penicillin", history[:5])
+        later = _build_context("Allergies: penicillin", history[:7])
+
+        assert later.startswith(earlier)
+
+
 class TestChatOutputSafety:
     """Tests for output safety enforcement."""
 
@@ -368,7 +655,7 @@ class TestChatOutputSafety:
         with patch("routes.chat.check_input_safety") as mock_safety, \
              patch("routes.chat.check_output_safety") as mock_output_safety, \
              patch("routes.chat.invoke_llm") as mock_llm, \
-             patch("routes.chat.generate_all_step_images") as mock_images:
+             patch("routes.chat.generate_all_step_images_async", new_callable=AsyncMock) as mock_images:
 
             mock_safety.return_value = (True, "Test query", None)
             mock_llm.return_value = "Unsafe response"
@@ -421,7 +708,7 @@ class TestChatStepImagePersistence:
              patch("routes.chat.invoke_llm") as mock_llm, \
              patch("routes.chat.should_generate_images") as mock_should, \
              patch("routes.chat.extract_treatment_steps") as mock_steps, \
-             patch("routes.chat.generate_all_step_images") as mock_images, \
+             patch("routes.chat.generate_all_step_images_async", new_callable=AsyncMock) as mock_images, \
              patch("dependencies.get_user_info") as mock_auth, \
              patch("routes.chat.save_chat") as mock_save, \
              patch("routes.chat.extract_facts_from_chat") as mock_extract_facts, \
@@ -455,6 +742,53 @@ class TestChatStepImagePersistence:
             assert saved_steps[0]["image_failed"] is True
             assert saved_steps[0]["fallback_text"]["action"] == "A"
 
+    def test_chat_drops_inline_image_when_uploaded(self):
+        from api_server import app
+
+        step_data = {
+            "step_number": "1",
+            "title": "Step 1",
+            "description": "Do this",
+            "image_prompt": "prompt",
+            "image": "aW1hZ2U=",
+            "image_url": "https://bucket/steps/abc/step_1.png",
+            "s3_key": "steps/abc/step_1.png",
+            "image_failed": False,
+            "fallback_text": None,
+            "is_composite": False,
+            "panel_index": None
+        }
+
+        with patch("routes.chat.invoke_llm", return_value="Answer"), \
+             patch("routes.chat.should_generate_images", return_value=True), \
+             patch("routes.chat.extract_treatment_steps") as mock_steps, \
+             patch("routes.chat.generate_all_step_images_async", new_callable=AsyncMock) as mock_images, \
+             patch("dependencies.get_user_info") as mock_auth, \
+             patch("routes.chat.save_chat") as mock_save, \
+             patch("routes.chat.extract_facts_from_chat", return_value=[]), \
+             patch("routes.chat.get_context_summary", return_value=""):
+
+            mock_steps.return_value = [{"step_number": "1", "title": "Step 1", "description": "Do this"}]
+            mock_images.return_value = [step_data]
+            mock_auth.return_value = {"user_id": "user-123", "email": "test@test.com"}
+
+            client = TestClient(app)
+            response = client.post(
+                "/chat",
+                json={"query": "Test query", "generate_images": True},
+                headers={"Authorization": "Bearer valid-token"}
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["step_images"][0]["image"] is None
+            assert data["step_images"][0]["image_url"] == step_data["image_url"]
+            assert data["image"] == step_data["image_url"]
+
+            _, kwargs = mock_save.call_args
+            assert "image" not in kwargs["step_images"][0]
+            assert kwargs["images"] == [step_data["image_url"]]
+
 
 class TestDeleteChatEndpoint:
     """Tests for DELETE /history/{chat_id} endpoint."""
@@ -37,6 +37,24 @@ class TestGetDynamoDBResource:
         assert mock_boto3.resource.call_count == 1
 
 
+class TestGetDynamoDBClient:
+    """Test low-level DynamoDB client singleton."""
+
+    @patch("aws_clients.boto3")
+    def test_singleton_returns_same_instance(self, mock_boto3):
+        import aws_clients
+
+        mock_client = MagicMock()
+        mock_boto3.client.return_value = mock_client
+
+        with patch.object(aws_clients, "_dynamodb_client", None):
+            c1 = aws_clients.get_dynamodb_client()
+            c2 = aws_clients.get_dynamodb_client()
+
+        assert c1 is c2 is mock_client
+        mock_boto3.client.assert_called_once_with("dynamodb", config=aws_clients._dynamodb_config)
+
+
 class TestGetS3Client:
     """Test S3 client singleton."""
 
@@ -93,4 +111,14 @@ class TestConnectionPoolConfig:
 
     def test_boto_config_has_pool_connections(self):
         import aws_clients
-        assert aws_clients._boto_config.max_pool_connections == 25
+        assert aws_clients._boto_config.max_pool_connections == 32
+
+    def test_dynamodb_config_fails_fast_and_retries(self):
+        import aws_clients
+        config = aws_clients._dynamodb_config
+        assert config.connect_timeout == 1
+        assert config.read_timeout == 3
+        assert config.retries == {"max_attempts": 5, "mode": "adaptive"}
+        # Pooling and keep-alive are inherited from the shared config
+        assert config.tcp_keepalive is True
+        assert config.max_pool_connections == aws_clients._boto_config.max_pool_connections
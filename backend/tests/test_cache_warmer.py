@@ -0,0 +1,49 @@
+"""
+Tests for cache_warmer.py — batched writes of pre-generated responses.
+"""
+
+import pytest
+from unittest.mock import patch
+
+import cache_warmer
+
+
+@pytest.fixture
+def warm_env():
+    with patch("cache_warmer.time.sleep"), \
+         patch("response_cache.get_cached_response", return_value=None), \
+         patch("gemini_client.invoke_llm", side_effect=lambda q, **kw: f"answer to {q}"), \
+         patch("gemini_client.detect_medical_topic", return_value="burn"), \
+         patch("response_cache.cache_responses_batch", side_effect=lambda entries, **kw: len(entries)) as batch:
+        yield batch
+
+
+class TestWarmCache:
+    """Test flushing and failure accounting in warm_cache."""
+
+    def test_flushes_every_batch_size(self, warm_env):
+        queries = [f"q{i}" for i in range(cache_warmer.FLUSH_EVERY + 3)]
+
+        results = cache_warmer.warm_cache(queries)
+
+        sizes = [len(c[0][0]) for c in warm_env.call_args_list]
+        assert sizes == [cache_warmer.FLUSH_EVERY, 3]
+        assert results["warmed"] == len(queries)
+        assert results["failed"] == 0
+
+    def test_failed_batch_only_fails_its_entries(self, warm_env):
+        warm_env.side_effect = [0, 3]
+        queries = [f"q{i}" for i in range(cache_warmer.FLUSH_EVERY + 3)]
+
+        results = cache_warmer.warm_cache(queries)
+
+        assert results["warmed"] == 3
+        assert results["failed"] == cache_warmer.FLUSH_EVERY
+
+    def test_pending_entries_saved_when_warming_stops(self, warm_env):
+        with patch("cache_warmer.time.sleep", side_effect=[None, KeyboardInterrupt]):
+            with pytest.raises(KeyboardInterrupt):
+                cache_warmer.warm_cache(["q1", "q2", "q3"])
+
+        warm_env.assert_called_once()
+        assert [e["query"] for e in warm_env.call_args[0][0]] == ["q1", "q2"]
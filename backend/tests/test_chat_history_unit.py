@@ -69,7 +69,7 @@ class TestSaveChat:
             assert "chat_id" in item
             assert "timestamp" in item
             assert "ttl" in item
-            assert "created_at" in item
+            assert "created_at" not in item
 
     def test_save_chat_uses_provided_chat_id(self):
         """Test that save_chat uses provided chat_id if given."""
@@ -406,6 +406,24 @@ class TestGetChatSummary:
 
         assert len(result["query"]) == 100
 
+    def test_get_chat_summary_derives_created_at_from_timestamp(self):
+        """Test that created_at is derived when the item does not store it."""
+        import chat_history
+
+        chat = {"chat_id": "chat-123", "query": "Q", "timestamp": 1704067200000}
+
+        result = chat_history.get_chat_summary(chat)
+
+        assert result["created_at"] == "2024-01-01T00:00:00+00:00"
+
+    def test_get_chat_summary_keeps_stored_created_at(self):
+        """Test that legacy items with created_at keep their stored value."""
+        import chat_history
+
+        chat = {"timestamp": 1704067200000, "created_at": "2023-12-31T23:00:00"}
+
+        assert chat_history.get_chat_summary(chat)["created_at"] == "2023-12-31T23:00:00"
+
     def test_get_chat_summary_handles_missing_fields(self):
         """Test that missing fields are handled with defaults."""
         import chat_history
@@ -445,14 +463,14 @@ class TestDeleteS3Images:
             # Use s3:// format which has simpler parsing logic
             images = ["s3://medibot-images-test/images/test.png"]
 
-            # Patch the boto3 module imported in chat_history
-            with patch("chat_history.boto3") as mock_boto3:
-                mock_boto3.client.return_value = mock_s3
+            # Patch the shared S3 client used by chat_history
+            with patch("chat_history._get_s3_client") as mock_get_s3:
+                mock_get_s3.return_value = mock_s3
 
                 result = chat_history._delete_s3_images(images)
 
-                # Verify client was created
-                mock_boto3.client.assert_called()
+                # Verify shared client was used
+                mock_get_s3.assert_called()
 
                 # Verify delete was called
                 mock_s3.delete_object.assert_called_once()
@@ -4,6 +4,8 @@ import os
 import pytest
 from unittest.mock import MagicMock, patch
 
+from botocore.exceptions import ClientError
+
 # Add backend to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -30,6 +32,14 @@ def mock_dynamodb_table():
         yield mock_table
 
 
+@pytest.fixture
+def mock_dynamodb_client():
+    with patch("health_profile.get_client") as mock_get_client:
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        yield mock_client
+
+
 def test_get_context_summary_empty(mock_dynamodb_table):
     """Test context summary generation with empty profile."""
     # Setup mock to return None (no profile)
@@ -61,33 +71,33 @@ def test_get_context_summary_full_profile(mock_dynamodb_table):
     assert "=== USER HEALTH CONTEXT ===" in summary
 
 
-def test_add_condition_new(mock_dynamodb_table):
+def test_add_condition_new(mock_dynamodb_client):
     """Test adding a new condition."""
-    # Mock existing profile with no conditions
-    mock_dynamodb_table.get_item.return_value = {"Item": {"conditions": []}}
-
     success = add_condition("user123", "Asthma")
 
     assert success is True
     # Verify update_item was called
-    mock_dynamodb_table.update_item.assert_called_once()
-    call_args = mock_dynamodb_table.update_item.call_args[1]
+    mock_dynamodb_client.update_item.assert_called_once()
+    call_args = mock_dynamodb_client.update_item.call_args[1]
     assert "list_append" in call_args["UpdateExpression"]
-    assert call_args["ExpressionAttributeValues"][":new"][0]["name"] == "Asthma"
+    assert call_args["ExpressionAttributeValues"][":new"]["L"][0]["M"]["name"] == {"S": "Asthma"}
 
 
-def test_add_condition_duplicate(mock_dynamodb_table):
+def test_add_condition_duplicate(mock_dynamodb_table, mock_dynamodb_client):
     """Test adding a duplicate condition (should be ignored)."""
-    # Mock existing profile WITH Asthma
-    mock_dynamodb_table.get_item.return_value = {
-        "Item": {"conditions": [{"name": "Asthma"}]}
-    }
+    # The conditional write rejects Asthma as already present
+    mock_dynamodb_client.update_item.side_effect = ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException", "Message": "The conditional request failed"}},
+        "UpdateItem"
+    )
 
     success = add_condition("user123", "asthma")  # Lowercase check
 
     assert success is True
-    # Verify update_item was NOT called
-    mock_dynamodb_table.update_item.assert_not_called()
+    # Verify the duplicate was checked by the write itself, without a read
+    mock_dynamodb_table.get_item.assert_not_called()
+    call_args = mock_dynamodb_client.update_item.call_args[1]
+    assert call_args["ExpressionAttributeValues"][":key"] == {"S": "asthma"}
 
 
 # ==========================================
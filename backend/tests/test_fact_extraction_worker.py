@@ -0,0 +1,55 @@
+"""
+Tests for fact_extraction_worker.py - SQS consumer for chat fact extraction.
+"""
+
+import json
+from unittest.mock import patch
+
+
+class TestHandler:
+    """Tests for the worker handler."""
+
+    def test_processes_each_record(self):
+        import fact_extraction_worker
+
+        event = {"Records": [
+            {"messageId": "m1", "body": json.dumps({"user_id": "u1", "user_message": "I have asthma"})},
+            {"messageId": "m2", "body": json.dumps({"user_id": "u2", "user_message": "I take metformin"})},
+        ]}
+
+        with patch.object(fact_extraction_worker, "extract_facts_from_chat_or_raise", return_value=[]) as mock_extract:
+            result = fact_extraction_worker.handler(event, None)
+
+        assert result == {"batchItemFailures": []}
+        mock_extract.assert_any_call("u1", "I have asthma", "")
+        mock_extract.assert_any_call("u2", "I take metformin", "")
+
+    def test_malformed_record_is_dropped(self):
+        import fact_extraction_worker
+
+        event = {"Records": [
+            {"messageId": "bad", "body": "not json"},
+            {"messageId": "partial", "body": json.dumps({"user_id": "u1"})},
+        ]}
+
+        with patch.object(fact_extraction_worker, "extract_facts_from_chat_or_raise") as mock_extract:
+            result = fact_extraction_worker.handler(event, None)
+
+        assert result == {"batchItemFailures": []}
+        mock_extract.assert_not_called()
+
+    def test_failed_extraction_is_retried(self):
+        import fact_extraction_worker
+
+        event = {"Records": [
+            {"messageId": "m1", "body": json.dumps({"user_id": "u1", "user_message": "I have asthma"})},
+            {"messageId": "m2", "body": json.dumps({"user_id": "u2", "user_message": "I take metformin"})},
+        ]}
+
+        with patch.object(
+            fact_extraction_worker, "extract_facts_from_chat_or_raise",
+            side_effect=[RuntimeError("Gemini unavailable"), ["Noted medication: metformin"]]
+        ):
+            result = fact_extraction_worker.handler(event, None)
+
+        assert result == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
@@ -0,0 +1,483 @@
+"""
+Unit tests for gemini_client.py helpers (response parsing, topic detection).
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+
+SAMPLE_RESPONSE = (
+    "**Understanding Your Situation**\n"
+    "Minor burns can be treated at home.\n\n"
+    "**Step 1: Cool the burn**\n"
+    "Run cool water over the burn for 10 minutes.\n\n"
+    "**Step 2: [Cover the area]**\n"
+    "Use a sterile, non-stick bandage.\n\n"
+    "**⚠️ Warnings**\n"
+    "Do not apply ice.\n"
+)
+
+
+class TestGeminiHttpOptions:
+    """Test the pooled HTTP client configuration for Gemini calls."""
+
+    def test_client_uses_pooled_keepalive_limits(self):
+        from gemini_client import _GEMINI_HTTP_OPTIONS, GEMINI_MAX_CONNECTIONS
+        limits = _GEMINI_HTTP_OPTIONS.client_args["limits"]
+        assert limits.max_connections == GEMINI_MAX_CONNECTIONS
+        assert limits.max_keepalive_connections == GEMINI_MAX_CONNECTIONS
+
+
+class TestGetClient:
+    """Test lazy creation of the Gemini client."""
+
+    @patch("gemini_client.genai.Client")
+    def test_created_once_on_first_use(self, mock_client_cls):
+        import gemini_client
+        with patch.object(gemini_client, "client", gemini_client._CLIENT_UNSET), \
+                patch.object(gemini_client, "GOOGLE_API_KEY", "key"):
+            assert gemini_client._get_client() is mock_client_cls.return_value
+            assert gemini_client._get_client() is mock_client_cls.return_value
+        mock_client_cls.assert_called_once()
+
+    def test_no_api_key_gives_none(self):
+        import gemini_client
+        with patch.object(gemini_client, "client", gemini_client._CLIENT_UNSET), \
+                patch.object(gemini_client, "GOOGLE_API_KEY", ""):
+            assert gemini_client._get_client() is None
+
+    @patch("gemini_client.genai.Client")
+    def test_public_accessor_shares_the_client(self, mock_client_cls):
+        import gemini_client
+        with patch.object(gemini_client, "client", gemini_client._CLIENT_UNSET), \
+                patch.object(gemini_client, "GOOGLE_API_KEY", "key"):
+            assert gemini_client.get_genai_client() is gemini_client._get_client()
+        mock_client_cls.assert_called_once()
+
+
+class TestCleanLlmResponse:
+    """Test thinking-tag handling and whitespace cleanup."""
+
+    def test_strips_thinking_block(self):
+        from gemini_client import clean_llm_response
+        text = "<thinking>\nplan\n</thinking>\n\n\n\nStep 1: Rest"
+        assert clean_llm_response(text) == "Step 1: Rest"
+
+    def test_strips_multiple_blocks(self):
+        from gemini_client import clean_llm_response
+        text = "A<thinking>x</thinking>B<thinking>y</thinking>C"
+        assert clean_llm_response(text) == "ABC"
+
+    def test_unclosed_thinking_tag_is_kept(self):
+        from gemini_client import clean_llm_response
+        assert clean_llm_response("Answer <thinking>partial") == "Answer <thinking>partial"
+
+    def test_keeps_thinking_as_section(self):
+        from gemini_client import clean_llm_response
+        cleaned = clean_llm_response("<thinking>plan</thinking>Answer", keep_thinking=True)
+        assert "<thinking>" not in cleaned
+        assert "My Thinking Process:**\nplan" in cleaned
+        assert "\n\n\n" not in cleaned
+
+
+class TestBuildPrompt:
+    """Test prompt assembly from the precomputed system prompt heads."""
+
+    def test_plain_prompt(self):
+        from gemini_client import _build_prompt, _SYSTEM_PROMPT
+        assert _build_prompt("How to treat a burn?", "", False) == f"{_SYSTEM_PROMPT}\n\nUser: How to treat a burn?"
+
+    def test_context_and_thinking(self):
+        from gemini_client import _build_prompt, _SYSTEM_PROMPT, _THINKING_ADDENDUM
+        assert _build_prompt("q", "Allergic to latex", True) == (
+            f"{_SYSTEM_PROMPT}{_THINKING_ADDENDUM}\n\nUser: Context: Allergic to latex\n\nq"
+        )
+
+
+class TestResponseExtraction:
+    """Test reading text and image bytes out of SDK responses."""
+
+    def test_text_property_preferred(self):
+        from types import SimpleNamespace
+        from gemini_client import _extract_response_text
+        response = SimpleNamespace(text="Apply pressure.", parts=None)
+        assert _extract_response_text(response) == "Apply pressure."
+
+    def test_falls_back_to_first_text_part(self):
+        from types import SimpleNamespace
+        from gemini_client import _extract_response_text
+        response = SimpleNamespace(text=None, parts=[SimpleNamespace(text=""), SimpleNamespace(text="Rest.")])
+        assert _extract_response_text(response) == "Rest."
+
+    def test_first_inline_data_skips_text_parts(self):
+        from types import SimpleNamespace
+        from gemini_client import _first_inline_data
+        parts = [SimpleNamespace(inline_data=None), SimpleNamespace(inline_data=SimpleNamespace(data=b"png"))]
+        assert _first_inline_data(parts) == b"png"
+        assert _first_inline_data(None) is None
+
+
+class TestExtractTreatmentSteps:
+    """Test step extraction from LLM markdown."""
+
+    def test_extracts_numbered_steps(self):
+        from gemini_client import extract_treatment_steps
+        steps = extract_treatment_steps(SAMPLE_RESPONSE)
+        assert [s["step_number"] for s in steps] == ["1", "2"]
+        assert steps[0]["title"] == "Cool the burn"
+        assert steps[1]["title"] == "Cover the area"
+
+    def test_description_stops_at_next_section(self):
+        from gemini_client import extract_treatment_steps
+        steps = extract_treatment_steps(SAMPLE_RESPONSE)
+        assert steps[0]["description"] == "Run cool water over the burn for 10 minutes."
+        assert steps[1]["description"] == "Use a sterile, non-stick bandage."
+        assert "ice" not in steps[1]["description"]
+
+    def test_description_truncated_to_300_chars(self):
+        from gemini_client import extract_treatment_steps
+        steps = extract_treatment_steps("Step 1: Long\n" + "x" * 500)
+        assert len(steps[0]["description"]) == 300
+
+    def test_header_without_space_or_brackets(self):
+        from gemini_client import extract_treatment_steps
+        steps = extract_treatment_steps("Step3 - Elevate\nRaise the leg.")
+        assert steps[0]["step_number"] == "3"
+        assert steps[0]["description"] == "Raise the leg."
+
+    def test_asterisk_heavy_line_is_not_a_step(self):
+        from gemini_client import extract_treatment_steps
+        assert extract_treatment_steps("*" * 5000 + "Step") == []
+
+    def test_no_steps_returns_empty_list(self):
+        from gemini_client import extract_treatment_steps
+        assert extract_treatment_steps("Hello! How can I help you today?") == []
+
+
+class TestStepStreamParser:
+    """Test incremental step parsing over streamed chunks."""
+
+    def test_chunked_feed_matches_full_parse(self):
+        from gemini_client import StepStreamParser, extract_treatment_steps
+        parser = StepStreamParser()
+        steps = []
+        for i in range(0, len(SAMPLE_RESPONSE), 7):
+            steps += parser.feed(SAMPLE_RESPONSE[i:i + 7])
+        steps += parser.close()
+        assert steps == extract_treatment_steps(SAMPLE_RESPONSE)
+
+    def test_token_sized_chunks_without_newlines(self):
+        from gemini_client import StepStreamParser
+        parser = StepStreamParser()
+        for ch in "**Step 1: Cool the burn**":
+            assert parser.feed(ch) == []
+        parser.feed("\nRun cool water.")
+        steps = parser.close()
+        assert steps[0]["title"] == "Cool the burn"
+        assert steps[0]["description"] == "Run cool water."
+
+    def test_step_emitted_once_next_header_arrives(self):
+        from gemini_client import StepStreamParser
+        parser = StepStreamParser()
+        assert parser.feed("**Step 1: Cool the burn**\nRun cool water.\n") == []
+        completed = parser.feed("**Step 2: Cover**\n")
+        assert [s["step_number"] for s in completed] == ["1"]
+        assert [s["step_number"] for s in parser.close()] == ["2"]
+
+
+class TestShouldGenerateImages:
+    """Test the visual-keyword gate for step images."""
+
+    def test_matches_keyword_in_query(self):
+        from gemini_client import should_generate_images
+        assert should_generate_images("How To stop a nosebleed", "")
+
+    def test_matches_keyword_substring_in_response(self):
+        from gemini_client import should_generate_images
+        assert should_generate_images("nosebleed?", "Pinch and apply pressure; bandages help.")
+
+    def test_no_keywords(self):
+        from gemini_client import should_generate_images
+        assert not should_generate_images("hello", "Hi! Ask me anything.")
+
+
+class TestDetectMedicalTopic:
+    """Test medical topic detection."""
+
+    def test_detects_single_word_keyword(self):
+        from gemini_client import detect_medical_topic
+        assert detect_medical_topic("How do I treat a burn?") == "burn"
+
+    def test_detects_plural_keyword(self):
+        from gemini_client import detect_medical_topic
+        assert detect_medical_topic("Best care for minor cuts") == "bleeding"
+
+    def test_detects_multi_word_phrase(self):
+        from gemini_client import detect_medical_topic
+        assert detect_medical_topic("My friend can't breathe after eating") == "choking"
+
+    @pytest.mark.parametrize("query,expected", [
+        ("I fractured my wrist", "fracture"),
+        ("burning skin from stove", "burn"),
+        ("cutting finger badly", "bleeding"),
+        ("He fainted at work", "fainting"),
+        ("My wound is bleeding", "bleeding"),
+    ])
+    def test_detects_inflected_keywords(self, query, expected):
+        from gemini_client import detect_medical_topic
+        assert detect_medical_topic(query) == expected
+
+    def test_matches_from_word_start_only(self):
+        from gemini_client import detect_medical_topic
+        # "cut" inside "acute" must not trigger the bleeding topic
+        assert detect_medical_topic("What causes acute headaches?") is None
+
+    def test_returns_none_for_unknown_topic(self):
+        from gemini_client import detect_medical_topic
+        assert detect_medical_topic("Hello there") is None
+
+
+class TestGenerateAllStepImages:
+    """Test parallel step image generation."""
+
+    def setup_method(self):
+        from gemini_client import _image_cache_clear
+        _image_cache_clear()
+
+    @patch("gemini_client.IMAGES_BUCKET", "bucket")
+    @patch("gemini_client.upload_image_to_s3")
+    @patch("gemini_client.generate_image")
+    def test_deferred_uploads_are_resolved(self, mock_generate, mock_upload):
+        from gemini_client import generate_all_step_images
+        mock_generate.return_value = b"png-bytes"
+        mock_upload.side_effect = lambda data, step_number, query_hash: (
+            f"https://s3/{step_number}.png", f"steps/{query_hash}/{step_number}.png"
+        )
+        steps = [
+            {"step_number": "2", "title": "Cover", "description": "Bandage it"},
+            {"step_number": "1", "title": "Cool", "description": "Cool water"},
+        ]
+
+        results = generate_all_step_images(steps, "treat a burn", query_hash="abc123")
+
+        assert [r["step_number"] for r in results] == ["1", "2"]
+        assert results[0]["image_url"] == "https://s3/1.png"
+        assert results[0]["s3_key"] == "steps/abc123/1.png"
+        assert all("upload_future" not in r for r in results)
+
+    @patch("gemini_client.IMAGES_BUCKET", "bucket")
+    @patch("gemini_client.upload_image_to_s3")
+    @patch("gemini_client.generate_image")
+    def test_failed_upload_keeps_base64_image(self, mock_generate, mock_upload):
+        from gemini_client import generate_all_step_images
+        mock_generate.return_value = b"png-bytes"
+        mock_upload.side_effect = RuntimeError("S3 down")
+        steps = [{"step_number": "1", "title": "Cool", "description": "Cool water"}]
+
+        results = generate_all_step_images(steps, "treat a burn", query_hash="abc123")
+
+        assert results[0]["image_url"] is None
+        assert results[0]["image"]
+
+    @patch("gemini_client.IMAGES_BUCKET", "bucket")
+    @patch("gemini_client.upload_image_to_s3")
+    @patch("gemini_client.generate_image")
+    def test_upload_disabled_skips_s3(self, mock_generate, mock_upload):
+        from gemini_client import generate_all_step_images
+        mock_generate.return_value = b"png-bytes"
+        steps = [{"step_number": "1", "title": "Cool", "description": "Cool water"}]
+
+        results = generate_all_step_images(steps, "treat a burn", query_hash="abc123", upload_to_s3=False)
+
+        mock_upload.assert_not_called()
+        assert results[0]["image_url"] is None
+        assert results[0]["image"]
+
+
+class TestSortByStepNumber:
+    """Test ordering of generated step images."""
+
+    def test_malformed_step_number_does_not_abort_sort(self):
+        from gemini_client import _sort_by_step_number
+        results = [{"step_number": "10"}, {"step_number": "2"}, {"step_number": "?"}, {}]
+        _sort_by_step_number(results)
+        assert [r.get("step_number") for r in results] == ["?", None, "2", "10"]
+
+
+class TestGenerateAllStepImagesAsync:
+    """Test the event-loop variant of step image generation."""
+
+    def setup_method(self):
+        from gemini_client import _image_cache_clear
+        _image_cache_clear()
+
+    @patch("gemini_client.IMAGES_BUCKET", "bucket")
+    @patch("gemini_client.upload_image_to_s3")
+    @patch("gemini_client.generate_image")
+    def test_matches_sync_results(self, mock_generate, mock_upload):
+        import asyncio
+        from gemini_client import generate_all_step_images_async
+        mock_generate.return_value = b"png-bytes"
+        mock_upload.side_effect = lambda data, step_number, query_hash: (
+            f"https://s3/{step_number}.png", f"steps/{query_hash}/{step_number}.png"
+        )
+        steps = [
+            {"step_number": "2", "title": "Cover", "description": "Bandage it"},
+            {"step_number": "1", "title": "Cool", "description": "Cool water"},
+        ]
+
+        results = asyncio.run(generate_all_step_images_async(steps, "treat a burn", query_hash="abc123"))
+
+        assert [r["step_number"] for r in results] == ["1", "2"]
+        assert results[1]["image_url"] == "https://s3/2.png"
+        assert all("upload_future" not in r for r in results)
+
+    @patch("gemini_client.calculate_image_budget", return_value=0)
+    def test_no_budget_returns_empty(self, _mock_budget):
+        import asyncio
+        from gemini_client import generate_all_step_images_async
+        steps = [{"step_number": "1", "title": "Cool", "description": "Cool water"}]
+        assert asyncio.run(generate_all_step_images_async(steps, "treat a burn")) == []
+
+
+class TestGenerateImageCached:
+    """Test the in-memory step image cache."""
+
+    def setup_method(self):
+        from gemini_client import _image_cache_clear
+        _image_cache_clear()
+
+    @patch("gemini_client.generate_image")
+    def test_repeat_prompt_hits_cache(self, mock_generate):
+        from gemini_client import generate_image_cached
+        mock_generate.return_value = b"png-bytes"
+        assert generate_image_cached("Call 911") == b"png-bytes"
+        assert generate_image_cached("Call 911") == b"png-bytes"
+        assert mock_generate.call_count == 1
+
+    @patch("gemini_client.generate_image")
+    def test_failures_are_not_cached(self, mock_generate):
+        from gemini_client import generate_image_cached
+        mock_generate.side_effect = [None, b"png-bytes"]
+        assert generate_image_cached("Call 911") is None
+        assert generate_image_cached("Call 911") == b"png-bytes"
+
+    @patch("gemini_client.IMAGE_CACHE_MAX_BYTES", 10)
+    @patch("gemini_client.generate_image")
+    def test_evicts_oldest_when_over_byte_budget(self, mock_generate):
+        from gemini_client import generate_image_cached
+        mock_generate.side_effect = lambda prompt: prompt.encode() * 6
+        generate_image_cached("a")
+        generate_image_cached("b")  # 12 bytes total > 10, evicts "a"
+        generate_image_cached("b")
+        generate_image_cached("a")
+        assert [c[0][0] for c in mock_generate.call_args_list] == ["a", "b", "a"]
+
+
+class TestStepImagePipeline:
+    """Test steps parsed while the LLM streams, with images started on finish."""
+
+    @patch("gemini_client.process_single_step_image")
+    def test_collects_steps_without_starting_images(self, mock_process):
+        import asyncio
+        from gemini_client import StepImagePipeline
+        mock_process.side_effect = lambda step, query, query_hash, defer, upload: {"step_number": step["step_number"]}
+        pipeline = StepImagePipeline("treat a burn", query_hash="abc123")
+
+        pipeline.feed("**Step 1: Cool**\nRun water.\n**Step 2: Cover**\n")
+        # Step 1 is parsed, but nothing runs until output safety has passed
+        assert [step["step_number"] for step in pipeline._steps] == ["1"]
+        mock_process.assert_not_called()
+
+        results = asyncio.run(pipeline.finish())
+        assert [r["step_number"] for r in results] == ["1", "2"]
+
+    @patch("gemini_client.prioritize_steps", side_effect=lambda steps, budget: steps[:budget])
+    @patch("gemini_client.calculate_image_budget", return_value=1)
+    @patch("gemini_client.process_single_step_image")
+    def test_applies_budget_and_prioritization(self, mock_process, mock_budget, mock_prioritize):
+        import asyncio
+        from gemini_client import StepImagePipeline
+        mock_process.side_effect = lambda step, query, query_hash, defer, upload: {"step_number": step["step_number"]}
+        pipeline = StepImagePipeline("treat a burn")
+
+        pipeline.feed(SAMPLE_RESPONSE)
+        assert len(asyncio.run(pipeline.finish(12.0))) == 1
+        steps = mock_prioritize.call_args[0][0]
+        mock_budget.assert_called_once_with(total_steps=len(steps), elapsed_seconds=12.0)
+
+
+class TestStepVisualGuidePrompt:
+    """Test the per-step image prompt template."""
+
+    def test_fills_step_fields(self):
+        from gemini_client import create_step_visual_guide_prompt
+        step = {"step_number": "3", "title": "Apply {pressure}", "description": "Press firmly " * 40}
+        prompt = create_step_visual_guide_prompt(step, "stop bleeding")
+        assert "This image explains Step 3 of a medical assistance guide." in prompt
+        assert '"Apply {pressure}: ' in prompt
+        assert "complete visual explanation of Step 3." in prompt
+        assert ("Press firmly " * 40)[:200] + '"' in prompt
+
+
+class TestComputeQueryHash:
+    """Test the S3 grouping hash for queries."""
+
+    def test_is_stable_and_twelve_hex_chars(self):
+        from gemini_client import compute_query_hash
+        h = compute_query_hash("How to treat a burn?")
+        assert h == compute_query_hash("How to treat a burn?")
+        assert len(h) == 12
+        int(h, 16)
+
+    def test_ignores_case_and_surrounding_whitespace(self):
+        from gemini_client import compute_query_hash
+        assert compute_query_hash("  How to treat a BURN? ") == compute_query_hash("how to treat a burn?")
+
+
+class TestUploadImageToS3:
+    """Test S3 upload key generation."""
+
+    @patch("gemini_client.get_s3_client")
+    def test_keys_are_unique_per_upload(self, mock_get_s3):
+        from gemini_client import upload_image_to_s3
+        mock_s3 = mock_get_s3.return_value
+        mock_s3.generate_presigned_url.return_value = "https://signed"
+
+        keys = {upload_image_to_s3(b"png", "1", "abc123")[1] for _ in range(50)}
+
+        assert len(keys) == 50
+        assert all(k.startswith("steps/abc123/step_1_") and k.endswith(".png") for k in keys)
+
+    @patch("gemini_client.IMAGES_BUCKET", "bucket")
+    @patch("gemini_client.get_s3_client")
+    def test_small_image_uses_single_put(self, mock_get_s3):
+        from gemini_client import upload_image_to_s3
+        mock_s3 = mock_get_s3.return_value
+
+        upload_image_to_s3(b"png", "1", "abc123")
+
+        mock_s3.put_object.assert_called_once()
+        mock_s3.upload_fileobj.assert_not_called()
+
+    @patch("gemini_client.IMAGES_BUCKET", "bucket")
+    @patch("gemini_client.get_s3_client")
+    def test_large_image_uses_multipart_transfer(self, mock_get_s3):
+        from gemini_client import upload_image_to_s3, _MULTIPART_THRESHOLD_BYTES
+        mock_s3 = mock_get_s3.return_value
+
+        upload_image_to_s3(b"x" * (_MULTIPART_THRESHOLD_BYTES + 1), "1", "abc123")
+
+        mock_s3.upload_fileobj.assert_called_once()
+        assert mock_s3.upload_fileobj.call_args[1]["ExtraArgs"] == {"ContentType": "image/png"}
+        mock_s3.put_object.assert_not_called()
+
+    @patch("gemini_client.get_s3_client")
+    def test_key_suffix_carries_container_tag(self, mock_get_s3):
+        from gemini_client import upload_image_to_s3, _CONTAINER_KEY_TAG
+        mock_get_s3.return_value.generate_presigned_url.return_value = "https://signed"
+
+        _, key = upload_image_to_s3(b"png", "2", "abc123")
+
+        assert key.startswith(f"steps/abc123/step_2_{_CONTAINER_KEY_TAG}")
@@ -6,6 +6,37 @@ Tests CRUD operations with mocked DynamoDB.
 
 from unittest.mock import patch, MagicMock
 
+from botocore.exceptions import ClientError
+
+
+def _client_error(code):
+    """Build a ClientError with the given DynamoDB error code."""
+    return ClientError({"Error": {"Code": code, "Message": code}}, "UpdateItem")
+
+
+def _conditional_check_failed():
+    """Build the error DynamoDB raises when a condition expression fails."""
+    return ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException", "Message": "The conditional request failed"}},
+        "UpdateItem"
+    )
+
+
+class TestGetTable:
+    """Tests for the cached table resource."""
+
+    def test_get_table_builds_table_once(self):
+        """Test that the Table object is reused across calls."""
+        import health_profile
+
+        with patch.object(health_profile, "_table", None), \
+                patch.object(health_profile, "get_dynamodb_table") as mock_get_dynamodb_table:
+            first = health_profile.get_table()
+            second = health_profile.get_table()
+
+            assert first is second
+            mock_get_dynamodb_table.assert_called_once_with(health_profile.HEALTH_PROFILE_TABLE)
+
 
 class TestGetHealthProfile:
     """Tests for get_health_profile function."""
@@ -44,6 +75,22 @@ class TestGetHealthProfile:
 
             assert result is None
 
+    def test_get_health_profile_passes_projection(self):
+        """Test that a projection is forwarded as ProjectionExpression."""
+        import health_profile
+
+        mock_table = MagicMock()
+        mock_table.get_item.return_value = {"Item": {"conditions": []}}
+
+        with patch.object(health_profile, "get_table") as mock_get_table:
+            mock_get_table.return_value = mock_table
+
+            health_profile.get_health_profile("user-123", projection="conditions, age")
+
+            mock_table.get_item.assert_called_once_with(
+                Key={"user_id": "user-123"}, ProjectionExpression="conditions, age"
+            )
+
     def test_get_health_profile_handles_error(self):
         """Test that errors are handled gracefully."""
         import health_profile
@@ -83,6 +130,20 @@ class TestCreateHealthProfile:
             assert "created_at" in item
             assert "last_updated" in item
 
+    def test_create_health_profile_uses_one_utc_timestamp(self):
+        """Test that created_at and last_updated share one UTC timestamp."""
+        import health_profile
+
+        mock_table = MagicMock()
+
+        with patch.object(health_profile, "get_table") as mock_get_table:
+            mock_get_table.return_value = mock_table
+
+            profile = health_profile.create_health_profile("user-123")
+
+            assert profile["created_at"] == profile["last_updated"]
+            assert profile["created_at"].endswith("+00:00")
+
     def test_create_health_profile_returns_profile_on_error(self):
         """Test that profile is returned even on DynamoDB error."""
         import health_profile
@@ -133,30 +194,37 @@ class TestAddCondition:
     """Tests for add_condition function."""
 
     def test_add_condition_adds_new_condition(self):
-        """Test that new condition is added."""
+        """Test that new condition is added with a single conditional update."""
         import health_profile
 
-        mock_table = MagicMock()
+        mock_client = MagicMock()
 
-        with patch.object(health_profile, "get_or_create_profile") as mock_get:
-            mock_get.return_value = {"user_id": "user-123", "conditions": []}
-            with patch.object(health_profile, "get_table") as mock_get_table:
-                mock_get_table.return_value = mock_table
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
 
-                result = health_profile.add_condition("user-123", "Diabetes")
+            result = health_profile.add_condition("user-123", "Diabetes")
 
-                assert result is True
-                mock_table.update_item.assert_called_once()
+            assert result is True
+            mock_client.get_item.assert_not_called()
+            mock_client.put_item.assert_not_called()
+            mock_client.update_item.assert_called_once()
+            call_args = mock_client.update_item.call_args[1]
+            assert "created_at = if_not_exists(created_at, :now)" in call_args["UpdateExpression"]
+            assert call_args["ConditionExpression"] == (
+                "attribute_not_exists(condition_keys) OR NOT contains(condition_keys, :key)"
+            )
+            assert call_args["ExpressionAttributeValues"][":key"] == {"S": "diabetes"}
+            assert call_args["ExpressionAttributeValues"][":keyset"] == {"SS": ["diabetes"]}
 
     def test_add_condition_skips_duplicate(self):
-        """Test that duplicate conditions are not added."""
+        """Test that a failed duplicate check is treated as success."""
         import health_profile
 
-        with patch.object(health_profile, "get_or_create_profile") as mock_get:
-            mock_get.return_value = {
-                "user_id": "user-123",
-                "conditions": [{"name": "Diabetes"}]
-            }
+        mock_client = MagicMock()
+        mock_client.update_item.side_effect = _conditional_check_failed()
+
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
 
             result = health_profile.add_condition("user-123", "diabetes")  # Case-insensitive
 
@@ -166,17 +234,15 @@ class TestAddCondition:
         """Test that errors return False."""
         import health_profile
 
-        mock_table = MagicMock()
-        mock_table.update_item.side_effect = Exception("DynamoDB error")
+        mock_client = MagicMock()
+        mock_client.update_item.side_effect = Exception("DynamoDB error")
 
-        with patch.object(health_profile, "get_or_create_profile") as mock_get:
-            mock_get.return_value = {"user_id": "user-123", "conditions": []}
-            with patch.object(health_profile, "get_table") as mock_get_table:
-                mock_get_table.return_value = mock_table
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
 
-                result = health_profile.add_condition("user-123", "Diabetes")
+            result = health_profile.add_condition("user-123", "Diabetes")
 
-                assert result is False
+            assert result is False
 
 
 class TestAddMedication:
@@ -186,34 +252,49 @@ class TestAddMedication:
         """Test that medication with dosage is added."""
         import health_profile
 
-        mock_table = MagicMock()
+        mock_client = MagicMock()
 
-        with patch.object(health_profile, "get_or_create_profile") as mock_get:
-            mock_get.return_value = {"user_id": "user-123", "medications": []}
-            with patch.object(health_profile, "get_table") as mock_get_table:
-                mock_get_table.return_value = mock_table
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
 
-                result = health_profile.add_medication("user-123", "Metformin", "500mg")
+            result = health_profile.add_medication("user-123", "Metformin", "500mg")
 
-                assert result is True
-                call_args = mock_table.update_item.call_args[1]
-                new_med = call_args["ExpressionAttributeValues"][":new"][0]
-                assert new_med["name"] == "Metformin"
-                assert new_med["dosage"] == "500mg"
+            assert result is True
+            call_args = mock_client.update_item.call_args[1]
+            new_med = call_args["ExpressionAttributeValues"][":new"]["L"][0]["M"]
+            assert new_med["name"] == {"S": "Metformin"}
+            assert new_med["dosage"] == {"S": "500mg"}
 
     def test_add_medication_skips_duplicate(self):
         """Test that duplicate medications are not added."""
         import health_profile
 
-        with patch.object(health_profile, "get_or_create_profile") as mock_get:
-            mock_get.return_value = {
-                "user_id": "user-123",
-                "medications": [{"name": "Metformin", "dosage": "500mg"}]
-            }
+        mock_client = MagicMock()
+        mock_client.update_item.side_effect = _conditional_check_failed()
+
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
 
             result = health_profile.add_medication("user-123", "METFORMIN")
 
             assert result is True
+            call_args = mock_client.update_item.call_args[1]
+            assert call_args["ExpressionAttributeValues"][":key"] == {"S": "metformin"}
+
+    def test_add_medication_serializes_non_string_fields(self):
+        """Test that non-string entry fields fall back to the TypeSerializer."""
+        import health_profile
+
+        mock_client = MagicMock()
+
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
+
+            health_profile.add_medication("user-123", "Metformin", None)
+
+            call_args = mock_client.update_item.call_args[1]
+            new_med = call_args["ExpressionAttributeValues"][":new"]["L"][0]["M"]
+            assert new_med["dosage"] == {"NULL": True}
 
 
 class TestAddAllergy:
@@ -223,32 +304,201 @@ class TestAddAllergy:
         """Test that new allergy is added."""
         import health_profile
 
-        mock_table = MagicMock()
+        mock_client = MagicMock()
 
-        with patch.object(health_profile, "get_or_create_profile") as mock_get:
-            mock_get.return_value = {"user_id": "user-123", "allergies": []}
-            with patch.object(health_profile, "get_table") as mock_get_table:
-                mock_get_table.return_value = mock_table
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
 
-                result = health_profile.add_allergy("user-123", "Penicillin")
+            result = health_profile.add_allergy("user-123", "Penicillin")
 
-                assert result is True
+            assert result is True
+            mock_client.update_item.assert_called_once()
 
     def test_add_allergy_skips_duplicate(self):
         """Test that duplicate allergies are not added."""
         import health_profile
 
-        with patch.object(health_profile, "get_or_create_profile") as mock_get:
-            mock_get.return_value = {
-                "user_id": "user-123",
-                "allergies": [{"name": "Penicillin"}]
-            }
+        mock_client = MagicMock()
+        mock_client.update_item.side_effect = _conditional_check_failed()
+
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
 
             result = health_profile.add_allergy("user-123", "penicillin")
 
             assert result is True
 
 
+class TestWriteBackoff:
+    """Tests for retrying profile writes on transient errors."""
+
+    def test_throttled_write_is_retried(self):
+        """Test that a throttled write is retried and then succeeds."""
+        import health_profile
+
+        mock_client = MagicMock()
+        mock_client.update_item.side_effect = [_client_error("ProvisionedThroughputExceededException"), {}]
+
+        with patch.object(health_profile, "get_client") as mock_get_client, \
+                patch.object(health_profile.time, "sleep") as mock_sleep:
+            mock_get_client.return_value = mock_client
+
+            result = health_profile.add_condition("user-123", "Diabetes")
+
+            assert result is True
+            assert mock_client.update_item.call_count == 2
+            mock_sleep.assert_called_once()
+
+    def test_retries_are_bounded(self):
+        """Test that persistent throttling gives up after WRITE_MAX_ATTEMPTS."""
+        import health_profile
+
+        mock_client = MagicMock()
+        mock_client.update_item.side_effect = _client_error("ThrottlingException")
+
+        with patch.object(health_profile, "get_client") as mock_get_client, \
+                patch.object(health_profile.time, "sleep"):
+            mock_get_client.return_value = mock_client
+
+            result = health_profile.add_condition("user-123", "Diabetes")
+
+            assert result is False
+            assert mock_client.update_item.call_count == health_profile.WRITE_MAX_ATTEMPTS
+
+    def test_non_retryable_error_is_not_retried(self):
+        """Test that validation errors fail on the first attempt."""
+        import health_profile
+
+        mock_client = MagicMock()
+        mock_client.update_item.side_effect = _client_error("ValidationException")
+
+        with patch.object(health_profile, "get_client") as mock_get_client, \
+                patch.object(health_profile.time, "sleep") as mock_sleep:
+            mock_get_client.return_value = mock_client
+
+            result = health_profile.add_condition("user-123", "Diabetes")
+
+            assert result is False
+            assert mock_client.update_item.call_count == 1
+            mock_sleep.assert_not_called()
+
+
+class TestBulkAdd:
+    """Tests for bulk_add function."""
+
+    def test_bulk_add_fuses_all_lists_into_one_update(self):
+        """Test that every list is appended by a single UpdateItem."""
+        import health_profile
+
+        mock_client = MagicMock()
+
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
+
+            result = health_profile.bulk_add(
+                "user-123",
+                conditions=["Diabetes", "diabetes", "Asthma"],
+                medications=[{"name": "Metformin", "dosage": "500mg"}, "Aspirin"],
+                allergies=["Penicillin"],
+                key_facts=["Vegetarian diet"]
+            )
+
+            assert result is True
+            mock_client.update_item.assert_called_once()
+            call_args = mock_client.update_item.call_args[1]
+            expression = call_args["UpdateExpression"]
+            for attr in ("conditions", "medications", "allergies", "key_facts"):
+                assert f"{attr} = list_append(if_not_exists({attr}, :empty)" in expression
+            values = call_args["ExpressionAttributeValues"]
+            assert [c["M"]["name"]["S"] for c in values[":new0"]["L"]] == ["Diabetes", "Asthma"]
+            assert values[":new1"]["L"][0]["M"]["dosage"] == {"S": "500mg"}
+            assert set(values[":keyset1"]["SS"]) == {"metformin", "aspirin"}
+
+    def test_bulk_add_retries_without_existing_entries(self):
+        """Test that entries already in the profile are dropped on retry."""
+        import health_profile
+
+        conflict = _conditional_check_failed()
+        conflict.response["Item"] = {"condition_keys": {"SS": ["diabetes"]}}
+        mock_client = MagicMock()
+        mock_client.update_item.side_effect = [conflict, {}]
+
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
+
+            result = health_profile.bulk_add("user-123", conditions=["Diabetes", "Asthma"])
+
+            assert result is True
+            assert mock_client.update_item.call_count == 2
+            retry_values = mock_client.update_item.call_args[1]["ExpressionAttributeValues"]
+            assert [c["M"]["name"]["S"] for c in retry_values[":new0"]["L"]] == ["Asthma"]
+
+    def test_bulk_add_skips_write_when_nothing_to_add(self):
+        """Test that an empty batch makes no DynamoDB call."""
+        import health_profile
+
+        mock_client = MagicMock()
+
+        with patch.object(health_profile, "get_client") as mock_get_client:
+            mock_get_client.return_value = mock_client
+
+            assert health_profile.bulk_add("user-123", conditions=[""]) is True
+            mock_client.update_item.assert_not_called()
+
+
+class TestUpdateBasicInfo:
+    """Tests for update_basic_info function."""
+
+    def test_update_basic_info_uses_single_update(self):
+        """Test that basic info is written without a prior read."""
+        import health_profile
+
+        mock_table = MagicMock()
+        mock_table.update_item.return_value = {"Attributes": {}}
+
+        with patch.object(health_profile, "get_table") as mock_get_table:
+            mock_get_table.return_value = mock_table
+
+            result = health_profile.update_basic_info("user-123", age=42, gender="Female")
+
+            assert result is True
+            mock_table.get_item.assert_not_called()
+            call_args = mock_table.update_item.call_args_list[0][1]
+            assert "age = :age" in call_args["UpdateExpression"]
+            assert "created_at = if_not_exists(created_at, :now)" in call_args["UpdateExpression"]
+            assert call_args["ExpressionAttributeValues"][":age"] == 42
+
+    def test_update_basic_info_only_stamps_context(self):
+        """Test that an age/gender change bumps the context version in the one write."""
+        import health_profile
+
+        mock_table = MagicMock()
+
+        with patch.object(health_profile, "get_table") as mock_get_table:
+            mock_get_table.return_value = mock_table
+
+            health_profile.update_basic_info("user-123", age=42)
+
+            mock_table.update_item.assert_called_once()
+            call_args = mock_table.update_item.call_args[1]
+            assert "context_updated_at = :now" in call_args["UpdateExpression"]
+            assert call_args["ReturnValues"] == "NONE"
+
+    def test_blood_type_only_update_skips_context(self):
+        """Test that fields outside the context block don't re-render it."""
+        import health_profile
+
+        mock_table = MagicMock()
+
+        with patch.object(health_profile, "get_table") as mock_get_table:
+            mock_get_table.return_value = mock_table
+
+            health_profile.update_basic_info("user-123", blood_type="O+")
+
+            mock_table.update_item.assert_called_once()
+            assert mock_table.update_item.call_args[1]["ReturnValues"] == "NONE"
+
+
 class TestGetContextSummary:
     """Tests for get_context_summary function."""
 
@@ -315,6 +565,33 @@ class TestGetContextSummary:
             assert "Penicillin" in result
             assert "allergies" in result
 
+    def test_get_context_summary_formats_full_block(self):
+        """Test the exact context block, including legacy bare-string entries."""
+        import health_profile
+
+        with patch.object(health_profile, "get_health_profile") as mock_get:
+            mock_get.return_value = {
+                "user_id": "user-123",
+                "conditions": [{"name": "Diabetes"}, "Asthma"],
+                "medications": [{"name": "Metformin", "dosage": "500mg"}, {"name": "Aspirin", "dosage": ""}],
+                "allergies": ["Peanuts"],
+                "age": 30,
+                "gender": "Female",
+                "key_facts": [{"text": "Vegetarian diet"}, "Runs daily"]
+            }
+
+            result = health_profile.get_context_summary("user-123")
+
+            assert result == (
+                "\n=== USER HEALTH CONTEXT ===\n"
+                "• Medical conditions: Diabetes, Asthma\n"
+                "• Current medications: Metformin 500mg, Aspirin\n"
+                "• Known allergies: Peanuts\n"
+                "• Age: 30, Gender: Female\n"
+                "• Other relevant information: Vegetarian diet; Runs daily\n"
+                "===========================\n"
+            )
+
     def test_get_context_summary_returns_empty_for_empty_profile(self):
         """Test that empty string is returned for profile with no data."""
         import health_profile
@@ -332,6 +609,137 @@ class TestGetContextSummary:
             assert result == ""
 
 
+class TestContextSummaryCache:
+    """Tests for the per-container context summary cache."""
+
+    def setup_method(self):
+        import health_profile
+        health_profile._context_cache_clear()
+
+    def teardown_method(self):
+        import health_profile
+        health_profile._context_cache_clear()
+
+    def _profile(self, last_updated):
+        return {
+            "user_id": "user-123",
+            "conditions": [{"name": "Diabetes"}],
+            "last_updated": last_updated
+        }
+
+    def test_unchanged_profile_is_served_from_cache(self):
+        """Test that only the version stamp is read when last_updated matches."""
+        import health_profile
+
+        with patch.object(health_profile, "get_health_profile") as mock_get:
+            mock_get.side_effect = [
+                {"user_id": "user-123", "last_updated": "t1"},
+                self._profile("t1"),
+                {"user_id": "user-123", "last_updated": "t1"},
+            ]
+
+            first = health_profile.get_context_summary("user-123")
+            second = health_profile.get_context_summary("user-123")
+
+            assert first == second
+            assert "Diabetes" in second
+            assert mock_get.call_count == 3
+            assert mock_get.call_args[1]["projection"] == health_profile._MATERIALIZED_PROJECTION
+
+    def test_fresh_materialized_context_is_returned_directly(self):
+        """Test that a block stored for the current context version needs no further read."""
+        import health_profile
+
+        with patch.object(health_profile, "get_health_profile") as mock_get:
+            mock_get.return_value = {
+                "user_id": "user-123",
+                "last_updated": "t2",
+                "context_updated_at": "t1",
+                "context_summary_at": "t1",
+                "context_summary_cached": "stored block"
+            }
+
+            result = health_profile.get_context_summary("user-123")
+
+            assert result == "stored block"
+            mock_get.assert_called_once()
+
+    def test_stale_materialized_context_is_rendered(self):
+        """Test that a block from an older context version is ignored."""
+        import health_profile
+
+        with patch.object(health_profile, "get_health_profile") as mock_get:
+            mock_get.side_effect = [
+                {
+                    "user_id": "user-123",
+                    "last_updated": "t2",
+                    "context_updated_at": "t2",
+                    "context_summary_at": "t1",
+                    "context_summary_cached": "old block"
+                },
+                self._profile("t2"),
+            ]
+
+            result = health_profile.get_context_summary("user-123")
+
+            assert "Diabetes" in result
+
+    def test_rendered_context_is_stored_for_its_version(self):
+        """Test that a render stores the block, guarded on the version it was built from."""
+        import health_profile
+
+        mock_table = MagicMock()
+        profile = {**self._profile("t2"), "context_updated_at": "t2"}
+
+        with patch.object(health_profile, "get_health_profile") as mock_get:
+            mock_get.side_effect = [
+                {"user_id": "user-123", "last_updated": "t2", "context_updated_at": "t2"},
+                profile,
+            ]
+            with patch.object(health_profile, "get_table", return_value=mock_table):
+                result = health_profile.get_context_summary("user-123")
+
+        call_args = mock_table.update_item.call_args[1]
+        assert call_args["ConditionExpression"] == "context_updated_at = :at"
+        assert call_args["ExpressionAttributeValues"] == {":ctx": result, ":at": "t2"}
+
+    def test_updated_profile_is_rendered_again(self):
+        """Test that a new last_updated invalidates the cached context."""
+        import health_profile
+
+        updated = self._profile("t2")
+        updated["conditions"].append({"name": "Asthma"})
+
+        with patch.object(health_profile, "get_health_profile") as mock_get:
+            mock_get.side_effect = [
+                {"user_id": "user-123", "last_updated": "t1"},
+                self._profile("t1"),
+                {"user_id": "user-123", "last_updated": "t2"},
+                updated,
+            ]
+
+            health_profile.get_context_summary("user-123")
+            result = health_profile.get_context_summary("user-123")
+
+            assert "Asthma" in result
+
+    def test_deleted_profile_drops_cache_entry(self):
+        """Test that a missing profile returns empty and evicts the user."""
+        import health_profile
+
+        with patch.object(health_profile, "get_health_profile") as mock_get:
+            mock_get.side_effect = [
+                {"user_id": "user-123", "last_updated": "t1"},
+                self._profile("t1"),
+                None,
+            ]
+
+            health_profile.get_context_summary("user-123")
+
+            assert health_profile.get_context_summary("user-123") == ""
+            assert "user-123" not in health_profile._context_cache
+
+
 class TestDeleteHealthProfile:
     """Tests for delete_health_profile function."""
 
@@ -347,7 +755,9 @@ class TestDeleteHealthProfile:
             result = health_profile.delete_health_profile("user-123")
 
             assert result is True
-            mock_table.delete_item.assert_called_once_with(Key={"user_id": "user-123"})
+            mock_table.delete_item.assert_called_once_with(
+                Key={"user_id": "user-123"}, ReturnValues="NONE", ReturnConsumedCapacity="NONE"
+            )
 
     def test_delete_health_profile_handles_error(self):
         """Test that errors return False."""
@@ -385,9 +795,30 @@ class TestRemoveCondition:
 
                 assert result is True
                 call_args = mock_table.update_item.call_args[1]
-                updated_conditions = call_args["ExpressionAttributeValues"][":conditions"]
-                assert len(updated_conditions) == 1
-                assert updated_conditions[0]["name"] == "Hypertension"
+                assert call_args["UpdateExpression"].startswith("REMOVE conditions[0] ")
+                assert call_args["ConditionExpression"] == "conditions[0].#n = :name0"
+                assert call_args["ExpressionAttributeValues"][":name0"] == "Diabetes"
+                assert ":ctx" not in call_args["ExpressionAttributeValues"]
+
+    def test_remove_condition_retries_after_concurrent_change(self):
+        """Test that a failed index guard re-reads the profile and retries."""
+        import health_profile
+
+        mock_table = MagicMock()
+        mock_table.update_item.side_effect = [_conditional_check_failed(), {}]
+
+        with patch.object(health_profile, "get_health_profile") as mock_get:
+            mock_get.side_effect = [
+                {"user_id": "user-123", "conditions": [{"name": "Diabetes"}]},
+                {"user_id": "user-123", "conditions": [{"name": "Asthma"}, {"name": "Diabetes"}]},
+            ]
+            with patch.object(health_profile, "get_table", return_value=mock_table):
+                result = health_profile.remove_condition("user-123", "diabetes")
+
+        assert result is True
+        assert mock_table.update_item.call_count == 2
+        call_args = mock_table.update_item.call_args[1]
+        assert call_args["UpdateExpression"].startswith("REMOVE conditions[1] ")
 
     def test_remove_condition_returns_false_when_not_found(self):
         """Test that False is returned when condition not found."""
@@ -8,14 +8,20 @@ import os
 import pytest
 import time
 import boto3
+from contextlib import contextmanager
+from unittest.mock import patch
 from decimal import Decimal
 
-# Must be set before any imports that touch boto3
-os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
-os.environ["AWS_ACCESS_KEY_ID"] = "testing"
-os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
-os.environ["AWS_SECURITY_TOKEN"] = "testing"
-os.environ["AWS_SESSION_TOKEN"] = "testing"
+# Fake credentials for moto, applied only while a fixture is active so they
+# don't leak into other test modules (where real AWS calls would then be
+# attempted and retried instead of failing fast on missing credentials)
+_MOTO_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_SECURITY_TOKEN": "testing",
+    "AWS_SESSION_TOKEN": "testing",
+}
 
 try:
     from moto import mock_aws
@@ -131,7 +137,7 @@ def dynamodb_resource():
     if not HAS_MOTO:
         pytest.skip("moto not installed")
 
-    with mock_aws():
+    with patch.dict(os.environ, _MOTO_ENV), mock_aws():
         dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
         create_chat_table(dynamodb)
         create_health_table(dynamodb)
@@ -212,6 +218,18 @@ class TestChatHistory:
 # Health Profile Tests
 # ==========================
 
+@contextmanager
+def _use_health_table(table):
+    """Point health_profile's table, low-level client and table name at moto."""
+    import health_profile
+
+    with patch.object(health_profile, "get_table", return_value=table), \
+            patch.object(health_profile, "get_client",
+                         return_value=boto3.client("dynamodb", region_name="us-east-1")), \
+            patch.object(health_profile, "HEALTH_PROFILE_TABLE", HEALTH_TABLE):
+        yield
+
+
 class TestHealthProfile:
     """Integration tests for health profile operations."""
 
@@ -255,6 +273,94 @@ class TestHealthProfile:
         result = table.get_item(Key={"user_id": "user-hp2"})
         assert "Patient has hypertension" in result["Item"]["key_facts"]
 
+    def test_add_condition_dedupes_with_single_write(self, dynamodb_resource):
+        import health_profile
+
+        table = dynamodb_resource.Table(HEALTH_TABLE)
+
+        with _use_health_table(table):
+            assert health_profile.add_condition("user-hp3", "Asthma") is True
+            assert health_profile.add_condition("user-hp3", "asthma") is True
+            assert health_profile.add_condition("user-hp3", "Diabetes") is True
+            assert health_profile.remove_condition("user-hp3", "ASTHMA") is True
+            assert health_profile.add_condition("user-hp3", "Asthma") is True
+
+        item = table.get_item(Key={"user_id": "user-hp3"})["Item"]
+        assert [c["name"] for c in item["conditions"]] == ["Diabetes", "Asthma"]
+        assert item["condition_keys"] == {"asthma", "diabetes"}
+        assert "created_at" in item
+
+    def test_bulk_add_skips_existing_entries(self, dynamodb_resource):
+        import health_profile
+
+        table = dynamodb_resource.Table(HEALTH_TABLE)
+
+        with _use_health_table(table):
+            assert health_profile.add_condition("user-hp4", "Asthma") is True
+            assert health_profile.bulk_add(
+                "user-hp4",
+                conditions=["asthma", "Diabetes"],
+                medications=[{"name": "Metformin", "dosage": "500mg"}],
+                allergies=["Penicillin"],
+            ) is True
+
+        item = table.get_item(Key={"user_id": "user-hp4"})["Item"]
+        assert [c["name"] for c in item["conditions"]] == ["Asthma", "Diabetes"]
+        assert item["medications"][0]["dosage"] == "500mg"
+        assert item["allergy_keys"] == {"penicillin"}
+
+    def test_context_summary_skips_report_summaries(self, dynamodb_resource):
+        import health_profile
+
+        table = dynamodb_resource.Table(HEALTH_TABLE)
+        table.put_item(Item={
+            "user_id": "user-hp5",
+            "conditions": [{"name": "Asthma"}],
+            "age": Decimal("40"),
+            "report_summaries": [{"summary": "x" * 1000}],
+        })
+
+        with _use_health_table(table):
+            profile = health_profile.get_health_profile(
+                "user-hp5", projection=health_profile._CONTEXT_PROJECTION
+            )
+            summary = health_profile.get_context_summary("user-hp5")
+
+        assert "report_summaries" not in profile
+        assert "Asthma" in summary
+        assert "Age: 40" in summary
+
+    def test_reads_materialize_the_context_block(self, dynamodb_resource):
+        import health_profile
+
+        table = dynamodb_resource.Table(HEALTH_TABLE)
+
+        with _use_health_table(table):
+            health_profile.add_condition("user-hp6", "Asthma")
+            health_profile.bulk_add("user-hp6", medications=[{"name": "Albuterol", "dosage": "90mcg"}])
+            health_profile.update_basic_info("user-hp6", age=35)
+            health_profile.add_report_summary("user-hp6", "Lung function normal")
+            health_profile.remove_condition("user-hp6", "asthma")
+            health_profile.add_allergy("user-hp6", "Penicillin")
+
+            item = table.get_item(Key={"user_id": "user-hp6"})["Item"]
+            assert item.get("context_summary_at") != item["context_updated_at"]
+            rendered = health_profile.get_context_summary("user-hp6")
+
+            item = table.get_item(Key={"user_id": "user-hp6"})["Item"]
+            stored = item["context_summary_cached"]
+            assert stored == rendered
+            assert item["context_summary_at"] == item["context_updated_at"]
+            assert stored == health_profile._format_context(item)
+            assert "Albuterol 90mcg" in stored
+            assert "Penicillin" in stored
+            assert "Age: 35" in stored
+            assert "Asthma" not in stored
+
+            with patch.object(health_profile, "_format_context") as mock_format:
+                assert health_profile.get_context_summary("user-hp6") == stored
+                mock_format.assert_not_called()
+
 
 # ==========================
 # Audit Log Tests (with GSI)
@@ -0,0 +1,59 @@
+"""
+Tests for lambda_handler.py — Lambda entry point.
+"""
+
+import json
+from unittest.mock import patch
+
+
+def _http_api_event(path, method="GET"):
+    return {
+        "version": "2.0",
+        "rawPath": path,
+        "requestContext": {"http": {"method": method, "path": path}},
+    }
+
+
+class TestHealthShortCircuit:
+    """Health probes are answered without going through Mangum."""
+
+    def test_health_probe_skips_mangum(self):
+        import lambda_handler
+
+        with patch.object(lambda_handler, "_mangum") as mock_mangum:
+            response = lambda_handler.handler(_http_api_event("/production/health"), None)
+
+        mock_mangum.assert_not_called()
+        assert response["statusCode"] == 200
+        body = json.loads(response["body"])
+        assert body["status"] == "healthy"
+        assert body == lambda_handler.HEALTH_STATUS.model_dump()
+
+    def test_rest_api_health_probe_skips_mangum(self):
+        import lambda_handler
+
+        event = {"path": "/health", "httpMethod": "GET"}
+        with patch.object(lambda_handler, "_mangum") as mock_mangum:
+            response = lambda_handler.handler(event, None)
+
+        mock_mangum.assert_not_called()
+        assert response["statusCode"] == 200
+
+    def test_other_requests_go_through_mangum(self):
+        import lambda_handler
+
+        event = _http_api_event("/production/chat", method="POST")
+        with patch.object(lambda_handler, "_mangum") as mock_mangum:
+            mock_mangum.return_value = {"statusCode": 200}
+            lambda_handler.handler(event, "ctx")
+
+        mock_mangum.assert_called_once_with(event, "ctx")
+
+    def test_non_get_health_request_goes_through_mangum(self):
+        import lambda_handler
+
+        event = _http_api_event("/health", method="POST")
+        with patch.object(lambda_handler, "_mangum") as mock_mangum:
+            lambda_handler.handler(event, None)
+
+        mock_mangum.assert_called_once()
@@ -3,6 +3,9 @@ Tests for model_router.py — Intelligent Model Routing.
 """
 
 import pytest
+from unittest.mock import patch
+
+import model_router
 from model_router import classify_query_complexity, get_model_for_query, FAST_MODEL, PRO_MODEL
 
 
@@ -35,10 +38,23 @@ class TestClassifyQueryComplexity:
         "What are the contraindications for taking ibuprofen during pregnancy complication?",
         "Analyze this blood test report and tell me if there are any concerns.",
         "I need a treatment plan for chronic back pain with drug interaction checks.",
+        "Should I get an MRI for my knee pain?",
     ])
     def test_complex_queries(self, query):
         assert classify_query_complexity(query) == "complex"
 
+    def test_short_query_skips_keyword_and_length_scans(self):
+        with patch.object(model_router, "_has_complex_keyword") as mock_keywords, \
+             patch.object(model_router, "_length_features") as mock_lengths:
+            assert classify_query_complexity("cancer?") == "simple"
+        mock_keywords.assert_not_called()
+        mock_lengths.assert_not_called()
+
+    def test_complex_keyword_skips_length_scan(self):
+        with patch.object(model_router, "_length_features") as mock_lengths:
+            assert classify_query_complexity("Should I get an MRI for my knee pain?") == "complex"
+        mock_lengths.assert_not_called()
+
     def test_attachments_always_complex(self):
         assert classify_query_complexity("What is this?", has_attachments=True) == "complex"
 
@@ -50,6 +66,40 @@ class TestClassifyQueryComplexity:
         assert classify_query_complexity(query) == "complex"
 
 
+class TestHasComplexKeyword:
+    """Test the keyword scan with and without the Aho-Corasick automaton."""
+
+    @pytest.mark.parametrize("use_automaton", [True, False])
+    @pytest.mark.parametrize("query,expected", [
+        ("Can you interpret my Blood Test?", True),
+        ("Is this a DRUG INTERACTION risk", True),
+        ("How much water should I drink daily", False),
+        # Substring semantics: inflected forms still count
+        ("My doctor reported something odd", True),
+        ("Can you help with the interpretation", True),
+    ])
+    def test_keyword_scan(self, use_automaton, query, expected):
+        if use_automaton and model_router.ahocorasick is None:
+            pytest.skip("pyahocorasick is not installed")
+        automaton = model_router._COMPLEX_AUTOMATON if use_automaton else None
+        with patch.object(model_router, "_COMPLEX_AUTOMATON", automaton):
+            assert model_router._has_complex_keyword(query) is expected
+
+
+class TestLengthFeatures:
+    """Test the sentence and word counts."""
+
+    @pytest.mark.parametrize("text,expected", [
+        ("", (1, 0)),
+        ("one two three", (1, 3)),
+        ("First. Second! Third?", (4, 3)),
+        ("e.g. wait... ok?!", (5, 3)),
+        ("  spaced   out  ", (1, 2)),
+    ])
+    def test_counts_match_split_semantics(self, text, expected):
+        assert model_router._length_features(text) == expected
+
+
 class TestGetModelForQuery:
     """Test model selection logic."""
 
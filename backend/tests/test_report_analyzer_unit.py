@@ -0,0 +1,476 @@
+"""
+Unit tests for report_analyzer.py - extraction cache behavior.
+"""
+
+import json
+import time
+from io import BytesIO
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_extraction_memo():
+    import report_analyzer
+    report_analyzer._extraction_memo.clear()
+    yield
+    report_analyzer._extraction_memo.clear()
+
+
+def _gemini_response(payload):
+    response = MagicMock()
+    response.text = "```json\n" + json.dumps(payload) + "\n```"
+    return response
+
+
+class TestParseLlmJson:
+    """Tests for _parse_llm_json."""
+
+    @pytest.mark.parametrize("text", [
+        '{"conditions": ["Asthma"]}',
+        '```json\n{"conditions": ["Asthma"]}\n```',
+        '```\n{"conditions": ["Asthma"]}\n```',
+        'Here is the result:\n```json\n{"conditions": ["Asthma"]}',
+        'Result: {"conditions": ["Asthma"]} Let me know if you need more.',
+        'Braces {like these} aside:\n```json\n{"conditions": ["Asthma"]}\n```',
+    ])
+    def test_extracts_object(self, text):
+        import report_analyzer
+        assert report_analyzer._parse_llm_json(text) == {"conditions": ["Asthma"]}
+
+    def test_extracts_array(self):
+        import report_analyzer
+        text = '```json\n[{"conditions": []}, {"error": "x"}]\n```'
+        assert report_analyzer._parse_llm_json(text, array=True) == [{"conditions": []}, {"error": "x"}]
+
+    def test_raises_without_json(self):
+        import report_analyzer
+        with pytest.raises(json.JSONDecodeError):
+            report_analyzer._parse_llm_json("Not a medical document")
+
+
+class TestExtractionCacheKey:
+    """Tests for extraction_cache_key."""
+
+    def test_key_is_namespaced_content_hash(self):
+        import report_analyzer
+
+        key = report_analyzer.extraction_cache_key("report", b"same bytes")
+
+        assert key.startswith("report#")
+        assert key == report_analyzer.extraction_cache_key("report", b"same bytes")
+        assert key != report_analyzer.extraction_cache_key("chat", b"same bytes")
+
+
+class TestGetCachedExtraction:
+    """Tests for get_cached_extraction."""
+
+    def test_hit_is_memoized(self):
+        import report_analyzer
+
+        mock_table = MagicMock()
+        mock_table.get_item.return_value = {"Item": {
+            "cache_key": "report#abc",
+            "extracted_json": json.dumps({"conditions": ["Asthma"]}),
+            "ttl": int(time.time()) + 60,
+        }}
+
+        with patch.object(report_analyzer, "get_dynamodb_table", return_value=mock_table):
+            first = report_analyzer.get_cached_extraction("report#abc")
+            second = report_analyzer.get_cached_extraction("report#abc")
+
+        assert first == second == {"conditions": ["Asthma"]}
+        mock_table.get_item.assert_called_once()
+
+    def test_expired_entry_is_a_miss(self):
+        import report_analyzer
+
+        mock_table = MagicMock()
+        mock_table.get_item.return_value = {"Item": {
+            "cache_key": "report#abc",
+            "extracted_json": "{}",
+            "ttl": int(time.time()) - 60,
+        }}
+
+        with patch.object(report_analyzer, "get_dynamodb_table", return_value=mock_table):
+            assert report_analyzer.get_cached_extraction("report#abc") is None
+
+    def test_lookup_error_is_a_miss(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "get_dynamodb_table", side_effect=Exception("boom")):
+            assert report_analyzer.get_cached_extraction("report#abc") is None
+
+
+class TestGetReportFromS3:
+    """Tests for get_report_from_s3."""
+
+    def test_small_report_uses_single_get(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "REPORTS_BUCKET", "reports"), \
+             patch.object(report_analyzer, "get_s3_client") as mock_get_s3:
+            mock_s3 = mock_get_s3.return_value
+            mock_s3.get_object.return_value = {"ContentLength": 8, "Body": BytesIO(b"%PDF-1.7")}
+            result = report_analyzer.get_report_from_s3("reports/a.pdf")
+
+        assert result == b"%PDF-1.7"
+        mock_s3.get_object.assert_called_once_with(Bucket="reports", Key="reports/a.pdf")
+        mock_s3.download_fileobj.assert_not_called()
+
+    def test_large_report_uses_transfer_manager(self):
+        import report_analyzer
+
+        def fake_download(bucket, key, fileobj, Config=None):
+            fileobj.write(b"%PDF-1.7 large")
+
+        body = MagicMock()
+        with patch.object(report_analyzer, "REPORTS_BUCKET", "reports"), \
+             patch.object(report_analyzer, "get_s3_client") as mock_get_s3:
+            mock_s3 = mock_get_s3.return_value
+            mock_s3.get_object.return_value = {"ContentLength": report_analyzer._REPORT_CHUNK_BYTES + 1, "Body": body}
+            mock_s3.download_fileobj.side_effect = fake_download
+            result = report_analyzer.get_report_from_s3("reports/a.pdf")
+
+        assert result == b"%PDF-1.7 large"
+        body.read.assert_not_called()
+        body.close.assert_called_once()
+        _, kwargs = mock_s3.download_fileobj.call_args
+        assert kwargs["Config"] is report_analyzer._DOWNLOAD_CONFIG
+
+    def test_download_error_returns_none(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "REPORTS_BUCKET", "reports"), \
+             patch.object(report_analyzer, "get_s3_client") as mock_get_s3:
+            mock_get_s3.return_value.get_object.side_effect = Exception("NoSuchKey")
+            assert report_analyzer.get_report_from_s3("reports/a.pdf") is None
+
+
+class TestAnalyzeReportCache:
+    """Tests for analyze_report using the extraction cache."""
+
+    def test_cache_hit_skips_gemini(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "get_report_from_s3", return_value=b"%PDF"), \
+             patch.object(report_analyzer, "get_cached_extraction", return_value={"conditions": ["Asthma"]}), \
+             patch.object(report_analyzer, "get_client") as mock_client:
+            result = report_analyzer.analyze_report("reports/a.pdf", "user-123")
+
+        assert result["success"] is True
+        assert result["extracted"]["conditions"] == ["Asthma"]
+        mock_client.assert_not_called()
+
+    def test_cache_miss_calls_gemini_and_stores_result(self):
+        import report_analyzer
+
+        mock_client = MagicMock()
+        mock_client.models.generate_content.return_value = _gemini_response({"conditions": ["Asthma"]})
+
+        with patch.object(report_analyzer, "get_report_from_s3", return_value=b"%PDF"), \
+             patch.object(report_analyzer, "get_cached_extraction", return_value=None), \
+             patch.object(report_analyzer, "cache_extraction") as mock_cache, \
+             patch.object(report_analyzer, "get_client", return_value=mock_client):
+            result = report_analyzer.analyze_report("reports/a.pdf", "user-123")
+
+        assert result["success"] is True
+        mock_cache.assert_called_once_with(
+            report_analyzer.extraction_cache_key("report", b"%PDF"), {"conditions": ["Asthma"]}
+        )
+        config = mock_client.models.generate_content.call_args[1]["config"]
+        assert config.response_mime_type == "application/json"
+        assert config.response_schema == report_analyzer.REPORT_SCHEMA
+
+    def test_null_error_field_is_not_an_error(self):
+        import report_analyzer
+
+        result = report_analyzer._analysis_result({"conditions": ["Asthma"], "error": None}, "a.pdf", "user-123")
+
+        assert result["success"] is True
+
+    def test_error_response_is_not_cached(self):
+        import report_analyzer
+
+        mock_client = MagicMock()
+        mock_client.models.generate_content.return_value = _gemini_response(
+            {"error": "Not a valid medical document"}
+        )
+
+        with patch.object(report_analyzer, "get_report_from_s3", return_value=b"%PDF"), \
+             patch.object(report_analyzer, "get_cached_extraction", return_value=None), \
+             patch.object(report_analyzer, "cache_extraction") as mock_cache, \
+             patch.object(report_analyzer, "get_client", return_value=mock_client):
+            result = report_analyzer.analyze_report("reports/a.pdf", "user-123")
+
+        assert result["success"] is False
+        mock_cache.assert_not_called()
+
+    def test_unsupported_type_is_rejected_before_lookup(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "get_report_from_s3", return_value=b"text"), \
+             patch.object(report_analyzer, "get_cached_extraction") as mock_lookup:
+            result = report_analyzer.analyze_report("reports/a.txt", "user-123")
+
+        assert result["success"] is False
+        mock_lookup.assert_not_called()
+
+
+class TestAnalyzeReportsBatch:
+    """Tests for analyze_reports_batch."""
+
+    def _fetch(self, files):
+        return lambda key: files.get(key)
+
+    def test_uncached_reports_share_one_gemini_call(self):
+        import report_analyzer
+
+        mock_client = MagicMock()
+        mock_client.models.generate_content.return_value = MagicMock(text=json.dumps([
+            {"conditions": ["Asthma"]},
+            {"error": "Not a valid medical document"},
+        ]))
+        files = {"a.pdf": b"A", "b.png": b"B"}
+
+        with patch.object(report_analyzer, "get_report_from_s3", side_effect=self._fetch(files)), \
+             patch.object(report_analyzer, "get_cached_extraction", return_value=None), \
+             patch.object(report_analyzer, "cache_extraction") as mock_cache, \
+             patch.object(report_analyzer, "get_client", return_value=mock_client):
+            results = report_analyzer.analyze_reports_batch(["a.pdf", "b.png"], "user-123")
+
+        mock_client.models.generate_content.assert_called_once()
+        contents = mock_client.models.generate_content.call_args[1]["contents"]
+        assert contents[0] == report_analyzer.EXTRACTION_PROMPT_MULTI
+        assert len(contents) == 3
+        assert results[0]["success"] is True
+        assert results[0]["extracted"]["conditions"] == ["Asthma"]
+        assert results[0]["file_key"] == "a.pdf"
+        assert results[1] == {"success": False, "error": "Not a valid medical document"}
+        mock_cache.assert_called_once_with(
+            report_analyzer.extraction_cache_key("report", b"A"), {"conditions": ["Asthma"]}
+        )
+
+    def test_cached_and_invalid_files_skip_gemini(self):
+        import report_analyzer
+
+        files = {"a.pdf": b"A", "c.txt": b"C"}
+
+        with patch.object(report_analyzer, "get_report_from_s3", side_effect=self._fetch(files)), \
+             patch.object(report_analyzer, "get_cached_extraction", return_value={"conditions": ["Asthma"]}), \
+             patch.object(report_analyzer, "get_client") as mock_client:
+            results = report_analyzer.analyze_reports_batch(["a.pdf", "missing.pdf", "c.txt"], "user-123")
+
+        mock_client.assert_not_called()
+        assert results[0]["success"] is True
+        assert results[1] == {"success": False, "error": "Failed to fetch report from storage"}
+        assert results[2] == {"success": False, "error": "Unsupported file type: txt"}
+
+    def test_mismatched_reply_falls_back_per_file(self):
+        import report_analyzer
+
+        mock_client = MagicMock()
+        mock_client.models.generate_content.return_value = MagicMock(text='[{"conditions": []}]')
+        files = {"a.pdf": b"A", "b.pdf": b"B"}
+
+        with patch.object(report_analyzer, "get_report_from_s3", side_effect=self._fetch(files)), \
+             patch.object(report_analyzer, "get_cached_extraction", return_value=None), \
+             patch.object(report_analyzer, "get_client", return_value=mock_client), \
+             patch.object(report_analyzer, "analyze_report", return_value={"success": True}) as mock_single:
+            results = report_analyzer.analyze_reports_batch(["a.pdf", "b.pdf"], "user-123")
+
+        assert results == [{"success": True}, {"success": True}]
+        assert mock_single.call_count == 2
+
+
+class TestExtractFactsFromChatCache:
+    """Tests for extract_facts_from_chat using the extraction cache."""
+
+    def test_cache_hit_skips_gemini(self):
+        import report_analyzer
+
+        cached = {"conditions": ["Diabetes"], "medications": [], "allergies": [], "key_facts": []}
+
+        with patch.object(report_analyzer, "get_cached_extraction", return_value=cached), \
+             patch.object(report_analyzer, "get_client") as mock_client, \
+             patch.object(report_analyzer, "bulk_add", return_value=True):
+            saved = report_analyzer.extract_facts_from_chat("user-123", "I have diabetes now", "")
+
+        assert saved == ["Noted: Diabetes"]
+        mock_client.assert_not_called()
+
+
+class TestExtractFactsFromChatOrRaise:
+    """Tests for the raising variant used by the queue worker."""
+
+    def test_gemini_error_is_raised(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "get_cached_extraction", return_value=None), \
+             patch.object(report_analyzer, "get_client") as mock_client:
+            mock_client.return_value.models.generate_content.side_effect = Exception("503 UNAVAILABLE")
+
+            with pytest.raises(Exception, match="503"):
+                report_analyzer.extract_facts_from_chat_or_raise("user-123", "I have diabetes now", "")
+            assert report_analyzer.extract_facts_from_chat("user-123", "I have diabetes now", "") == []
+
+    def test_failed_profile_write_is_raised(self):
+        import report_analyzer
+
+        cached = {"conditions": ["Diabetes"], "medications": [], "allergies": [], "key_facts": []}
+
+        with patch.object(report_analyzer, "get_cached_extraction", return_value=cached), \
+             patch.object(report_analyzer, "bulk_add", return_value=False):
+            with pytest.raises(RuntimeError):
+                report_analyzer.extract_facts_from_chat_or_raise("user-123", "I have diabetes now", "")
+
+    def test_unparseable_reply_is_not_retried(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "get_cached_extraction", return_value=None), \
+             patch.object(report_analyzer, "get_client") as mock_client, \
+             patch.object(report_analyzer, "bulk_add") as mock_bulk:
+            mock_client.return_value.models.generate_content.return_value.text = "no facts here"
+
+            assert report_analyzer.extract_facts_from_chat_or_raise("user-123", "I have diabetes now", "") == []
+            mock_bulk.assert_not_called()
+
+
+class TestUniqueEntries:
+    """Tests for local dedup of extracted lists."""
+
+    def test_collapses_repeats_case_insensitively(self):
+        import report_analyzer
+
+        conditions, medications, allergies, key_facts = report_analyzer._unique_entries({
+            "conditions": ["Diabetes", " diabetes ", "", None, "Asthma"],
+            "medications": [
+                {"name": "Metformin", "dosage": "500mg"},
+                {"name": "metformin ", "dosage": "1000mg"},
+                {"name": ""},
+                "Aspirin",
+            ],
+            "allergies": ["Penicillin", "PENICILLIN"],
+        })
+
+        assert conditions == ["Diabetes", "Asthma"]
+        assert medications == [{"name": "Metformin", "dosage": "500mg"}, "Aspirin"]
+        assert allergies == ["Penicillin"]
+        assert key_facts == []
+
+
+class TestConfirmAndSaveAnalysis:
+    """Tests for confirm_and_save_analysis."""
+
+    def test_saves_all_sections(self):
+        import report_analyzer
+
+        extracted = {
+            "conditions": ["Asthma", "", "asthma"],
+            "medications": [{"name": "Albuterol", "dosage": "90mcg"}],
+            "allergies": ["Penicillin"],
+            "key_facts": ["Non-smoker"],
+            "age": 40,
+            "summary": "Routine visit",
+            "report_type": "general",
+        }
+
+        with patch.object(report_analyzer, "bulk_add", return_value=True) as mock_bulk, \
+             patch.object(report_analyzer, "update_basic_info", return_value=True) as mock_basic, \
+             patch.object(report_analyzer, "add_report_summary", return_value=True) as mock_summary:
+            result = report_analyzer.confirm_and_save_analysis("user-123", extracted, "reports/a.pdf")
+
+        assert result["success"] is True
+        assert result["saved"]["conditions"] == ["Asthma"]
+        assert result["saved"]["medications"] == ["Albuterol"]
+        assert result["saved"]["basic_info"] is True
+        mock_bulk.assert_called_once()
+        mock_basic.assert_called_once_with("user-123", age=40, gender=None, blood_type=None)
+        mock_summary.assert_called_once_with("user-123", "Routine visit", "general", "reports/a.pdf")
+
+    def test_write_error_is_reported(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "bulk_add", return_value=True), \
+             patch.object(report_analyzer, "add_report_summary", side_effect=Exception("boom")):
+            result = report_analyzer.confirm_and_save_analysis("user-123", {}, "reports/a.pdf")
+
+        assert result["success"] is False
+        assert result["error"] == "boom"
+
+
+class TestWorthExtracting:
+    """Tests for the health-signal gate in front of chat extraction."""
+
+    @pytest.mark.parametrize("message", [
+        "I have type 2 diabetes",
+        "I’m on metformin twice a day",
+        "I am allergic to penicillin",
+        "My doctor says my blood pressure is high",
+        "I take 20 mg of lisinopril",
+        "I had knee surgery in 2019",
+    ])
+    def test_health_statements_pass(self, message):
+        import report_analyzer
+        assert report_analyzer._worth_extracting(message) is True
+
+    @pytest.mark.parametrize("message", [
+        "",
+        "thanks",
+        "thank you so much!",
+        "How do I treat a minor burn?",
+        "What does the word triage mean",
+    ])
+    def test_other_messages_are_skipped(self, message):
+        import report_analyzer
+        assert report_analyzer._worth_extracting(message) is False
+
+    def test_skipped_message_never_calls_gemini(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "get_client") as mock_client:
+            assert report_analyzer.extract_facts_from_chat("user-123", "What is the capital of France?", "") == []
+
+        mock_client.assert_not_called()
+
+
+class TestEnqueueFactExtraction:
+    """Tests for enqueue_fact_extraction."""
+
+    def test_sends_message_when_queue_configured(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "FACT_EXTRACTION_QUEUE_URL", "https://sqs/queue"), \
+             patch.object(report_analyzer, "get_sqs_client") as mock_sqs:
+            assert report_analyzer.enqueue_fact_extraction("user-123", "I have diabetes now") is True
+
+        _, kwargs = mock_sqs.return_value.send_message.call_args
+        assert kwargs["QueueUrl"] == "https://sqs/queue"
+        assert json.loads(kwargs["MessageBody"]) == {"user_id": "user-123", "user_message": "I have diabetes now"}
+
+    def test_without_queue_caller_runs_inline(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "FACT_EXTRACTION_QUEUE_URL", ""), \
+             patch.object(report_analyzer, "get_sqs_client") as mock_sqs:
+            assert report_analyzer.enqueue_fact_extraction("user-123", "I have diabetes now") is False
+
+        mock_sqs.assert_not_called()
+
+    def test_send_failure_falls_back_inline(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "FACT_EXTRACTION_QUEUE_URL", "https://sqs/queue"), \
+             patch.object(report_analyzer, "get_sqs_client") as mock_sqs:
+            mock_sqs.return_value.send_message.side_effect = Exception("throttled")
+            assert report_analyzer.enqueue_fact_extraction("user-123", "I have diabetes now") is False
+
+    def test_short_message_is_not_queued(self):
+        import report_analyzer
+
+        with patch.object(report_analyzer, "FACT_EXTRACTION_QUEUE_URL", "https://sqs/queue"), \
+             patch.object(report_analyzer, "get_sqs_client") as mock_sqs:
+            assert report_analyzer.enqueue_fact_extraction("user-123", "thanks") is True
+
+        mock_sqs.assert_not_called()
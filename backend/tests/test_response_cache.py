@@ -4,14 +4,14 @@ Tests for response_cache.py — DynamoDB-backed Response Cache.
 
 
 from unittest.mock import patch, MagicMock
-from response_cache import normalize_query, get_cache_key, get_cached_response, cache_response
+from response_cache import normalize_query, get_cache_key, get_cached_response, cache_response, cache_responses_batch
 
 
 class TestNormalizeQuery:
     """Test query normalization for consistent cache keys."""
 
     def test_lowercase(self):
-        assert normalize_query("How To Treat A HEADACHE?") == "how to treat a headache"
+        assert normalize_query("How To Treat HEADACHE?") == "how to treat headache"
 
     def test_strip_whitespace(self):
         assert normalize_query("  headache  ") == "headache"
@@ -31,6 +31,44 @@ class TestNormalizeQuery:
         q3 = normalize_query("  How  to  treat  a  headache???  ")
         assert q1 == q2 == q3
 
+    def test_strip_internal_punctuation(self):
+        assert normalize_query("headache, fever - what now?") == "headache fever what now"
+        assert normalize_query("is 2.5 mg safe?") == "is 2.5 mg safe"
+
+    def test_drop_articles_and_filler(self):
+        assert normalize_query("How to treat the sprain") == normalize_query("how to treat sprain")
+        assert normalize_query("Please, what is the dose?") == "what is dose"
+
+    def test_letter_a_is_kept(self):
+        assert normalize_query("vitamin A deficiency") != normalize_query("vitamin deficiency")
+        assert normalize_query("hepatitis A vaccine") != normalize_query("hepatitis vaccine")
+        assert normalize_query("hepatitis A vaccine") != normalize_query("hepatitis B vaccine")
+
+    def test_blood_type_signs_are_kept(self):
+        assert normalize_query("blood type A+") != normalize_query("blood type A-")
+        assert normalize_query("blood type O+") != normalize_query("blood type O-")
+        assert normalize_query("blood type A+") != normalize_query("blood type")
+        assert normalize_query("Is blood type O- rare?") == "is blood type o- rare"
+
+    def test_detached_signs_are_dropped(self):
+        assert normalize_query("fever - what now") == "fever what now"
+        assert normalize_query("covid-19 symptoms") == "covid-19 symptoms"
+
+    def test_comparison_percent_and_degree_signs_are_kept(self):
+        assert get_cache_key("Is blood sugar >200 dangerous?") != get_cache_key("Is blood sugar <200 dangerous?")
+        assert get_cache_key("BP > 140/90") != get_cache_key("BP < 140/90")
+        assert get_cache_key("5% dextrose") != get_cache_key("5 dextrose")
+        assert get_cache_key("fever of 38°C") != get_cache_key("fever of 38C")
+        assert normalize_query("Is BP > 140/90 high?") == "is bp > 140/90 high"
+
+    def test_drop_polite_lead_in(self):
+        q1 = normalize_query("Hi, can you please tell me how to treat a burn?")
+        q2 = normalize_query("How to treat a burn")
+        assert q1 == q2
+
+    def test_negation_kept(self):
+        assert normalize_query("Should I not take ibuprofen?") != normalize_query("Should I take ibuprofen?")
+
 
 class TestGetCacheKey:
     """Test cache key generation."""
@@ -118,9 +156,54 @@ class TestCacheResponse:
         item = call_args[1]["Item"] if "Item" in call_args[1] else call_args[0][0]
         assert item["response"] == "test response"
         assert item["topic"] == "Test Topic"
+        assert "safety_version" not in item
+
+    @patch("response_cache.get_dynamodb_table")
+    def test_stores_and_returns_safety_version(self, mock_table_fn):
+        mock_table = MagicMock()
+        mock_table_fn.return_value = mock_table
+
+        cache_response("test query", "test response", safety_version=1)
+        item = mock_table.put_item.call_args[1]["Item"]
+        assert item["safety_version"] == 1
+
+        mock_table.get_item.return_value = {"Item": item}
+        assert get_cached_response("test query")["safety_version"] == 1
 
     @patch("response_cache.get_dynamodb_table")
     def test_dynamo_error_does_not_raise(self, mock_table_fn):
         mock_table_fn.side_effect = Exception("Write error")
         # Should not raise
         cache_response("test query", "test response")
+
+
+class TestCacheResponsesBatch:
+    """Test batched cache writes."""
+
+    @patch("response_cache.get_dynamodb_table")
+    def test_writes_all_entries_through_batch_writer(self, mock_table_fn):
+        mock_table = MagicMock()
+        mock_table_fn.return_value = mock_table
+        batch = mock_table.batch_writer.return_value.__enter__.return_value
+
+        written = cache_responses_batch([
+            {"query": "treat a burn", "response": "Cool it", "topic": "burn"},
+            {"query": "stop bleeding", "response": "Apply pressure"},
+        ], ttl_hours=48)
+
+        assert written == 2
+        mock_table.batch_writer.assert_called_once_with(overwrite_by_pkeys=["cache_key"])
+        items = [c[1]["Item"] for c in batch.put_item.call_args_list]
+        assert items[0]["cache_key"] == get_cache_key("treat a burn")
+        assert items[1]["topic"] == ""
+        assert items[0]["ttl"] - items[0]["timestamp"] == 48 * 3600
+
+    @patch("response_cache.get_dynamodb_table")
+    def test_empty_batch_skips_dynamo(self, mock_table_fn):
+        assert cache_responses_batch([]) == 0
+        mock_table_fn.assert_not_called()
+
+    @patch("response_cache.get_dynamodb_table")
+    def test_dynamo_error_returns_zero(self, mock_table_fn):
+        mock_table_fn.side_effect = Exception("Write error")
+        assert cache_responses_batch([{"query": "q", "response": "r"}]) == 0
@@ -3,7 +3,7 @@ Tests for SSE streaming endpoint and invoke_llm_streaming.
 """
 
 
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 
 
@@ -80,6 +80,139 @@ class TestStreamingEndpoint:
         assert response.status_code == 200
         assert "text/event-stream" in response.headers.get("content-type", "")
 
+    @patch("routes.chat.StepImagePipeline")
+    @patch("routes.chat.invoke_llm_streaming")
+    @patch("routes.chat.check_input_safety")
+    @patch("routes.chat.detect_language")
+    @patch("routes.chat.get_model_for_query")
+    @patch("routes.chat.get_cached_response")
+    @patch("routes.chat.check_output_safety")
+    @patch("routes.chat.detect_medical_topic")
+    @patch("routes.chat.should_generate_images")
+    def test_stream_pipelines_step_images_with_tokens(
+        self, mock_should_gen, mock_topic, mock_output_safe,
+        mock_cache, mock_model, mock_lang, mock_input_safe, mock_streaming, mock_pipeline_cls
+    ):
+        """Test that step images are fed from streamed chunks when the query is visual."""
+        from api_server import app
+        client = TestClient(app)
+
+        mock_input_safe.return_value = (True, "how to treat a burn", None)
+        mock_lang.return_value = "en"
+        mock_model.return_value = "gemini-2.0-flash"
+        mock_cache.return_value = None
+        mock_streaming.return_value = iter(["**Step 1: Cool**\n", "Run water.\n"])
+        mock_output_safe.return_value = (True, "**Step 1: Cool**\nRun water.\n", None)
+        mock_topic.return_value = "burn"
+        mock_should_gen.return_value = True
+        pipeline = mock_pipeline_cls.return_value
+        pipeline.finish = AsyncMock(return_value=[{"step_number": "1", "title": "Cool"}])
+
+        response = client.post(
+            "/chat/stream",
+            json={"query": "how to treat a burn", "generate_images": True}
+        )
+        assert response.status_code == 200
+        assert pipeline.feed.call_count == 2
+        assert "event: step_images" in response.text
+        pipeline.finish.assert_awaited_once()
+
+    @patch("routes.chat.generate_all_step_images_async")
+    @patch("routes.chat.StepImagePipeline")
+    @patch("routes.chat.invoke_llm_streaming")
+    @patch("routes.chat.check_input_safety")
+    @patch("routes.chat.detect_language")
+    @patch("routes.chat.get_model_for_query")
+    @patch("routes.chat.get_cached_response")
+    @patch("routes.chat.check_output_safety")
+    def test_stream_blocked_response_starts_no_images(
+        self, mock_output_safe, mock_cache, mock_model, mock_lang, mock_input_safe,
+        mock_streaming, mock_pipeline_cls, mock_generate
+    ):
+        """Test that no step image is generated for a response output safety blocks."""
+        from api_server import app
+        client = TestClient(app)
+
+        mock_input_safe.return_value = (True, "how to treat a burn", None)
+        mock_lang.return_value = "en"
+        mock_model.return_value = "gemini-2.0-flash"
+        mock_cache.return_value = None
+        mock_streaming.return_value = iter(["**Step 1: Cool**\n", "Run water.\n"])
+        mock_output_safe.return_value = (False, "", "Blocked")
+        pipeline = mock_pipeline_cls.return_value
+        pipeline.finish = AsyncMock()
+
+        response = client.post(
+            "/chat/stream",
+            json={"query": "how to treat a burn", "generate_images": True}
+        )
+        assert response.status_code == 200
+        assert "event: error" in response.text
+        pipeline.finish.assert_not_awaited()
+        mock_generate.assert_not_called()
+
+    @patch("routes.chat.cache_response")
+    @patch("routes.chat.generate_all_step_images_async", new_callable=AsyncMock)
+    @patch("routes.chat.StepImagePipeline")
+    @patch("routes.chat.invoke_llm_streaming")
+    @patch("routes.chat.check_input_safety")
+    @patch("routes.chat.detect_language")
+    @patch("routes.chat.get_model_for_query")
+    @patch("routes.chat.get_cached_response")
+    @patch("routes.chat.check_output_safety")
+    def test_stream_rewritten_response_uses_sanitized_steps(
+        self, mock_output_safe, mock_cache, mock_model, mock_lang, mock_input_safe,
+        mock_streaming, mock_pipeline_cls, mock_generate, _mock_cache_write
+    ):
+        """Test that steps parsed from the raw stream are dropped when safety rewrites the text."""
+        from api_server import app
+        client = TestClient(app)
+
+        mock_input_safe.return_value = (True, "how to treat a burn", None)
+        mock_lang.return_value = "en"
+        mock_model.return_value = "gemini-2.0-flash"
+        mock_cache.return_value = None
+        mock_streaming.return_value = iter(["**Step 1: Cool**\n", "Run water.\n"])
+        mock_output_safe.return_value = (True, "**Step 1: Cool**\nRun cool water.\n", None)
+        mock_generate.return_value = [{"step_number": "1", "title": "Cool"}]
+        pipeline = mock_pipeline_cls.return_value
+        pipeline.finish = AsyncMock()
+
+        response = client.post(
+            "/chat/stream",
+            json={"query": "how to treat a burn", "generate_images": True}
+        )
+        assert response.status_code == 200
+        pipeline.finish.assert_not_awaited()
+        steps = mock_generate.call_args[0][0]
+        assert "cool water" in steps[0]["description"]
+
+    @patch("routes.chat.invoke_llm_streaming")
+    @patch("routes.chat.check_input_safety")
+    @patch("routes.chat.get_cached_response")
+    @patch("routes.chat.check_output_safety")
+    def test_stream_replays_cached_response_as_one_token(
+        self, mock_output_safe, mock_cache, mock_input_safe, mock_streaming
+    ):
+        """Test that a cache hit is sent as a single token event without calling the LLM."""
+        from api_server import app
+        from routes.chat import _sse_token
+        client = TestClient(app)
+
+        text = "Cool the burn under running water. " * 10
+        mock_input_safe.return_value = (True, "how to treat a burn", None)
+        mock_cache.return_value = {"response": text, "topic": "burn", "timestamp": 0}
+        mock_output_safe.return_value = (True, text, None)
+
+        response = client.post(
+            "/chat/stream",
+            json={"query": "how to treat a burn", "generate_images": False}
+        )
+        assert response.status_code == 200
+        assert response.text.count("event: token") == 1
+        assert response.text.startswith(_sse_token(text).decode())
+        mock_streaming.assert_not_called()
+
     @patch("routes.chat.check_input_safety")
     def test_stream_rejects_unsafe_input(self, mock_input_safe):
         """Test that unsafe input gets blocked."""
@@ -108,6 +241,29 @@ class TestStreamingEndpoint:
         assert response.status_code == 400
 
 
+class TestSseEventFormat:
+    """Test SSE event framing."""
+
+    def test_formats_event_with_json_data(self):
+        import json
+        from routes.chat import _sse_event
+        event = _sse_event("token", {"text": "Llame al 112 — ahora"})
+        assert event.startswith("event: token\ndata: ")
+        assert event.endswith("\n\n")
+        payload = event[len("event: token\ndata: "):-2]
+        assert json.loads(payload) == {"text": "Llame al 112 — ahora"}
+
+    def test_token_frame_matches_generic_event(self):
+        from routes.chat import _sse_event, _sse_token
+        for text in ["plain", 'quote " and \\ slash', "line\nbreak", "Llame al 112 — ahora", ""]:
+            assert _sse_token(text) == _sse_event("token", {"text": text}).encode()
+
+    def test_falls_back_to_str_for_unknown_types(self):
+        from decimal import Decimal
+        from routes.chat import _sse_event
+        assert '"step_number":"1"' in _sse_event("step_images", [{"step_number": Decimal("1")}])
+
+
 class TestImageBudgeting:
     """Test dynamic image budget calculation."""
 
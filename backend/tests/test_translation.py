@@ -0,0 +1,22 @@
+"""
+Tests for translation.py — language detection heuristics.
+"""
+
+import pytest
+
+from translation import detect_language
+
+
+class TestDetectLanguage:
+    """Test script-based language detection."""
+
+    @pytest.mark.parametrize("text,expected", [
+        ("How to treat a burn?", "en"),
+        ("", "en"),
+        ("Café au lait spots — are they harmful?", "en"),
+        ("తలనొప్పి ఎలా తగ్గించాలి", "te"),
+        ("सिरदर्द का इलाज", "hi"),
+        ("सिरदर्द and తలనొప్పి", "te"),
+    ])
+    def test_detects_script(self, text, expected):
+        assert detect_language(text) == expected
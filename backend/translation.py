@@ -3,7 +3,8 @@ Translation utility using deep_translator for multilingual support.
 Supports: English, Telugu, Hindi
 """
 
-from deep_translator import GoogleTranslator
+import re
+
 from typing import Tuple
 
 # Supported languages
@@ -17,6 +18,11 @@ SUPPORTED_LANGUAGES = {
 CODE_TO_LANGUAGE = {v: k for k, v in SUPPORTED_LANGUAGES.items()}
 
 
+# Telugu (0C00-0C7F) and Hindi/Devanagari (0900-097F) Unicode ranges
+_TELUGU_RE = re.compile("[\u0C00-\u0C7F]")
+_DEVANAGARI_RE = re.compile("[\u0900-\u097F]")
+
+
 def detect_language(text: str) -> str:
     """
     Detect the language of input text.
@@ -25,12 +31,15 @@ def detect_language(text: str) -> str:
     Note: This is a simple heuristic. For production, use a proper
     language detection library like langdetect.
     """
-    # Check for Telugu Unicode range (0C00-0C7F)
-    if any('\u0C00' <= char <= '\u0C7F' for char in text):
+    # Most queries are plain ASCII, which str.isascii() answers in C
+    if text.isascii():
+        return "en"
+
+    # Telugu wins over Hindi when both scripts appear
+    if _TELUGU_RE.search(text):
         return "te"
 
-    # Check for Hindi/Devanagari Unicode range (0900-097F)
-    if any('\u0900' <= char <= '\u097F' for char in text):
+    if _DEVANAGARI_RE.search(text):
         return "hi"
 
     # Default to English
@@ -55,6 +64,9 @@ def translate_to_english(text: str, source_lang: str = "auto") -> Tuple[str, str
         return text, "en"
 
     try:
+        # deep_translator (and bs4) load only when a translation is needed
+        from deep_translator import GoogleTranslator
+
         translator = GoogleTranslator(source=source_lang, target="en")
         translated = translator.translate(text)
         return translated, source_lang
@@ -78,6 +90,9 @@ def translate_from_english(text: str, target_lang: str) -> str:
         return text
 
     try:
+        # deep_translator (and bs4) load only when a translation is needed
+        from deep_translator import GoogleTranslator
+
         translator = GoogleTranslator(source="en", target=target_lang)
         return translator.translate(text)
     except Exception as e:
@@ -66,13 +66,17 @@ function buildExportHtml(messages: ExportMessage[], title: string): string {
             let stepsHtml = '';
             if (msg.response?.step_images?.length) {
                 stepsHtml = msg.response.step_images
-                    .map(step => `
+                    .map(step => {
+                        // Guest responses carry only the inline base64 image
+                        const imageSrc = step.image_url || (step.image ? `data:image/png;base64,${step.image}` : null);
+                        return `
                         <div class="step-card">
                             <h4>Step ${escapeHtml(step.step_number)}: ${escapeHtml(step.title)}</h4>
                             <p>${escapeHtml(step.description)}</p>
-                            ${step.image_url ? `<img src="${escapeHtml(step.image_url)}" alt="Step ${escapeHtml(step.step_number)}" />` : ''}
+                            ${imageSrc ? `<img src="${escapeHtml(imageSrc)}" alt="Step ${escapeHtml(step.step_number)}" />` : ''}
                         </div>
-                    `)
+                    `;
+                    })
                     .join('');
             }
 